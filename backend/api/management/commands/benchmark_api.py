@@ -0,0 +1,427 @@
+import json
+from base64 import b64encode
+from concurrent.futures import wait
+from io import BytesIO
+from statistics import mean, quantiles
+from threading import Barrier
+from time import perf_counter
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+
+from PIL import Image
+
+from api.v1.cache import ingredients_cache, short_links_cache, tags_cache
+from backend import images
+from backend.settings import FEED_WORKERS, IMAGE_WORKERS, PAGE_SIZE
+from recipes import feed
+from recipes.management.commands.generate_dataset import NAME_1, NAME_2
+from recipes.models import Ingredient, Recipe, ShoppingCart, ShortLink, Tag
+from users.models import User
+
+TAGS = (
+    ('Десерт', 'dessert'), ('Завтрак', 'breakfast'), ('Обед', 'lunch'),
+    ('Ужин', 'dinner'), ('Аперитив', 'aperitif'),
+    ('Ночной дожор', 'nightwatch'),
+)
+# Рецептов в одном запросе bulk.
+BULK_RECIPES = 10
+
+
+class RowCountingCursor:
+    """Обёртка над курсором DB-API, считающая полученные строки."""
+
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        self.counter['rows'] += row is not None
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.cursor.fetchmany(*args)
+        self.counter['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.counter['rows'] += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.counter['rows'] += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class RowCounter:
+    """execute_wrapper, который подменяет курсор на RowCountingCursor."""
+
+    def __init__(self):
+        self.counter = {'rows': 0}
+
+    def __call__(self, execute, sql, params, many, context):
+        cursor = context['cursor']
+        if not isinstance(cursor.cursor, RowCountingCursor):
+            cursor.cursor = RowCountingCursor(cursor.cursor, self.counter)
+        return execute(sql, params, many, context)
+
+
+def percentile(timings, number):
+    """Перцентиль number для списка значений."""
+    if len(timings) < 2:
+        return timings[0]
+    return quantiles(timings, n=100, method='inclusive')[number - 1]
+
+
+def get_image():
+    """Картинка PNG в base64 для создания рецептов и аватара."""
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    return f'data:image/png;base64,{b64encode(buffer.getvalue()).decode()}'
+
+
+def get_recipe_data(image, tag_ids, ingredient_ids):
+    """Тело запроса на создание или изменение рецепта."""
+    return {
+        'name': f'{NAME_1[0]} {NAME_2[0]}',
+        'text': 'Рецепт для бенчмарка.',
+        'cooking_time': 10,
+        'image': image,
+        'tags': tag_ids,
+        'ingredients': [
+            {'id': ingredient_id, 'amount': 100}
+            for ingredient_id in ingredient_ids
+        ],
+    }
+
+
+def wait_for_background_tasks():
+    """Дождётся фоновых задач: вариантов картинок и раскладки по лентам.
+
+    Очередь исполнителя общая, поэтому задачи-барьеры, по одной на поток,
+    выполнятся все вместе, только когда потоки закончат прежние задачи.
+    Так фоновая работа не попадает в замеры следующих шагов.
+    """
+    for executor, workers in ((images.executor, IMAGE_WORKERS),
+                              (feed.executor, FEED_WORKERS)):
+        barrier = Barrier(workers)
+        wait([executor.submit(barrier.wait) for _ in range(workers)])
+
+
+def delete_created_recipes(responses):
+    """Удалит рецепты, созданные запросом bulk."""
+    if responses[0].status_code != 201:
+        return
+    Recipe.objects.filter(
+        id__in=[recipe['id'] for recipe in responses[0].data]
+    ).delete()
+
+
+class Command(BaseCommand):
+    """Бенчмарк эндпоинтов API на сгенерированных данных.
+
+    Для каждого размера создаётся тестовая база, заполняется командами
+    load_ingredients и generate_dataset, после чего каждый эндпоинт
+    вызывается через тестовый клиент Django. Для каждого эндпоинта
+    записываются p50/p95/p99 задержки, число SQL-запросов и полученных
+    строк. Ответ с неожиданным кодом - ошибка: замер пошёл не по тому
+    пути. Результаты пишутся в JSON и сравниваются с сохранённым
+    базовым файлом: рост p95 больше чем на --tolerance или рост числа
+    запросов и строк считается регрессией.
+    """
+
+    help = 'Бенчмарк эндпоинтов API с сравнением с базовыми результатами.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000',
+                            help='Числа рецептов через запятую.')
+        parser.add_argument('--requests', type=int, default=30,
+                            help='Запросов к каждому эндпоинту.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark_results.json')
+        parser.add_argument('--baseline', default=None,
+                            help='JSON с базовыми результатами.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Записать результаты в --baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Допустимый рост p95, доля.')
+
+    def handle(self, *args, **options):
+        results = {}
+        self.unexpected = []
+        setup_test_environment()
+        try:
+            for size in map(int, options['sizes'].split(',')):
+                old_name = connection.creation.create_test_db(
+                    verbosity=0, autoclobber=True, serialize=False
+                )
+                try:
+                    results[str(size)] = self.run_size(size, options)
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            teardown_test_environment()
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}.')
+        for message in self.unexpected:
+            self.stderr.write(message)
+        if self.unexpected:
+            raise CommandError(
+                f'Неожиданных кодов ответа: {len(self.unexpected)}.'
+            )
+        if not options['baseline']:
+            return
+        if options['save_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Базовые результаты: {options["baseline"]}.')
+            return
+        with open(options['baseline'], encoding='utf-8') as file:
+            regressions = self.compare(
+                json.load(file), results, options['tolerance']
+            )
+        for regression in regressions:
+            self.stderr.write(regression)
+        if regressions:
+            raise CommandError(f'Регрессий: {len(regressions)}.')
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def run_size(self, size, options):
+        """Заполнит базу и прогонит все эндпоинты."""
+        call_command('flush', interactive=False, verbosity=0)
+        for cache in (tags_cache, ingredients_cache):
+            cache.bump()
+        short_links_cache.data.clear()
+        Tag.objects.bulk_create(
+            Tag(name=name, slug=slug, mask=1 << bit)
+            for bit, (name, slug) in enumerate(TAGS)
+        )
+        call_command('load_ingredients', verbosity=0, stdout=self.stdout)
+        call_command('generate_dataset', recipes=size, seed=options['seed'],
+                     stdout=self.stdout)
+        self.stdout.write(f'--- {size} рецептов ---')
+        results = {}
+        for client, steps, cleanup in self.get_requests():
+            measured = self.measure(
+                client, steps, options['requests'], cleanup
+            )
+            for (name, *_, expected), result in zip(steps, measured):
+                results[name] = result
+                self.stdout.write(
+                    '{0:<32} p50 {p50:8.2f} мс  p95 {p95:8.2f} мс  p99 '
+                    '{p99:8.2f} мс  запросов {queries:4}  строк '
+                    '{rows:6}'.format(name, **result)
+                )
+                if result['statuses'] != [expected]:
+                    self.unexpected.append(
+                        f'{size} {name}: коды {result["statuses"]}, '
+                        f'ожидался {expected}'
+                    )
+        return results
+
+    def get_requests(self):
+        """Список (клиент, шаги, очистка) для всех эндпоинтов.
+
+        Шаг - (имя, метод, путь, тело, ожидаемый код). Запросы от имени
+        пользователя с наибольшим числом подписок. Шаги группы measure
+        выполняет по очереди: добавление и удаление, создание, изменение и
+        удаление рецепта оставляют базу в прежнем состоянии, а рецепты из
+        bulk удаляет очистка. В путях подставляются поля ответов
+        предыдущих шагов группы, например {id} созданного рецепта.
+        """
+        user = User.objects.annotate(
+            follows=Count('follow')).order_by('-follows').first()
+        token = Token.objects.get_or_create(user=user)[0]
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        anonymous = Client()
+        recipe = Recipe.objects.order_by('-created').first()
+        free_recipe = Recipe.objects.exclude(
+            favorite__user=user).exclude(shop__user=user).first()
+        author = User.objects.exclude(id=user.id).exclude(
+            following__user=user).first()
+        tag_ids = list(Tag.objects.values_list('id', flat=True)[:2])
+        tags = '&'.join(
+            f'tags={slug}' for slug in Tag.objects.filter(
+                id__in=tag_ids).values_list('slug', flat=True)
+        )
+        ingredient_ids = list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True)[:8])
+        pantry = '&'.join(
+            f'ingredients={ingredient_id}' for ingredient_id in
+            recipe.ingredient_amount.values_list('ingredient_id', flat=True)
+        )
+        if not ShoppingCart.objects.filter(user=user).exists():
+            ShoppingCart.objects.bulk_create(
+                ShoppingCart(user=user, recipe_id=recipe_id)
+                for recipe_id in Recipe.objects.values_list(
+                    'id', flat=True)[:5]
+            )
+        short = ShortLink.objects.filter(recipe=recipe).values_list(
+            'short', flat=True).first()
+        last_page = (Recipe.objects.count() - 1) // PAGE_SIZE + 1
+        image = get_image()
+        created = get_recipe_data(image, tag_ids, ingredient_ids[:4])
+        changed = get_recipe_data(image, tag_ids[:1], ingredient_ids[2:6])
+        bulk = [
+            get_recipe_data(image, tag_ids, [
+                ingredient_ids[(number + shift) % len(ingredient_ids)]
+                for shift in range(4)
+            ])
+            for number in range(BULK_RECIPES)
+        ]
+        reads = (
+            ('recipes-list', '/api/recipes/', client),
+            ('recipes-list-anonymous', '/api/recipes/', anonymous),
+            ('recipes-list-limit-100', '/api/recipes/?limit=100', client),
+            ('recipes-list-deep-page', f'/api/recipes/?page={last_page}',
+             client),
+            ('recipes-list-cursor', '/api/recipes/?cursor=', client),
+            ('recipes-list-tags', f'/api/recipes/?{tags}', client),
+            ('recipes-list-favorited', '/api/recipes/?is_favorited=1',
+             client),
+            ('recipes-search', f'/api/recipes/?search={NAME_2[0]}', client),
+            ('recipes-detail', f'/api/recipes/{recipe.id}/', client),
+            ('recipes-get-link', f'/api/recipes/{recipe.id}/get-link/',
+             client),
+            ('recipes-similar', f'/api/recipes/{recipe.id}/similar/',
+             client),
+            ('recipes-feed', '/api/recipes/feed/', client),
+            ('recipes-cook', f'/api/recipes/cook/?{pantry}', client),
+            ('recipes-download-shopping-cart',
+             '/api/recipes/download_shopping_cart/', client),
+            ('users-list', '/api/users/', client),
+            ('users-detail', f'/api/users/{author.id}/', client),
+            ('users-me', '/api/users/me/', client),
+            ('users-subscriptions',
+             '/api/users/subscriptions/?recipes_limit=3', client),
+            ('tags-list', '/api/tags/', client),
+            ('ingredients-list', '/api/ingredients/', client),
+            ('ingredients-search', '/api/ingredients/?name=мол&limit=10',
+             client),
+        )
+        pairs = (
+            ('recipes-favorite', f'/api/recipes/{free_recipe.id}/favorite/',
+             201),
+            ('recipes-shopping-cart',
+             f'/api/recipes/{free_recipe.id}/shopping_cart/', 201),
+            ('users-subscribe', f'/api/users/{author.id}/subscribe/', 201),
+        )
+        return (
+            *(
+                (client, ((name, 'get', path, None, 200),), None)
+                for name, path, client in reads
+            ),
+            (anonymous, (
+                ('short-link-redirect', 'get', f'/s/{short}/', None, 302),
+            ), None),
+            *(
+                (client, (
+                    (f'{name}-add', 'post', path, None, created_status),
+                    (f'{name}-remove', 'delete', path, None, 204),
+                ), None)
+                for name, path, created_status in pairs
+            ),
+            (client, (
+                ('users-avatar-put', 'put', '/api/users/me/avatar/',
+                 {'avatar': image}, 200),
+                ('users-avatar-delete', 'delete', '/api/users/me/avatar/',
+                 None, 204),
+            ), None),
+            (client, (
+                ('recipes-create', 'post', '/api/recipes/', created, 201),
+                ('recipes-update', 'patch', '/api/recipes/{id}/', changed,
+                 200),
+                ('recipes-delete', 'delete', '/api/recipes/{id}/', None,
+                 204),
+            ), None),
+            (client, (
+                ('recipes-bulk', 'post', '/api/recipes/bulk/', bulk, 201),
+            ), delete_created_recipes),
+        )
+
+    @staticmethod
+    def measure(client, steps, number, cleanup=None):
+        """Задержки, SQL-запросы и строки для группы шагов.
+
+        Шаги группы выполняются по очереди в одном цикле, каждый
+        замеряется отдельно. Вне замера после каждого изменяющего шага
+        ожидаются фоновые задачи, а после прохода вызывается
+        cleanup(ответы). Вернет список результатов в порядке шагов.
+        """
+        timings = [[] for _ in steps]
+        statuses = [set() for _ in steps]
+        queries = [0] * len(steps)
+        rows = [0] * len(steps)
+        for _ in range(number):
+            fields, responses = {}, []
+            for index, (_, method, path, data, _) in enumerate(steps):
+                kwargs = {}
+                if data is not None:
+                    kwargs = {'data': data, 'content_type': 'application/json'}
+                counter = RowCounter()
+                with CaptureQueriesContext(connection) as context, \
+                        connection.execute_wrapper(counter):
+                    start = perf_counter()
+                    response = getattr(client, method)(
+                        path.format(**fields), **kwargs
+                    )
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    timings[index].append((perf_counter() - start) * 1000)
+                statuses[index].add(response.status_code)
+                queries[index] = max(queries[index], len(context))
+                rows[index] = max(rows[index], counter.counter['rows'])
+                responses.append(response)
+                if isinstance(getattr(response, 'data', None), dict):
+                    fields.update(response.data)
+                if method != 'get':
+                    wait_for_background_tasks()
+            if cleanup is not None:
+                cleanup(responses)
+        return [
+            {
+                'mean': mean(timings[index]),
+                'p50': percentile(timings[index], 50),
+                'p95': percentile(timings[index], 95),
+                'p99': percentile(timings[index], 99),
+                'queries': queries[index],
+                'rows': rows[index],
+                'statuses': sorted(statuses[index]),
+            }
+            for index in range(len(steps))
+        ]
+
+    @staticmethod
+    def compare(baseline, results, tolerance):
+        """Вернет список описаний регрессий относительно baseline."""
+        regressions = []
+        for size, endpoints in results.items():
+            for name, result in endpoints.items():
+                base = baseline.get(size, {}).get(name)
+                if base is None:
+                    continue
+                if result['p95'] > base['p95'] * (1 + tolerance):
+                    regressions.append(
+                        f'{size} {name}: p95 {base["p95"]:.2f} -> '
+                        f'{result["p95"]:.2f} мс'
+                    )
+                for key in ('queries', 'rows'):
+                    if result[key] > base[key]:
+                        regressions.append(
+                            f'{size} {name}: {key} {base[key]} -> '
+                            f'{result[key]}'
+                        )
+        return regressions
@@ -0,0 +1,96 @@
+from random import Random
+from statistics import mean, quantiles
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic, set_rollback
+
+from api.v1.filters import IngredientFilter
+from api.v1.search import IngredientIndex
+from api.v1.serializers import IngredientSerializer
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    """Сравнивает поиск ингредиентов по индексу в памяти и через ORM.
+
+    При необходимости добавляет синтетические ингредиенты до --size штук
+    внутри транзакции, которая в конце откатывается.
+    """
+
+    help = 'Микробенчмарк поиска ингредиентов: индекс в памяти против ORM.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100_000,
+                            help='Сколько ингредиентов должно быть в базе.')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Сколько поисковых запросов выполнить.')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Параметр limit для поиска.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random = Random(options['seed'])
+        with atomic():
+            self.fill(options['size'], random)
+            items = IngredientSerializer(
+                Ingredient.objects.all(), many=True
+            ).data
+            start = perf_counter()
+            index = IngredientIndex(items)
+            self.stdout.write(
+                f'Ингредиентов: {len(items)}, индекс построен за '
+                f'{perf_counter() - start:.2f} с.'
+            )
+            queries = self.get_queries(items, options['queries'], random)
+            limit = options['limit']
+            self.report('index', [
+                self.measure(lambda: index.search(query, limit))
+                for query in queries
+            ])
+            self.report('orm', [
+                self.measure(lambda: list(IngredientFilter(
+                    {'name': query}, Ingredient.objects.all()
+                ).qs[:limit])) for query in queries
+            ])
+            set_rollback(True)
+
+    @staticmethod
+    def fill(size, random):
+        """Добавит синтетические ингредиенты до нужного количества."""
+        names = list(Ingredient.objects.values_list('name', flat=True)) or [
+            'картофель', 'морковь', 'молоко', 'масло', 'соль', 'сахар',
+        ]
+        missing = size - len(names)
+        Ingredient.objects.bulk_create([
+            Ingredient(
+                name=f'{random.choice(names)} {number}',
+                measurement_unit='г',
+            ) for number in range(missing)
+        ], batch_size=5000)
+
+    @staticmethod
+    def get_queries(items, number, random):
+        """Префиксы и подстроки случайных названий длиной от 1 до 6."""
+        queries = []
+        for _ in range(number):
+            name = random.choice(items)['name']
+            length = random.randint(1, min(6, len(name)))
+            start = random.choice((0, random.randint(0, len(name) - length)))
+            queries.append(name[start:start + length])
+        return queries
+
+    @staticmethod
+    def measure(function):
+        """Время выполнения функции в миллисекундах."""
+        start = perf_counter()
+        function()
+        return (perf_counter() - start) * 1000
+
+    def report(self, name, timings):
+        """Выведет среднее и перцентили."""
+        p50, p95, p99 = (quantiles(timings, n=100)[i] for i in (49, 94, 98))
+        self.stdout.write(
+            f'{name:>6}: mean {mean(timings):.3f} мс, p50 {p50:.3f} мс, '
+            f'p95 {p95:.3f} мс, p99 {p99:.3f} мс'
+        )
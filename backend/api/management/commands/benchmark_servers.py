@@ -0,0 +1,140 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+from statistics import quantiles
+from time import perf_counter, sleep
+from urllib.parse import quote
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.settings import BASE_DIR
+from recipes.models import Recipe, ShortLink
+
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    """Сравнивает синхронный и асинхронный режимы сервера.
+
+    Для каждого режима запускает gunicorn с одним воркером (sync с
+    backend.wsgi или uvicorn с backend.asgi) на текущей базе и держит
+    заданное число одновременных соединений, которые по кругу запрашивают
+    каталоги, рецепт и короткую ссылку. Каждый запрос - новое соединение:
+    синхронный воркер gunicorn не поддерживает keep-alive.
+    """
+
+    help = 'Бенчмарк одного воркера: WSGI против ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,10,50,200',
+                            help='Числа одновременных соединений.')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Сколько секунд длится каждый замер.')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--timeout', type=float, default=30,
+                            help='Таймаут одного запроса в секундах.')
+
+    def handle(self, *args, **options):
+        paths = self.get_paths()
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        for mode in MODES:
+            server = self.start(mode, options['port'])
+            try:
+                for concurrency in levels:
+                    self.report(mode, concurrency, asyncio.run(self.load(
+                        options['port'], paths, concurrency,
+                        options['duration'], options['timeout'],
+                    )), options['duration'])
+            finally:
+                server.terminate()
+                server.wait()
+
+    @staticmethod
+    def get_paths():
+        """Пути, которые запрашивает нагрузка."""
+        recipe = Recipe.objects.order_by('id').first()
+        short = ShortLink.objects.order_by('id').first()
+        if recipe is None or short is None:
+            raise CommandError('В базе нет рецептов.')
+        return (
+            '/api/tags/',
+            f'/api/ingredients/?name={quote("мол")}',
+            f'/api/recipes/{recipe.id}/',
+            f'/s/{short.short}/',
+        )
+
+    def start(self, mode, port):
+        """Запустит gunicorn в нужном режиме и дождётся порта."""
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', '1',
+             '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            cwd=BASE_DIR, env={**os.environ, 'SERVER_MODE': mode},
+        )
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port), 0.1).close()
+                return server
+            except OSError:
+                if server.poll() is not None:
+                    raise CommandError(f'Сервер {mode} не запустился.')
+                sleep(0.1)
+        server.terminate()
+        raise CommandError(f'Сервер {mode} не открыл порт {port}.')
+
+    async def load(self, port, paths, concurrency, duration, timeout):
+        """Нагрузка: concurrency соединений в течение duration секунд."""
+        timings, errors = [], [0]
+        deadline = perf_counter() + duration
+
+        async def client(number):
+            index = number
+            while perf_counter() < deadline:
+                path = paths[index % len(paths)]
+                index += 1
+                start = perf_counter()
+                try:
+                    status = await asyncio.wait_for(
+                        self.request(port, path), timeout
+                    )
+                except (OSError, asyncio.TimeoutError):
+                    status = None
+                if status is None or status >= 500:
+                    errors[0] += 1
+                else:
+                    timings.append((perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(client(number)
+                               for number in range(concurrency)))
+        return timings, errors[0]
+
+    @staticmethod
+    async def request(port, path):
+        """GET-запрос в отдельном соединении, вернет код ответа."""
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                'Accept: application/json\r\nConnection: close\r\n\r\n'
+                .encode()
+            )
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        return int(response.split(b' ', 2)[1]) if response else None
+
+    def report(self, mode, concurrency, result, duration):
+        """Выведет пропускную способность и перцентили задержки."""
+        timings, errors = result
+        if len(timings) < 2:
+            self.stdout.write(f'{mode} x{concurrency}: ответов нет, '
+                              f'ошибок {errors}')
+            return
+        p50, p95, p99 = (quantiles(timings, n=100)[i] for i in (49, 94, 98))
+        self.stdout.write(
+            f'{mode} x{concurrency:<4}: {len(timings) / duration:8.1f} '
+            f'запросов/с, p50 {p50:.1f} мс, p95 {p95:.1f} мс, '
+            f'p99 {p99:.1f} мс, ошибок {errors}'
+        )
@@ -0,0 +1,65 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.shortcuts import get_object_or_404, redirect
+from django.test import Client, override_settings
+from django.urls import path
+from rest_framework.decorators import api_view
+
+from api.v1.views import redirect_short_link
+from recipes.models import ShortLink
+
+
+@api_view(['GET'])
+def redirect_short_link_drf(request, short):
+    """Прежний вариант перехода по короткой ссылке, через DRF."""
+    recipe_short_link = get_object_or_404(ShortLink, short=short)
+    recipe_id = recipe_short_link.recipe.id
+    return redirect(request.build_absolute_uri(f'/recipes/{recipe_id}/'))
+
+
+urlpatterns = [
+    path('before/<str:short>/', redirect_short_link_drf),
+    path('after/<str:short>/', redirect_short_link),
+]
+
+
+class Command(BaseCommand):
+    """Сравнивает число запросов в секунду к коротким ссылкам.
+
+    before - прежнее представление DRF с get_object_or_404,
+    after - текущее представление с LRU-кэшем. Запросы проходят через
+    весь стек middleware с помощью тестового клиента Django.
+    """
+
+    help = 'Бенчмарк перехода по короткой ссылке: до и после.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000,
+                            help='Сколько переходов выполнить.')
+        parser.add_argument('--links', type=int, default=100,
+                            help='Сколько разных ссылок использовать.')
+
+    def handle(self, *args, **options):
+        shorts = list(ShortLink.objects.values_list(
+            'short', flat=True)[:options['links']])
+        if not shorts:
+            raise CommandError('В базе нет коротких ссылок.')
+        client = Client()
+        with override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=['*']):
+            for name in ('before', 'after'):
+                client.get(f'/{name}/{shorts[0]}/')
+                start = perf_counter()
+                for number in range(options['requests']):
+                    short = shorts[number % len(shorts)]
+                    response = client.get(f'/{name}/{short}/')
+                    if response.status_code != 302:
+                        raise CommandError(
+                            f'{name}: ответ {response.status_code}.'
+                        )
+                duration = perf_counter() - start
+                self.stdout.write(
+                    f'{name:>6}: {options["requests"] / duration:.0f} '
+                    f'запросов/с, {duration * 1000 / options["requests"]:.3f}'
+                    ' мс на запрос'
+                )
@@ -0,0 +1,95 @@
+from random import Random
+from statistics import mean, quantiles
+from time import perf_counter
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.transaction import atomic, set_rollback
+
+from api.v1.filters import RecipeFilterSet
+from backend.settings import PAGE_SIZE
+from recipes.models import Recipe, Tag
+
+
+class Command(BaseCommand):
+    """Сравнивает фильтр рецептов по тэгам через JOIN и через маску тэгов.
+
+    При необходимости добавляет рецепты до --size штук командой
+    generate_dataset внутри транзакции, которая в конце откатывается.
+    Каждый запрос - как в списке рецептов: число найденных и первая
+    страница по дате создания.
+    """
+
+    help = 'Микробенчмарк фильтра по тэгам: JOIN против маски тэгов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100_000,
+                            help='Сколько рецептов должно быть в базе.')
+        parser.add_argument('--queries', type=int, default=100,
+                            help='Сколько запросов с фильтром выполнить.')
+        parser.add_argument('--max-tags', type=int, default=3,
+                            help='Максимум тэгов в одном запросе.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random = Random(options['seed'])
+        tags = list(Tag.objects.all())
+        if not tags:
+            raise CommandError('В базе нет тэгов.')
+        with atomic():
+            missing = options['size'] - Recipe.objects.count()
+            if missing > 0:
+                call_command(
+                    'generate_dataset', recipes=missing, follows=0,
+                    favorites=0, carts=0, seed=options['seed'],
+                    stdout=self.stdout,
+                )
+            queries = [
+                random.sample(tags, random.randint(
+                    1, min(options['max_tags'], len(tags))
+                )) for _ in range(options['queries'])
+            ]
+            for query in queries:
+                if self.join(query)[0] != self.mask(query)[0]:
+                    raise CommandError(
+                        f'Результаты расходятся для тэгов {query}.'
+                    )
+            self.report('join', [
+                self.measure(lambda: self.join(query)) for query in queries
+            ])
+            self.report('mask', [
+                self.measure(lambda: self.mask(query)) for query in queries
+            ])
+            set_rollback(True)
+
+    @staticmethod
+    def page(queryset):
+        """Число рецептов и id первой страницы."""
+        return queryset.count(), list(queryset.order_by(
+            '-created', '-id'
+        ).values_list('id', flat=True)[:PAGE_SIZE])
+
+    def join(self, tags):
+        """Прежний фильтр: JOIN с тэгами и DISTINCT."""
+        return self.page(Recipe.objects.filter(tags__in=tags).distinct())
+
+    def mask(self, tags):
+        """Фильтр списка рецептов по маске тэгов."""
+        return self.page(RecipeFilterSet(
+            {'tags': [tag.slug for tag in tags]}, Recipe.objects.all()
+        ).qs)
+
+    @staticmethod
+    def measure(function):
+        """Время выполнения функции в миллисекундах."""
+        start = perf_counter()
+        function()
+        return (perf_counter() - start) * 1000
+
+    def report(self, name, timings):
+        """Выведет среднее и перцентили."""
+        p50, p95, p99 = (quantiles(timings, n=100)[i] for i in (49, 94, 98))
+        self.stdout.write(
+            f'{name:>6}: mean {mean(timings):.3f} мс, p50 {p50:.3f} мс, '
+            f'p95 {p95:.3f} мс, p99 {p99:.3f} мс'
+        )
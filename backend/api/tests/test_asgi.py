@@ -0,0 +1,77 @@
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, TestCase
+from rest_framework.authtoken.models import Token
+
+from asgiref.sync import async_to_sync
+
+from api.v1.async_views import recipe_detail
+from backend.asgi import StreamingASGIHandler
+from recipes.models import Favoritism, Recipe
+from users.models import User
+
+
+class AsgiTest(TestCase):
+    """Асинхронный режим сервера."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Пользователь с токеном и рецепт у него в избранном."""
+        cls.user = User.objects.create(
+            username='user', email='user@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipe = Recipe.objects.create(
+            name='Рецепт', text='Описание', author=cls.user, cooking_time=10,
+        )
+        Favoritism.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def test_streaming_response_is_read_lazily(self):
+        """Куски потокового ответа читаются по одному, и база доступна."""
+        events = []
+
+        def content():
+            for number in range(3):
+                events.append(('read', Recipe.objects.count()))
+                yield f'{number}'.encode()
+
+        async def send(message):
+            events.append((message['type'], message.get('body')))
+
+        async_to_sync(StreamingASGIHandler().send_response)(
+            StreamingHttpResponse(content()), send
+        )
+        self.assertEqual(events, [
+            ('http.response.start', None),
+            ('read', 1), ('http.response.body', b'0'),
+            ('read', 1), ('http.response.body', b'1'),
+            ('read', 1), ('http.response.body', b'2'),
+            ('http.response.body', None),
+        ])
+
+    def test_recipe_detail(self):
+        """Асинхронный рецепт отвечает так же, как представление DRF."""
+        path = f'/api/recipes/{self.recipe.id}/'
+        for name, headers in (
+            ('anonymous', {}),
+            ('token', {'HTTP_AUTHORIZATION': f'Token {self.token.key}'}),
+        ):
+            with self.subTest(name):
+                response = async_to_sync(recipe_detail)(
+                    RequestFactory().get(
+                        path, HTTP_ACCEPT='application/json', **headers
+                    ),
+                    self.recipe.id,
+                )
+                if hasattr(response, 'render'):
+                    response.render()
+                expected = self.client.get(
+                    path, HTTP_ACCEPT='application/json', **headers
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response['Allow'], expected['Allow'])
+        response = async_to_sync(recipe_detail)(
+            RequestFactory().get('/api/recipes/0/'), 0
+        )
+        self.assertEqual(response.status_code, 404)
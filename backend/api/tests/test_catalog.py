@@ -0,0 +1,52 @@
+from django.test import TestCase
+
+from api.v1.cache import ingredients_cache, tags_cache
+from api.v1.filters import RecipeFilterSet, used_tags_mask
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+class CatalogCacheTest(TestCase):
+    """Сброс кэша каталогов."""
+
+    def test_bump_after_commit(self):
+        """Версия каталога меняется только после фиксации транзакции."""
+        for cache, create in (
+            (tags_cache, lambda: Tag.objects.create(
+                name='Завтрак', slug='breakfast')),
+            (ingredients_cache, lambda: Ingredient.objects.create(
+                name='соль', measurement_unit='г')),
+        ):
+            with self.subTest(cache.name):
+                version = cache.get_version()
+                with self.captureOnCommitCallbacks(execute=True):
+                    create()
+                    self.assertEqual(cache.get_version(), version)
+                self.assertNotEqual(cache.get_version(), version)
+
+    def test_used_tags_mask(self):
+        """Фильтр по тэгам читает занятые биты раз на версию каталога."""
+        author = User.objects.create(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        tags_cache.bump()
+        breakfast = Tag.objects.create(name='Завтрак', slug='breakfast')
+        recipe = Recipe.objects.create(
+            name='Рецепт', text='Описание', author=author, cooking_time=10,
+        )
+        recipe.tags.set([breakfast])
+        Recipe.objects.filter(id=recipe.id).update(tags_mask=breakfast.mask)
+
+        def filter_tags(*slugs):
+            return list(RecipeFilterSet(
+                {'tags': slugs}, Recipe.objects.all()
+            ).qs.values_list('id', flat=True))
+
+        self.assertEqual(filter_tags('breakfast'), [recipe.id])
+        with self.assertNumQueries(2):
+            self.assertEqual(filter_tags('breakfast'), [recipe.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            dinner = Tag.objects.create(name='Ужин', slug='dinner')
+        self.assertEqual(used_tags_mask.get(), breakfast.mask | dinner.mask)
+        self.assertEqual(filter_tags('dinner'), [])
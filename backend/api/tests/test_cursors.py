@@ -0,0 +1,71 @@
+import json
+from base64 import urlsafe_b64encode
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import User
+
+
+def encode_cursor(position, reverse=0):
+    """Курсор в том же формате, что у FootgramCursorPagination."""
+    data = json.dumps({'p': position, 'r': reverse})
+    return urlsafe_b64encode(data.encode()).decode()
+
+
+class CursorTest(TestCase):
+    """Курсорная пагинация списка рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Автор и несколько рецептов."""
+        author = User.objects.create(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        for number in range(3):
+            Recipe.objects.create(
+                name=f'Рецепт {number}', text='Описание', author=author,
+                cooking_time=10,
+            )
+
+    def test_walk(self):
+        """Ссылки next и previous ведут по страницам и обратно."""
+        client = APIClient()
+        first = client.get('/api/recipes/', {'cursor': '', 'limit': 2})
+        second = client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 1)
+        back = client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_tampered_cursor(self):
+        """Подделанный курсор - 404, а не ошибка сервера."""
+        client = APIClient()
+        for position in (
+            ['garbage', 1],
+            ['2024-01-01T00:00:00+00:00', 'garbage'],
+            [None, 1],
+            [{'created': 1}, 1],
+            ['2024-01-01T00:00:00+00:00', 10 ** 30],
+            ['2024-01-01T00:00:00+00:00'],
+        ):
+            with self.subTest(position=position):
+                response = client.get(
+                    '/api/recipes/', {'cursor': encode_cursor(position)}
+                )
+                self.assertEqual(response.status_code, 404)
+        response = client.get('/api/recipes/', {'cursor': 'не base64'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_search(self):
+        """Курсор с поиском - 400: порядок по релевантности, а не по ключу."""
+        client = APIClient()
+        response = client.get('/api/recipes/', {'cursor': '', 'search': '1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.data)
+        response = client.get('/api/recipes/', {'cursor': '', 'search': ' '})
+        self.assertEqual(response.status_code, 200)
+        response = client.get('/api/recipes/', {'search': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
@@ -0,0 +1,34 @@
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from recipes.models import Ingredient
+
+
+class LoadIngredientsTest(TestCase):
+    """Загрузка ингредиентов из CSV."""
+
+    def load(self, content):
+        """Загрузит CSV с содержимым content."""
+        with TemporaryDirectory() as directory:
+            path = Path(directory) / 'ingredients.csv'
+            path.write_text(content, encoding='utf-8')
+            call_command('load_ingredients', str(path), stdout=StringIO())
+
+    def test_load(self):
+        """Заголовок и пустые строки пропускаются."""
+        self.load('name,measurement_unit\nсоль,г\n\nмука,  кг \n')
+        self.assertEqual(
+            dict(Ingredient.objects.values_list('name', 'measurement_unit')),
+            {'соль': 'г', 'мука': 'кг'},
+        )
+
+    def test_short_row(self):
+        """Строка из одного столбца - ошибка с её номером, без загрузки."""
+        with self.assertRaisesMessage(CommandError, 'строка 3'):
+            self.load('соль,г\nмука,кг\nсахар\n')
+        self.assertFalse(Ingredient.objects.exists())
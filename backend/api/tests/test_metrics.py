@@ -0,0 +1,47 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from users.models import User
+
+
+class MetricsAccessTest(TestCase):
+    """Доступ к /metrics."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Обычный пользователь и сотрудник."""
+        cls.user = User.objects.create(
+            username='user', email='user@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        cls.staff = User.objects.create(
+            username='staff', email='staff@foodgram.ru',
+            first_name='Имя', last_name='Фамилия', is_staff=True,
+        )
+
+    @mock.patch('api.v1.views.METRICS_TOKEN', 'secret')
+    def test_access(self):
+        """Метрики отдаются по токену и сотрудникам, остальным - 403."""
+        for name, user, headers, expected in (
+            ('anonymous', None, {}, 403),
+            ('user', self.user, {}, 403),
+            ('wrong token', None, {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+             403),
+            ('token', None, {'HTTP_AUTHORIZATION': 'Bearer secret'}, 200),
+            ('staff', self.staff, {}, 200),
+        ):
+            with self.subTest(name):
+                self.client.logout()
+                if user is not None:
+                    self.client.force_login(user)
+                response = self.client.get('/metrics', **headers)
+                self.assertEqual(response.status_code, expected)
+
+    @mock.patch('api.v1.views.METRICS_TOKEN', None)
+    def test_no_token(self):
+        """Без METRICS_TOKEN заголовок не открывает доступ."""
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer None'
+        )
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,170 @@
+from random import Random
+from unittest import mock, skipIf
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, TestCase
+
+from recipes import pantry
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.pantry import PantryIndex, PantryIndexHolder
+from users.models import User
+
+
+class PantryIndexTest(SimpleTestCase):
+    """Индекс продуктов в памяти процесса."""
+
+    @staticmethod
+    def get_index(seed, recipes=300, ingredients=40):
+        """Индекс случайных рецептов, часть рецептов заменена."""
+        random = Random(seed)
+        index = PantryIndex(
+            (recipe_id, ingredient_id) for recipe_id in range(1, recipes + 1)
+            for ingredient_id in sorted(random.sample(
+                range(ingredients), random.randint(1, 8)))
+        )
+        for recipe_id in random.sample(range(1, recipes + 1), recipes // 10):
+            index.add(recipe_id, set(random.sample(
+                range(ingredients), random.randint(0, 8))))
+        return index, random
+
+    @skipIf(pantry.numpy is None, 'NumPy не установлен.')
+    def test_numpy_matches_python(self):
+        """NumPy и чистый Python ранжируют одинаково, с равными покрытиями."""
+        for seed in range(5):
+            index, random = self.get_index(seed)
+            for _ in range(20):
+                ingredient_ids = set(random.sample(
+                    range(45), random.randint(1, 10)))
+                postings = [index.postings[ingredient_id]
+                            for ingredient_id in ingredient_ids
+                            if ingredient_id in index.postings]
+                if not postings:
+                    continue
+                for limit in (1, 5, 50, 1000):
+                    with self.subTest(seed=seed, limit=limit):
+                        expected = index.rank_python(postings, limit)
+                        self.assertEqual(
+                            index.rank_numpy(postings, limit), expected
+                        )
+                        self.assertEqual(
+                            index.rank(ingredient_ids, limit), expected
+                        )
+
+    def test_rank(self):
+        """Покрытие, затем число совпадений, затем более новый рецепт."""
+        index = PantryIndex([
+            (1, 1), (1, 2), (2, 1), (3, 1), (3, 2), (3, 3), (4, 1), (4, 2),
+        ])
+        with mock.patch.object(pantry, 'numpy', None):
+            self.assertEqual(index.rank({1, 2}, 10), [
+                (4, 1.0), (1, 1.0), (2, 1.0), (3, 2 / 3),
+            ])
+            index.add(4, set())
+            self.assertEqual(index.rank({1, 2}, 2), [(1, 1.0), (2, 1.0)])
+            self.assertEqual(index.rank({9}, 10), [])
+
+    def test_garbage(self):
+        """Заменённые позиции пропускаются и считаются мусором."""
+        index = PantryIndex([(1, 1), (2, 1), (3, 1), (4, 1)])
+        index.add(1, {2})
+        self.assertEqual(index.rank({1}, 10), [(4, 1.0), (3, 1.0), (2, 1.0)])
+        self.assertFalse(index.needs_rebuild)
+        index.add(2, {2})
+        index.add(3, {2})
+        self.assertTrue(index.needs_rebuild)
+
+
+class PantryIndexHolderTest(TestCase):
+    """Индекс процесса: журнал изменений в общем кэше и пересборка."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Десять рецептов, у каждого - свой ингредиент и общий."""
+        author = User.objects.create(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        cls.common, *cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            ) for number in range(11)
+        ]
+        cls.recipes = []
+        for ingredient in cls.ingredients:
+            recipe = Recipe.objects.create(
+                name='Рецепт', text='Описание', author=author,
+                cooking_time=10,
+            )
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient=cls.common,
+                                 amount=1),
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=1),
+            ])
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        """Два процесса с общим кэшем журнала."""
+        shared = LocMemCache('pantry-test', {})
+        shared.clear()
+        patcher = mock.patch.object(
+            PantryIndexHolder, 'shared', new_callable=mock.PropertyMock,
+            return_value=shared,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.shared = shared
+        self.writer, self.reader = PantryIndexHolder(), PantryIndexHolder()
+        for holder in (self.writer, self.reader):
+            holder.rank([self.common.id], 1)
+
+    def drop_ingredient(self, recipe):
+        """Оставит у рецепта только общий ингредиент."""
+        RecipeIngredient.objects.filter(recipe=recipe).exclude(
+            ingredient=self.common).delete()
+        self.writer.refresh([recipe.id])
+
+    def test_journal_replay(self):
+        """Чужое изменение применяется из журнала, без пересборки."""
+        recipe = self.recipes[0]
+        index = self.reader.index
+        self.drop_ingredient(recipe)
+        with self.assertNumQueries(1):
+            ranked = self.reader.rank([self.common.id], 1)
+        self.assertIs(self.reader.index, index)
+        self.assertEqual(ranked, [(recipe.id, 1.0)])
+        self.assertEqual(self.reader.position, self.writer.position)
+
+    def test_evicted_journal(self):
+        """Если запись журнала вытеснена, индекс собирается заново."""
+        recipe = self.recipes[0]
+        index = self.reader.index
+        self.drop_ingredient(recipe)
+        self.shared.delete(
+            f'{PantryIndexHolder.journal_key}:{self.writer.position}'
+        )
+        self.assertEqual(
+            self.reader.rank([self.common.id], 1), [(recipe.id, 1.0)]
+        )
+        self.assertIsNot(self.reader.index, index)
+
+    def test_garbage_rebuild(self):
+        """Когда мусора больше PANTRY_GARBAGE_RATIO, индекс собирается заново.
+
+        Из журнала индекс обновляется до тех пор, пока мусора немного.
+        """
+        index = self.reader.index
+        changed = self.recipes[:3]
+        for recipe in changed:
+            self.drop_ingredient(recipe)
+        with mock.patch.object(pantry, 'PANTRY_GARBAGE_RATIO', 0.25):
+            self.reader.rank([self.common.id], 1)
+            self.assertIs(self.reader.index, index)
+            self.drop_ingredient(self.recipes[3])
+            ranked = self.reader.rank([self.common.id], 10)
+        self.assertIsNot(self.reader.index, index)
+        self.assertEqual(self.reader.index.garbage, 0)
+        self.assertEqual(ranked[:4], [
+            (recipe.id, 1.0) for recipe in reversed(self.recipes[:4])
+        ])
+        self.assertEqual({coverage for _, coverage in ranked[4:]}, {0.5})
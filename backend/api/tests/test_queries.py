@@ -0,0 +1,148 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favoritism, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+RECIPES_NUMBER = 30
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+# Запросы к базе: страница рецептов, тэги, ингредиенты рецептов и сами
+# ингредиенты пачкой. Постраничная пагинация добавляет COUNT(*), токен -
+# поиск пользователя.
+RECIPE_QUERIES = 4
+COUNT_QUERIES = 1
+TOKEN_QUERIES = 1
+
+
+class RecipeQueriesTest(TestCase):
+    """Число запросов к базе у списка и страницы рецепта.
+
+    Не должно зависеть от размера страницы: флаги пользователя считаются
+    подзапросами, связи подгружаются пачкой.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        """Авторы, подписки, рецепты с тэгами и ингредиентами, избранное."""
+        cls.user, *authors = [
+            User.objects.create(
+                username=f'user{number}', email=f'user{number}@foodgram.ru',
+                first_name='Имя', last_name='Фамилия',
+            ) for number in range(4)
+        ]
+        Follow.objects.bulk_create([
+            Follow(user=cls.user, following=author) for author in authors[:2]
+        ])
+        tags = [Tag.objects.create(name=f'Тэг {number}', slug=f'tag{number}')
+                for number in range(3)]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            ) for number in range(10)
+        ]
+        for number in range(RECIPES_NUMBER):
+            recipe = Recipe.objects.create(
+                name=f'Рецепт {number}', text='Описание',
+                author=authors[number % len(authors)], cooking_time=10,
+            )
+            recipe.tags.set(tags[:1 + number % len(tags)])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredients[(number + shift) % 10],
+                    amount=shift + 1,
+                )
+                for shift in range(1 + number % 4)
+            ])
+            if number % 2:
+                Favoritism.objects.create(user=cls.user, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        cls.recipe = Recipe.objects.order_by('id').first()
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        """Клиенты: анонимный и с токеном пользователя."""
+        self.anonymous = APIClient()
+        self.authorized = APIClient()
+        self.authorized.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def get_clients(self):
+        """Клиенты и число запросов на проверку пользователя."""
+        return (
+            ('anonymous', self.anonymous, 0),
+            ('authorized', self.authorized, TOKEN_QUERIES),
+        )
+
+    def test_list_queries(self):
+        """Список рецептов при разном размере страницы."""
+        for name, client, extra in self.get_clients():
+            for limit in (1, 6, RECIPES_NUMBER):
+                with self.subTest(client=name, limit=limit):
+                    with self.assertNumQueries(
+                            RECIPE_QUERIES + COUNT_QUERIES + extra):
+                        response = client.get(
+                            '/api/recipes/', {'limit': limit}
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), limit)
+
+    def test_cursor_list_queries(self):
+        """Список рецептов с курсорной пагинацией, без COUNT(*)."""
+        for name, client, extra in self.get_clients():
+            for limit in (1, 6, RECIPES_NUMBER):
+                with self.subTest(client=name, limit=limit):
+                    with self.assertNumQueries(RECIPE_QUERIES + extra):
+                        response = client.get(
+                            '/api/recipes/', {'cursor': '', 'limit': limit}
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(len(response.data['results']), limit)
+
+    def test_detail_queries(self):
+        """Страница рецепта."""
+        for name, client, extra in self.get_clients():
+            with self.subTest(client=name):
+                with self.assertNumQueries(RECIPE_QUERIES + extra):
+                    response = client.get(f'/api/recipes/{self.recipe.id}/')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['id'], self.recipe.id)
+
+    def test_unchanged_patch_writes_only_recipe(self):
+        """PATCH без изменений пишет только строку рецепта.
+
+        Ингредиенты, тэги, поисковый вектор и подписи похожести
+        не перезаписываются.
+        """
+        author = APIClient()
+        author.credentials(HTTP_AUTHORIZATION='Token {}'.format(
+            Token.objects.create(user=self.recipe.author).key
+        ))
+        data = {
+            'name': self.recipe.name,
+            'text': self.recipe.text,
+            'cooking_time': self.recipe.cooking_time,
+            'tags': list(self.recipe.tags.values_list('id', flat=True)),
+            'ingredients': [
+                {'id': ingredient_id, 'amount': amount}
+                for ingredient_id, amount in RecipeIngredient.objects.filter(
+                    recipe=self.recipe).values_list('ingredient_id', 'amount')
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = author.patch(
+                f'/api/recipes/{self.recipe.id}/', data, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        writes = [
+            query['sql'] for query in queries
+            if query['sql'].startswith(WRITE_STATEMENTS)
+        ]
+        self.assertEqual(len(writes), 1, writes)
+        self.assertIn(Recipe._meta.db_table, writes[0])
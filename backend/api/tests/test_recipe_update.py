@@ -0,0 +1,111 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            RecipeSignature, RecipeTag, Tag)
+from users.models import User
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+LINK_TABLES = (RecipeIngredient._meta.db_table, RecipeTag._meta.db_table,
+               RecipeSignature._meta.db_table)
+
+
+class RecipeUpdateTest(TestCase):
+    """Изменение рецепта пишет в связи только разницу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Автор с токеном, рецепт с тремя ингредиентами и двумя тэгами."""
+        cls.author = User.objects.create(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        cls.token = Token.objects.create(user=cls.author)
+        cls.tags = [
+            Tag.objects.create(name=f'Тэг {number}', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            ) for number in range(4)
+        ]
+        cls.recipe = Recipe.objects.create(
+            name='Рецепт', text='Описание', author=cls.author,
+            cooking_time=10,
+        )
+        cls.recipe.tags.set(cls.tags[:2])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=cls.recipe, ingredient=ingredient,
+                             amount=number + 1)
+            for number, ingredient in enumerate(cls.ingredients[:3])
+        ])
+
+    def setUp(self):
+        """Клиент с токеном автора."""
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def patch(self, ingredients, tags):
+        """Изменит рецепт, вернет запросы, изменившие таблицы связей."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', {
+                    'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': amount}
+                        for ingredient, amount in ingredients
+                    ],
+                    'tags': [tag.id for tag in tags],
+                }, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith(WRITE_STATEMENTS)
+            and any(table in query['sql'] for table in LINK_TABLES)
+        ]
+
+    def get_ingredients(self):
+        """Словарь ингредиент -> (id строки, количество) рецепта."""
+        rows = RecipeIngredient.objects.filter(recipe=self.recipe)
+        return {
+            ingredient_id: (row_id, amount) for row_id, ingredient_id, amount
+            in rows.values_list('id', 'ingredient_id', 'amount')
+        }
+
+    def test_diff(self):
+        """Удаление, изменение и вставка - по одному запросу на действие."""
+        first, second, third, fourth = self.ingredients
+        before = self.get_ingredients()
+        writes = self.patch(
+            [(first, 1), (second, 20), (fourth, 4)], self.tags[1:]
+        )
+        after = self.get_ingredients()
+        self.assertEqual(set(after), {first.id, second.id, fourth.id})
+        self.assertEqual(after[first.id], before[first.id])
+        self.assertEqual(after[second.id], (before[second.id][0], 20))
+        self.assertEqual(after[fourth.id][1], 4)
+        self.assertEqual(set(RecipeTag.objects.filter(
+            recipe=self.recipe).values_list('tag_id', flat=True)),
+            {tag.id for tag in self.tags[1:]})
+        link_writes = [sql for sql in writes
+                       if RecipeSignature._meta.db_table not in sql]
+        self.assertEqual(
+            sorted(sql.split()[0] for sql in link_writes),
+            ['DELETE', 'DELETE', 'INSERT', 'INSERT', 'UPDATE'],
+        )
+
+    def test_noop(self):
+        """PATCH без изменений не пишет в связи и не считает подписи."""
+        before = self.get_ingredients()
+        writes = self.patch(
+            [(ingredient, number + 1)
+             for number, ingredient in enumerate(self.ingredients[:3])],
+            self.tags[:2],
+        )
+        self.assertEqual(writes, [])
+        self.assertEqual(self.get_ingredients(), before)
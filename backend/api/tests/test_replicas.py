@@ -0,0 +1,135 @@
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.v1.replicas import (PIN_COOKIE, ReplicaRouter, RequestState,
+                             request_state)
+from backend.test_settings import TEST_REPLICA
+from recipes.models import Recipe, Tag
+from users.models import User
+
+# Зеркало есть только в настройках backend.test_settings.
+HAS_TEST_REPLICA = TEST_REPLICA in settings.DATABASES
+
+
+@skipUnless(HAS_TEST_REPLICA, 'Нужны настройки backend.test_settings.')
+class ReplicaRoutingTest(TransactionTestCase):
+    """Маршрутизация чтения в реплику.
+
+    Реплика - зеркало основной базы (TEST_REPLICA): те же данные, но
+    отдельное соединение, по которому и видно, куда ушёл запрос.
+    TransactionTestCase фиксирует данные, поэтому реплика их видит.
+    """
+
+    databases = {'default', TEST_REPLICA} if HAS_TEST_REPLICA else {'default'}
+
+    def setUp(self):
+        """Пользователь с токеном и рецептом, реплика, пустой кэш."""
+        self.user = User.objects.create(
+            username='user', email='user@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.recipe = Recipe.objects.create(
+            name='Рецепт', text='Описание', author=self.user, cooking_time=10,
+        )
+        patcher = mock.patch(
+            'api.v1.replicas.DATABASE_REPLICAS', [TEST_REPLICA]
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        caches['default'].clear()
+
+    def get_client(self):
+        """Клиент с токеном пользователя."""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return client
+
+    def get_queries(self, request):
+        """Выполнит request(), вернет число запросов к основной и реплике."""
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections[TEST_REPLICA]) as replica:
+                request()
+        return len(primary), len(replica)
+
+    def test_safe_reads_go_to_replica(self):
+        """GET без записи читает из реплики, токен - из основной базы."""
+        responses = []
+        primary, replica = self.get_queries(
+            lambda: responses.append(APIClient().get('/api/recipes/'))
+        )
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertEqual(responses[0].data['count'], 1)
+        primary, replica = self.get_queries(
+            lambda: self.get_client().get('/api/recipes/')
+        )
+        self.assertEqual(primary, 1)
+        self.assertGreater(replica, 0)
+
+    def test_reads_after_write_go_to_primary(self):
+        """После записи запрос читает из основной базы."""
+        router = ReplicaRouter()
+        token = request_state.set(RequestState(TEST_REPLICA))
+        try:
+            self.assertEqual(router.db_for_read(Recipe), TEST_REPLICA)
+            primary, replica = self.get_queries(Recipe.objects.count)
+            self.assertEqual((primary, replica), (0, 1))
+            Tag.objects.create(name='Завтрак', slug='breakfast')
+            self.assertIsNone(router.db_for_read(Recipe))
+            primary, replica = self.get_queries(Recipe.objects.count)
+            self.assertEqual((primary, replica), (1, 0))
+        finally:
+            request_state.reset(token)
+
+    def test_unsafe_requests_use_primary(self):
+        """POST и читает, и пишет в основной базе."""
+        primary, replica = self.get_queries(lambda: self.get_client().post(
+            f'/api/recipes/{self.recipe.id}/favorite/'
+        ))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_pinned_by_cookie(self):
+        """Cookie закрепления отправляет чтение в основную базу."""
+        client = APIClient()
+        client.cookies[PIN_COOKIE] = '1'
+        primary, replica = self.get_queries(
+            lambda: client.get('/api/recipes/')
+        )
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_pinned_after_write(self):
+        """После записи клиент читает из основной базы.
+
+        Закрепление ставится и в cookie, и в кэш по токену: второй клиент
+        с тем же токеном, но без cookie (другой процесс или устройство),
+        тоже читает из основной базы, а клиент без токена - из реплики.
+        """
+        client = self.get_client()
+        response = client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        for name, reader in (
+            ('cookie', client),
+            ('cache', self.get_client()),
+        ):
+            with self.subTest(pinned_by=name):
+                primary, replica = self.get_queries(
+                    lambda: reader.get('/api/recipes/')
+                )
+                self.assertGreater(primary, 0)
+                self.assertEqual(replica, 0)
+        primary, replica = self.get_queries(
+            lambda: APIClient().get('/api/recipes/')
+        )
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
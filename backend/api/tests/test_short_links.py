@@ -0,0 +1,49 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.v1.cache import short_links_cache
+from backend.settings import SHORT_LINK_CACHE_TIMEOUT
+from recipes.models import Recipe
+from users.models import User
+
+
+class ShortLinkCacheTest(TestCase):
+    """Кэш коротких ссылок в памяти процесса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Рецепт с короткой ссылкой."""
+        author = User.objects.create(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        cls.recipe = Recipe.objects.create(
+            name='Рецепт', text='Описание', author=author, cooking_time=10,
+        )
+        cls.short = cls.recipe.short_link.short
+
+    def setUp(self):
+        """Пустой кэш."""
+        short_links_cache.data.clear()
+
+    def test_entry_expires(self):
+        """Запись устаревает через SHORT_LINK_CACHE_TIMEOUT секунд.
+
+        Так другие процессы, которым сигнал удаления не виден, перестают
+        перенаправлять на удалённый рецепт.
+        """
+        response = self.client.get(f'/s/{self.short}/')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(short_links_cache.get(self.short), self.recipe.id)
+        # Удаление в другом процессе: сигнал этот кэш не сбрасывает.
+        with mock.patch('api.v1.signals.short_links_cache'):
+            self.recipe.delete()
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/s/{self.short}/')
+        self.assertEqual(response.status_code, 302)
+        with mock.patch('api.v1.cache.monotonic',
+                        return_value=10 ** 9 + SHORT_LINK_CACHE_TIMEOUT):
+            response = self.client.get(f'/s/{self.short}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNone(short_links_cache.get(self.short))
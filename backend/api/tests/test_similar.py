@@ -0,0 +1,114 @@
+from random import Random
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase, TestCase
+
+from recipes import similar
+from recipes.models import (Ingredient, Recipe, RecipeBucket, RecipeIngredient,
+                            RecipeTag, Tag)
+from recipes.similar import (COEFFICIENTS, PRIME, SIMILAR_BANDS, SIMILAR_ROWS,
+                             get_features, get_signatures, get_similar_recipes,
+                             update_signatures)
+from users.models import User
+
+
+def get_minimums(features):
+    """Минимумы хэшей ингредиентов и тэгов по определению MinHash."""
+    return [
+        min([(a * x + b) % PRIME for x in features if x & 1 == parity],
+            default=PRIME)
+        for parity in (0, 1) for a, b in COEFFICIENTS
+    ]
+
+
+class SignaturesTest(SimpleTestCase):
+    """Подписи MinHash и выбор полос для LSH."""
+
+    def setUp(self):
+        """Наборы рецептов: пустой, только тэги, только ингредиенты, смесь."""
+        random = Random(1)
+        self.feature_lists = [
+            [], get_features([], [1, 2]), get_features([5, 7, 9], []),
+        ] + [
+            get_features(random.sample(range(1, 2000), random.randint(1, 12)),
+                         random.sample(range(1, 20), random.randint(0, 4)))
+            for _ in range(50)
+        ]
+
+    @skipIf(similar.numpy is None, 'NumPy не установлен.')
+    def test_numpy_matches_python(self):
+        """NumPy и чистый Python дают одни и те же подписи и полосы."""
+        expected = get_signatures(self.feature_lists)
+        with mock.patch.object(similar, 'numpy', None):
+            self.assertEqual(get_signatures(self.feature_lists), expected)
+
+    def test_bands(self):
+        """В индекс попадают полосы, где хотя бы один минимум - ингредиент."""
+        with mock.patch.object(similar, 'numpy', None):
+            signatures = get_signatures(self.feature_lists)
+        self.assertIsNone(signatures[0])
+        self.assertEqual(signatures[1][1], [])
+        self.assertEqual(signatures[2][1], list(range(SIMILAR_BANDS)))
+        permutations = len(COEFFICIENTS)
+        for features, (signature, bands) in zip(
+                self.feature_lists[1:], signatures[1:]):
+            minimums = get_minimums(features)
+            ingredients = minimums[:permutations]
+            tags = minimums[permutations:]
+            self.assertEqual(list(signature),
+                             list(map(min, ingredients, tags)))
+            self.assertEqual(bands, [
+                band for band in range(SIMILAR_BANDS) if any(
+                    ingredients[number] < tags[number] for number in range(
+                        band * SIMILAR_ROWS, (band + 1) * SIMILAR_ROWS))
+            ])
+
+
+class SimilarRecipesTest(TestCase):
+    """Похожие рецепты по подписям в базе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Два рецепта с одними ингредиентами и рецепт с тем же тэгом."""
+        author = User.objects.create(
+            username='author', email='author@foodgram.ru',
+            first_name='Имя', last_name='Фамилия',
+        )
+        tag = Tag.objects.create(name='Тэг', slug='tag')
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            ) for number in range(6)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                name='Рецепт', text='Описание', author=author,
+                cooking_time=10,
+            ) for _ in range(3)
+        ]
+        for recipe, recipe_ingredients in zip(
+                cls.recipes, (ingredients[:3], ingredients[:3],
+                              ingredients[3:])):
+            RecipeTag.objects.create(recipe=recipe, tag=tag)
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=1)
+                for ingredient in recipe_ingredients
+            ])
+        update_signatures([recipe.id for recipe in cls.recipes])
+
+    def test_similar(self):
+        """Общий тэг без общих ингредиентов не делает рецепты кандидатами."""
+        first, second, other = self.recipes
+        self.assertEqual(
+            get_similar_recipes(first.id, 10), [(second.id, 1.0)]
+        )
+        (_, bands), = get_signatures([get_features(
+            first.ingredients.values_list('id', flat=True),
+            first.tags.values_list('id', flat=True),
+        )])
+        self.assertEqual(
+            RecipeBucket.objects.filter(recipe=first).count(), len(bands)
+        )
+        self.assertEqual(get_similar_recipes(other.id, 10), [])
+        self.assertIsNone(get_similar_recipes(0, 10))
@@ -0,0 +1,65 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import Follow, User
+
+USERS_TABLE = User._meta.db_table
+
+
+class SubscribeTest(TestCase):
+    """Подписка одним INSERT ... ON CONFLICT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Пользователь с токеном и автор с рецептом."""
+        cls.user, cls.author = [
+            User.objects.create(
+                username=name, email=f'{name}@foodgram.ru',
+                first_name='Имя', last_name='Фамилия',
+            ) for name in ('user', 'author')
+        ]
+        cls.token = Token.objects.create(user=cls.user)
+        Recipe.objects.create(
+            name='Рецепт', text='Описание', author=cls.author,
+            cooking_time=10,
+        )
+
+    def setUp(self):
+        """Клиент с токеном пользователя."""
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_subscribe(self):
+        """До вставки подписки автор читается из базы один раз."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                f'/api/users/{self.author.id}/subscribe/'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertTrue(response.data['is_subscribed'])
+        self.assertEqual(len(response.data['recipes']), 1)
+        self.assertTrue(Follow.objects.filter(
+            user=self.user, following=self.author).exists())
+        statements = [query['sql'] for query in context.captured_queries]
+        insert = next(number for number, sql in enumerate(statements)
+                      if sql.startswith('INSERT'))
+        self.assertEqual(sum(
+            sql.startswith('SELECT') and f'FROM "{USERS_TABLE}"' in sql
+            for sql in statements[:insert]
+        ), 1)
+        response = self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_subscribe_errors(self):
+        """Подписка на себя - 400, на несуществующего пользователя - 404."""
+        response = self.client.post(f'/api/users/{self.user.id}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('following', response.data)
+        response = self.client.post('/api/users/0/subscribe/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Follow.objects.exists())
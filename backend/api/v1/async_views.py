@@ -0,0 +1,164 @@
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+from asgiref.sync import sync_to_async
+
+from recipes.models import Recipe
+from .cache import (etag_matches, ingredients_cache, short_links_cache,
+                    tags_cache)
+from .search import ingredient_index
+from .serializers import RecipeReadSerializer
+from .views import (IngredientViewSer, RecipeViewSet, TagViewSet,
+                    annotate_recipes, get_positive_int,
+                    get_short_link_recipe_id, redirect_to_recipe)
+
+# Обычные представления DRF, в которые уходят запросы, требующие базы.
+tag_list_view = sync_to_async(TagViewSet.as_view({'get': 'list'}))
+tag_detail_view = sync_to_async(TagViewSet.as_view({'get': 'retrieve'}))
+ingredient_list_view = sync_to_async(
+    IngredientViewSer.as_view({'get': 'list'})
+)
+ingredient_detail_view = sync_to_async(
+    IngredientViewSer.as_view({'get': 'retrieve'})
+)
+recipe_detail_view = sync_to_async(RecipeViewSet.as_view(
+    {'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}
+))
+
+
+def json_response(data, headers=None, allow='GET, HEAD, OPTIONS'):
+    """JSON-ответ с теми же заголовками, что у ответа DRF."""
+    response = HttpResponse(
+        JSONRenderer().render(data), content_type='application/json'
+    )
+    response['Vary'] = 'Accept'
+    response['Allow'] = allow
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def catalog_response(request, data, etag):
+    """Вернет данные каталога или 304, если у клиента актуальная версия."""
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if etag_matches(request, etag):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+    return json_response(data, headers)
+
+
+def wants_json(request):
+    """Проверит, что это GET и клиент ждёт JSON, а не страницу DRF."""
+    return request.method == 'GET' and 'text/html' not in request.headers.get(
+        'Accept', '')
+
+
+def peek_catalog(request, cache):
+    """Запись каталога, если на запрос можно ответить без ввода-вывода.
+
+    Отвечать прямо в цикле событий можно только на GET в JSON, если
+    каталог уже собран в памяти процесса.
+    """
+    if not wants_json(request):
+        return None
+    return cache.peek()
+
+
+async def catalog_detail(request, pk, cache, view):
+    """Объект каталога из памяти или через обычное представление."""
+    entry = peek_catalog(request, cache)
+    item = entry and entry.items.get(pk)
+    if item is None:
+        return await view(request, pk=pk)
+    return catalog_response(request, *item)
+
+
+async def tag_list(request):
+    """Список тэгов.
+
+    Из памяти процесса отвечает без потоков, аутентификации и базы;
+    остальное - обычное представление DRF в потоке запроса.
+    """
+    entry = peek_catalog(request, tags_cache)
+    if entry is None:
+        return await tag_list_view(request)
+    return catalog_response(request, entry.data, entry.etag)
+
+
+async def tag_detail(request, pk):
+    """Тэг."""
+    return await catalog_detail(request, pk, tags_cache, tag_detail_view)
+
+
+async def ingredient_list(request):
+    """Список ингредиентов и поиск по названию.
+
+    Поиск идёт по индексу в памяти, если он уже собран для текущей
+    версии каталога, иначе - обычным представлением в потоке.
+    """
+    entry = peek_catalog(request, ingredients_cache)
+    if entry is None:
+        return await ingredient_list_view(request)
+    name = request.GET.get('name')
+    if not name:
+        return catalog_response(request, entry.data, entry.etag)
+    index = ingredient_index.peek(entry)
+    if index is None:
+        return await ingredient_list_view(request)
+    return json_response(index.search(
+        name, get_positive_int(request.GET.get('limit'))
+    ))
+
+
+async def ingredient_detail(request, pk):
+    """Ингредиент."""
+    return await catalog_detail(
+        request, pk, ingredients_cache, ingredient_detail_view
+    )
+
+
+async def redirect_short_link(request, short):
+    """Обрабатывает короткие ссылки.
+
+    При попадании в LRU-кэш отвечает без потоков и базы, при промахе
+    ищет ссылку одним запросом в потоке.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(('GET', 'HEAD'))
+    recipe_id = short_links_cache.get(short)
+    if recipe_id is None:
+        recipe_id = await sync_to_async(get_short_link_recipe_id)(short)
+    return redirect_to_recipe(request, recipe_id)
+
+
+def read_recipe(request, pk):
+    """Рецепт для анонимного запроса или None, если его нет.
+
+    Пользователь - AnonymousUser, как его назначила бы DRF без токена, а
+    не пользователь сессии.
+    """
+    request.user = AnonymousUser()
+    recipe = annotate_recipes(Recipe.objects.all(), request.user).filter(
+        pk=pk).first()
+    if recipe is None:
+        return None
+    return RecipeReadSerializer(recipe, context={'request': request}).data
+
+
+async def recipe_detail(request, pk):
+    """Рецепт.
+
+    Анонимный GET в JSON читает и сериализует рецепт за один переход в
+    поток, без аутентификации и согласования формата DRF. Запросы с
+    токеном, изменения и отсутствующий рецепт - обычное представление
+    DRF в потоке.
+    """
+    if wants_json(request) and 'Authorization' not in request.headers:
+        data = await sync_to_async(read_recipe)(request, pk)
+        if data is not None:
+            return json_response(data, allow='GET, PATCH, DELETE')
+    return await recipe_detail_view(request, pk=pk)
@@ -0,0 +1,248 @@
+import json
+from collections import OrderedDict, namedtuple
+from hashlib import sha1
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.http import Http404
+from rest_framework import status
+from rest_framework.response import Response
+
+from backend.settings import (CACHES, CATALOG_CACHE_ALIAS,
+                              CATALOG_CACHE_LOCAL_TIMEOUT,
+                              SHORT_LINK_CACHE_SIZE, SHORT_LINK_CACHE_TIMEOUT)
+
+CatalogEntry = namedtuple(
+    'CatalogEntry', ('version', 'data', 'etag', 'items', 'expires')
+)
+
+
+def get_etag(data):
+    """Вернет сильный ETag для сериализованных данных."""
+    content = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return f'"{sha1(content.encode()).hexdigest()}"'
+
+
+def etag_matches(request, etag):
+    """Проверит, есть ли etag в заголовке If-None-Match запроса."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    return '*' in tags or etag in tags
+
+
+class CatalogCache:
+    """Кэш редко меняющегося каталога (тэги, ингредиенты).
+
+    Сериализованный каталог хранится в памяти процесса и, если в CACHES
+    настроен CATALOG_CACHE_ALIAS, в общем кэше под номером версии.
+    Версия меняется сигналами post_save/post_delete, после чего следующий
+    запрос соберет каталог заново. Без общего кэша другие процессы
+    увидят изменения не позже чем через CATALOG_CACHE_LOCAL_TIMEOUT секунд.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.version_key = f'catalog:{name}:version'
+        self.local_version = uuid4().hex
+        self.entry = None
+        self.lock = Lock()
+
+    @property
+    def shared(self):
+        """Общий кэш, если он настроен."""
+        if CATALOG_CACHE_ALIAS in CACHES:
+            return caches[CATALOG_CACHE_ALIAS]
+        return None
+
+    def get_version(self):
+        """Вернет текущую версию каталога."""
+        if self.shared is None:
+            return self.local_version
+        version = self.shared.get(self.version_key)
+        if version is None:
+            self.shared.add(self.version_key, self.local_version, None)
+            version = self.shared.get(self.version_key, self.local_version)
+        return version
+
+    def bump(self):
+        """Сбросит кэш, назначив каталогу новую версию."""
+        with self.lock:
+            self.local_version = uuid4().hex
+            self.entry = None
+        if self.shared is not None:
+            self.shared.set(self.version_key, self.local_version, None)
+
+    def peek(self):
+        """Вернет запись каталога из памяти процесса или None.
+
+        Запись отдаётся, только если для неё не нужно обращаться ни к базе,
+        ни к общему кэшу, то есть без ввода-вывода.
+        """
+        entry = self.entry
+        if (self.shared is None and entry is not None
+                and entry.version == self.local_version
+                and entry.expires > monotonic()):
+            return entry
+        return None
+
+    def get(self, build):
+        """Вернет запись каталога, при необходимости собрав её через build.
+
+        build - функция без аргументов, возвращающая список словарей.
+        """
+        version = self.get_version()
+        entry = self.entry
+        if entry is not None and entry.version == version and (
+                self.shared is not None or entry.expires > monotonic()):
+            return entry
+        data_key = f'catalog:{self.name}:{version}'
+        data = None if self.shared is None else self.shared.get(data_key)
+        if data is None:
+            data = [dict(item) for item in build()]
+            if self.shared is not None:
+                self.shared.set(data_key, data, None)
+        entry = CatalogEntry(
+            version=version,
+            data=data,
+            etag=get_etag(data),
+            items={item['id']: (item, get_etag(item)) for item in data},
+            expires=monotonic() + CATALOG_CACHE_LOCAL_TIMEOUT,
+        )
+        with self.lock:
+            if self.local_version == version or self.shared is not None:
+                self.entry = entry
+        return entry
+
+
+class CatalogValue:
+    """Значение, которое меняется только вместе с каталогом.
+
+    build - функция без аргументов, читающая значение из базы. Значение
+    пересчитывается после смены версии каталога, а без общего кэша - ещё
+    и не реже чем раз в CATALOG_CACHE_LOCAL_TIMEOUT секунд, как сам
+    каталог.
+    """
+
+    def __init__(self, cache, build):
+        self.cache = cache
+        self.build = build
+        self.built = None
+
+    def get(self):
+        """Вернет значение для текущей версии каталога."""
+        version = self.cache.get_version()
+        built = self.built
+        if built is not None and built[0] == version and (
+                self.cache.shared is not None or built[2] > monotonic()):
+            return built[1]
+        value = self.build()
+        self.built = (
+            version, value, monotonic() + CATALOG_CACHE_LOCAL_TIMEOUT
+        )
+        return value
+
+
+class LRUCache:
+    """Ограниченный по размеру кэш в памяти процесса.
+
+    При переполнении вытесняются записи, к которым дольше всего не
+    обращались. Если задан timeout, запись живёт не дольше timeout секунд:
+    сигналы сбрасывают кэш только своего процесса, а остальные процессы
+    перестают отдавать устаревшую запись по истечении срока.
+    """
+
+    def __init__(self, maxsize, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.data = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        """Вернет значение по ключу или None."""
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Сохранит значение, вытеснив самую старую запись при переполнении."""
+        expires = None
+        if self.timeout is not None:
+            expires = monotonic() + self.timeout
+        with self.lock:
+            self.data[key] = (value, expires)
+            self.data.move_to_end(key)
+            if len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        """Удалит запись по ключу."""
+        with self.lock:
+            self.data.pop(key, None)
+
+    def delete_value(self, value):
+        """Удалит все записи с указанным значением."""
+        with self.lock:
+            for key in [key for key, (item, _) in self.data.items()
+                        if item == value]:
+                del self.data[key]
+
+
+tags_cache = CatalogCache('tags')
+ingredients_cache = CatalogCache('ingredients')
+# Короткая ссылка -> id рецепта.
+short_links_cache = LRUCache(SHORT_LINK_CACHE_SIZE, SHORT_LINK_CACHE_TIMEOUT)
+
+
+class CatalogCacheMixin:
+    """Отдаёт список и объекты каталога из CatalogCache с ETag.
+
+    Если в If-None-Match пришёл актуальный ETag, вернется 304 без обращения
+    к базе данных. Запросы с параметрами фильтрации из
+    catalog_filter_params идут обычным путём.
+    """
+
+    catalog_cache = None
+    catalog_filter_params = ()
+
+    def build_catalog(self):
+        """Сериализует весь каталог."""
+        return self.get_serializer(self.get_queryset(), many=True).data
+
+    @staticmethod
+    def catalog_response(request, data, etag):
+        """Вернет данные или 304, если у клиента актуальная версия."""
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers=headers)
+        return Response(data, headers=headers)
+
+    def list(self, request, *args, **kwargs):
+        """Список объектов каталога из кэша."""
+        if any(request.query_params.get(param)
+               for param in self.catalog_filter_params):
+            return super().list(request, *args, **kwargs)
+        entry = self.catalog_cache.get(self.build_catalog)
+        return self.catalog_response(request, entry.data, entry.etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Объект каталога из кэша."""
+        entry = self.catalog_cache.get(self.build_catalog)
+        try:
+            item = entry.items.get(int(kwargs[self.lookup_field]))
+        except (TypeError, ValueError):
+            item = None
+        if item is None:
+            raise Http404
+        return self.catalog_response(request, *item)
@@ -1,10 +1,15 @@
-from django.db.models import Case, IntegerField, Q, Value, When
 from django_filters.rest_framework import (BooleanFilter, CharFilter,
                                            FilterSet,
                                            ModelMultipleChoiceFilter,
                                            NumberFilter)
 
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_ingredients, search_recipes
+from recipes.tags import filter_by_tags_mask, get_tags_mask, get_used_mask
+from .cache import CatalogValue, tags_cache
+
+# Объединение битов всех тэгов: один запрос на версию каталога тэгов.
+used_tags_mask = CatalogValue(tags_cache, lambda: get_used_mask(Tag))
 
 
 class IngredientFilter(FilterSet):
@@ -21,15 +26,7 @@ class IngredientFilter(FilterSet):
     def filter_name(self, queryset, name, value):
         """Фильтр для ингредиентов. Сначала идут те, что начинаются с value,
         после - которые только содержат value."""
-        return queryset.filter(
-            Q(name__istartswith=value) | Q(name__icontains=value)
-        ).annotate(
-            priority=Case(
-                When(name__istartswith=value, then=Value(1)),
-                default=Value(2),
-                output_field=IntegerField(),
-            )
-        ).order_by('priority', 'name')
+        return search_ingredients(queryset, value)
 
 
 class RecipeFilterSet(FilterSet):
@@ -39,10 +36,12 @@ class RecipeFilterSet(FilterSet):
         queryset=Tag.objects.all(),
         field_name='tags__slug',
         to_field_name='slug',
+        method='filter_tags',
     )
     is_in_shopping_cart = BooleanFilter(method='filter_is_in_shopping_cart')
     is_favorited = BooleanFilter(method='filter_is_favorited')
     author = NumberFilter(method='filter_author')
+    search = CharFilter(method='filter_search')
 
     class Meta:
         """Метаданные."""
@@ -50,6 +49,14 @@ class RecipeFilterSet(FilterSet):
         model = Recipe
         fields = ('tags',)
 
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тэгов, по маске тэгов без JOIN."""
+        if not value:
+            return queryset
+        return filter_by_tags_mask(
+            queryset, get_tags_mask(value), used_tags_mask.get()
+        )
+
     def filter_is_in_shopping_cart(self, queryset, name, value):
         """Фильтр для отсеивания рецептов в корзине."""
         if value and self.request.user.is_authenticated:
@@ -67,3 +74,7 @@ class RecipeFilterSet(FilterSet):
         if value:
             return queryset.filter(author_id=value)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию, описанию и ингредиентам, по релевантности."""
+        return search_recipes(queryset, value)
@@ -0,0 +1,305 @@
+import atexit
+import json
+import os
+from bisect import bisect_left
+from contextvars import ContextVar
+from threading import Lock
+from time import monotonic, perf_counter
+
+from django.db import connection
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from backend.settings import (METRICS_DIR, METRICS_FLUSH_INTERVAL,
+                              METRICS_LATENCY_BUCKETS, METRICS_QUERIES_BUCKETS,
+                              METRICS_SIZE_BUCKETS)
+
+HISTOGRAMS = {
+    'foodgram_http_request_duration_seconds': (
+        'Время обработки запроса.', METRICS_LATENCY_BUCKETS
+    ),
+    'foodgram_http_response_size_bytes': (
+        'Размер тела ответа.', METRICS_SIZE_BUCKETS
+    ),
+    'foodgram_db_queries_per_request': (
+        'Число SQL-запросов на один запрос.', METRICS_QUERIES_BUCKETS
+    ),
+}
+COUNTERS = {
+    'foodgram_db_query_duration_seconds_total': (
+        'Суммарное время SQL-запросов.'
+    ),
+}
+
+
+class Metrics:
+    """Метрики одного процесса.
+
+    Гистограммы хранятся как {имя: {метки: [счётчики корзин, сумма,
+    количество]}}, счётчики - как {имя: {метки: значение}}. Метки -
+    кортеж пар (имя, значение). Если задан METRICS_DIR, процесс не чаще
+    раза в METRICS_FLUSH_INTERVAL секунд сбрасывает свои метрики в файл
+    metrics_<pid>.json, а collect() складывает файлы всех процессов.
+    Файлы завершившихся процессов остаются, поэтому счётчики не
+    уменьшаются при перезапуске воркеров gunicorn.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.lock = Lock()
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.counters = {name: {} for name in COUNTERS}
+        self.flushed = 0
+
+    def observe(self, name, labels, value):
+        """Добавит наблюдение в гистограмму name."""
+        buckets = HISTOGRAMS[name][1]
+        with self.lock:
+            series = self.histograms[name].get(labels)
+            if series is None:
+                series = self.histograms[name][labels] = [
+                    [0] * (len(buckets) + 1), 0, 0
+                ]
+            series[0][bisect_left(buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def inc(self, name, labels, value=1):
+        """Увеличит счётчик name."""
+        with self.lock:
+            series = self.counters[name]
+            series[labels] = series.get(labels, 0) + value
+
+    def dump(self):
+        """Снимок метрик процесса в виде, пригодном для JSON."""
+        with self.lock:
+            return {
+                'histograms': {
+                    name: [[list(labels), list(buckets), total, count]
+                           for labels, (buckets, total, count)
+                           in data.items()]
+                    for name, data in self.histograms.items()
+                },
+                'counters': {
+                    name: [[list(labels), value]
+                           for labels, value in data.items()]
+                    for name, data in self.counters.items()
+                },
+            }
+
+    def get_path(self, pid=None):
+        """Путь к файлу метрик процесса."""
+        return os.path.join(
+            self.directory, f'metrics_{pid or os.getpid()}.json'
+        )
+
+    def flush(self, force=False):
+        """Атомарно запишет метрики процесса в METRICS_DIR."""
+        if self.directory is None:
+            return
+        now = monotonic()
+        if not force and now - self.flushed < METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.get_path()
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(self.dump(), file)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Сложит метрики всех процессов."""
+        snapshots = [self.dump()]
+        if self.directory is not None and os.path.isdir(self.directory):
+            own = os.path.basename(self.get_path())
+            for name in os.listdir(self.directory):
+                if (name == own or not name.startswith('metrics_')
+                        or not name.endswith('.json')):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name),
+                              encoding='utf-8') as file:
+                        snapshots.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+        histograms = {name: {} for name in HISTOGRAMS}
+        counters = {name: {} for name in COUNTERS}
+        for snapshot in snapshots:
+            for name, data in snapshot['histograms'].items():
+                for labels, buckets, total, count in data:
+                    labels = tuple(map(tuple, labels))
+                    series = histograms[name].setdefault(
+                        labels, [[0] * len(buckets), 0, 0]
+                    )
+                    for index, value in enumerate(buckets):
+                        series[0][index] += value
+                    series[1] += total
+                    series[2] += count
+            for name, data in snapshot['counters'].items():
+                for labels, value in data:
+                    labels = tuple(map(tuple, labels))
+                    counters[name][labels] = (
+                        counters[name].get(labels, 0) + value
+                    )
+        return histograms, counters
+
+    def render(self):
+        """Метрики всех процессов в текстовом формате Prometheus."""
+        histograms, counters = self.collect()
+        lines = []
+        for name, data in histograms.items():
+            description, bounds = HISTOGRAMS[name]
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, (buckets, total, count) in sorted(data.items()):
+                cumulative = 0
+                for bound, value in zip((*bounds, '+Inf'), buckets):
+                    cumulative += value
+                    lines.append('{0}_bucket{1} {2}'.format(
+                        name, format_labels((*labels, ('le', bound))),
+                        cumulative
+                    ))
+                lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+        for name, data in counters.items():
+            lines.append(f'# HELP {name} {COUNTERS[name]}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, value in sorted(data.items()):
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    """Метки в формате Prometheus: {имя="значение",...}."""
+    if not labels:
+        return ''
+    return '{{{0}}}'.format(','.join(
+        '{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    ))
+
+
+# Таймер SQL-запросов текущего HTTP-запроса. Через контекст он доходит и
+# до потоков, в которых sync_to_async выполняет код с ORM.
+query_timer = ContextVar('query_timer', default=None)
+
+
+class QueryTimer:
+    """execute_wrapper, считающий SQL-запросы и их суммарное время."""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.duration += perf_counter() - start
+
+
+def time_query(execute, sql, params, many, context):
+    """execute_wrapper всех соединений: учтёт запрос в таймере запроса."""
+    timer = query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Собирает метрики запросов.
+
+    Для каждого запроса пишет время обработки, размер ответа, число и
+    время SQL-запросов с метками имени маршрута (для DRF - действие
+    вьюсета, например recipes-list) и HTTP-метода. Для потоковых ответов
+    метрики пишутся после отдачи последнего куска. Работает и под WSGI, и
+    под ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        start = perf_counter()
+        token = query_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            query_timer.reset(token)
+        return self.finish(request, response, timer, start)
+
+    async def __acall__(self, request):
+        """То же под ASGI.
+
+        Куски потокового ответа читает в потоке StreamingASGIHandler из
+        backend.asgi, поэтому учёт запросов в stream() работает и здесь.
+        """
+        timer = QueryTimer()
+        start = perf_counter()
+        token = query_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_timer.reset(token)
+        return self.finish(request, response, timer, start)
+
+    def finish(self, request, response, timer, start):
+        """Запишет метрики ответа, потокового - после последнего куска."""
+        match = request.resolver_match
+        labels = (
+            ('view', match.url_name or match.view_name if match
+             else 'unmatched'),
+            ('method', request.method),
+        )
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response, response.streaming_content, labels, timer, start
+            )
+        else:
+            self.observe(response, labels, timer, start,
+                         len(response.content))
+        return response
+
+    def stream(self, response, content, labels, timer, start):
+        """Отдаст потоковый ответ, посчитав его размер и запросы."""
+        size = 0
+        with connection.execute_wrapper(timer):
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        self.observe(response, labels, timer, start, size)
+
+    @staticmethod
+    def observe(response, labels, timer, start, size):
+        """Запишет метрики одного запроса."""
+        metrics.observe(
+            'foodgram_http_request_duration_seconds',
+            (*labels, ('status', response.status_code)),
+            perf_counter() - start,
+        )
+        metrics.observe('foodgram_http_response_size_bytes', labels, size)
+        metrics.observe(
+            'foodgram_db_queries_per_request', labels, timer.queries
+        )
+        metrics.inc(
+            'foodgram_db_query_duration_seconds_total', labels,
+            timer.duration
+        )
+        metrics.flush()
+
+
+metrics = Metrics(METRICS_DIR)
+atexit.register(metrics.flush, force=True)
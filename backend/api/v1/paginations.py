@@ -1,6 +1,24 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from functools import reduce
+from operator import or_
 
-from backend.settings import PAGE_SIZE, PAGE_SIZE_QUERY_PARAM
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import ValidationError as BadRequest
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from backend.settings import (CURSOR_QUERY_PARAM, PAGE_SIZE,
+                              PAGE_SIZE_QUERY_PARAM)
+from recipes.feed import get_feed_page
+from recipes.models import Recipe
+
+# Целые значения позиции курсора по модулю не больше предела bigint.
+MAX_CURSOR_INT = 2 ** 63 - 1
 
 
 class FootgramPageNumberPagination(PageNumberPagination):
@@ -8,3 +26,201 @@ class FootgramPageNumberPagination(PageNumberPagination):
 
     page_size = PAGE_SIZE
     page_size_query_param = PAGE_SIZE_QUERY_PARAM
+
+
+class FootgramCursorPagination(CursorPagination):
+    """Курсорный (keyset) пагинатор для Footgram.
+
+    Позиция в курсоре хранит значения всех полей сортировки, например пару
+    (created, id), поэтому следующая страница выбирается условием по индексу,
+    без OFFSET и без COUNT(*). Стоимость запроса не зависит от номера
+    страницы. Порядок берётся из атрибута cursor_ordering представления.
+    """
+
+    page_size = PAGE_SIZE
+    page_size_query_param = PAGE_SIZE_QUERY_PARAM
+    cursor_query_param = CURSOR_QUERY_PARAM
+    ordering = ('-created', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_ordering(self, request, queryset, view):
+        """Вернет поля сортировки для представления."""
+        return tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Вернет страницу объектов после позиции из курсора."""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.position, self.reverse = self.decode_cursor(
+            request, queryset.model
+        )
+        ordering = (self.ordering if not self.reverse
+                    else tuple(map(self.invert, self.ordering)))
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(ordering, self.position)
+            )
+        return self.set_page(list(queryset[:self.page_size + 1]))
+
+    def set_page(self, results):
+        """Запомнит страницу из page_size + 1 строк и наличие соседних."""
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_previous, self.has_next = (
+                has_more, self.position is not None
+            )
+        else:
+            self.has_previous, self.has_next = (
+                self.position is not None, has_more
+            )
+        return self.page
+
+    @staticmethod
+    def invert(field):
+        """Поменяет направление сортировки поля."""
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_keyset_filter(ordering, position):
+        """Условие "строго после позиции" для составного ключа сортировки.
+
+        Для ('-created', '-id') и позиции (c, i) получится
+        created < c OR (created = c AND id < i).
+        """
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): value for previous, value
+                in zip(ordering[:index], position[:index])
+            }
+            conditions.append(Q(**equal, **{f'{name}__{lookup}':
+                                            position[index]}))
+        return reduce(or_, conditions)
+
+    def get_position(self, instance):
+        """Вернет значения полей сортировки объекта."""
+        return [
+            getattr(instance, field.lstrip('-')) for field in self.ordering
+        ]
+
+    def get_next_link(self):
+        """Ссылка на следующую страницу."""
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor((self.get_position(self.page[-1]), False))
+
+    def get_previous_link(self):
+        """Ссылка на предыдущую страницу."""
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor((self.get_position(self.page[0]), True))
+
+    def decode_cursor(self, request, model):
+        """Разберёт курсор из запроса. Пустой курсор - первая страница.
+
+        Значения позиции приводятся к типам полей сортировки модели, чтобы
+        подделанный курсор давал 404, а не ошибку базы.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = data['p'], bool(data['r'])
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(
+                self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            position = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if any(value is None or isinstance(value, int)
+               and abs(value) > MAX_CURSOR_INT for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, cursor):
+        """Закодирует позицию в непрозрачную строку и вернет ссылку."""
+        position, reverse = cursor
+        data = json.dumps({'p': [
+            value.isoformat() if isinstance(value, (date, datetime))
+            else value for value in position
+        ], 'r': int(reverse)}, separators=(',', ':'))
+        encoded = urlsafe_b64encode(data.encode('ascii')).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def get_paginated_response(self, data):
+        """Ответ с курсорами, без общего количества объектов."""
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class FeedCursorPagination(FootgramCursorPagination):
+    """Курсорный пагинатор ленты подписок.
+
+    Лента собирается из нескольких источников (см. recipes.feed), поэтому
+    страница выбирается не из одного queryset, а функцией get_feed_page.
+    Курсоры те же, что у FootgramCursorPagination: позиция (created, id).
+    """
+
+    def paginate_feed(self, request, user):
+        """Вернет позиции рецептов страницы ленты пользователя."""
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.position, self.reverse = self.decode_cursor(request, Recipe)
+        ordering = (self.ordering if not self.reverse
+                    else tuple(map(self.invert, self.ordering)))
+        return self.set_page(get_feed_page(
+            user, ordering, self.position, self.page_size + 1,
+            self.get_keyset_filter,
+        ))
+
+
+class CursorPaginationMixin:
+    """Включает курсорную пагинацию, если в запросе есть параметр cursor.
+
+    Первая страница запрашивается с пустым курсором: ?cursor=
+    Без параметра используется обычная постраничная пагинация. Параметры
+    из cursor_conflicts меняют порядок выдачи, и курсор по cursor_ordering
+    с ними не работает: такой запрос получит 400.
+    """
+
+    cursor_pagination_class = FootgramCursorPagination
+    cursor_conflicts = ()
+
+    @property
+    def paginator(self):
+        """Вернет пагинатор в зависимости от параметров запроса."""
+        params = self.request.query_params
+        if (
+            not hasattr(self, '_paginator')
+            and self.pagination_class is not None
+            and CURSOR_QUERY_PARAM in params
+        ):
+            conflicts = [name for name in self.cursor_conflicts
+                         if params.get(name, '').strip()]
+            if conflicts:
+                raise BadRequest({CURSOR_QUERY_PARAM: [
+                    'Курсор нельзя использовать с параметрами: '
+                    f'{", ".join(conflicts)}.'
+                ]})
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
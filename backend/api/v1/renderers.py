@@ -0,0 +1,94 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class Echo:
+    """Буфер для csv.writer, который просто возвращает записанную строку."""
+
+    def write(self, value):
+        """Вернет переданную строку."""
+        return value
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Сам список отдаётся потоково методом stream(rows, by_recipe) форматов
+    txt, csv и json, render используется только для ответов с ошибками.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Отрисует ответ с ошибкой."""
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """Список покупок в виде текста."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Отрисует ответ с ошибкой."""
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data or '').encode(self.charset)
+
+    def stream(self, rows, by_recipe=False):
+        """Строки вида "Картофель - 300 г.", по рецептам - с заголовками."""
+        recipe_id = None
+        for row in rows:
+            if by_recipe and row['recipe_id'] != recipe_id:
+                recipe_id = row['recipe_id']
+                yield f'{row["recipe_name"]}:\n'
+            yield '{0}{1} - {2} {3}.\n'.format(
+                '    ' if by_recipe else '', row['name'].capitalize(),
+                row['total_amount'], row['measurement_unit'],
+            )
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """Список покупок в формате CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows, by_recipe=False):
+        """Строка заголовков и по строке на ингредиент."""
+        writer = csv.writer(Echo())
+        fields = ('name', 'total_amount', 'measurement_unit')
+        if by_recipe:
+            fields = ('recipe_name',) + fields
+        yield writer.writerow(
+            ('recipe',) * by_recipe + ('name', 'amount', 'measurement_unit')
+        )
+        for row in rows:
+            yield writer.writerow([row[field] for field in fields])
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """Список покупок в формате JSON, массив объектов."""
+
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows, by_recipe=False):
+        """Массив отдаётся по одному объекту, без сборки в памяти."""
+        separator = '['
+        for row in rows:
+            item = {
+                'name': row['name'],
+                'amount': row['total_amount'],
+                'measurement_unit': row['measurement_unit'],
+            }
+            if by_recipe:
+                item = {'recipe': row['recipe_name'], **item}
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
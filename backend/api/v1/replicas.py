@@ -0,0 +1,145 @@
+from contextvars import ContextVar
+from hashlib import sha1
+from random import choice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.permissions import SAFE_METHODS
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+
+from backend.settings import (CACHES, CATALOG_CACHE_ALIAS, DATABASE_REPLICAS,
+                              REPLICA_PIN_SECONDS)
+
+PIN_COOKIE = 'primary_pin'
+# Токены и сессии всегда читаются из основной базы: токен, только что
+# выданный при входе, мог ещё не дойти до реплики.
+PRIMARY_MODELS = {'authtoken.token', 'sessions.session'}
+
+
+class RequestState:
+    """Из какой базы читает текущий запрос и менял ли он данные."""
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+request_state = ContextVar('request_state', default=None)
+
+
+class ReplicaRouter:
+    """Направляет чтение безопасных запросов в реплику.
+
+    Реплику на весь запрос выбирает ReplicaMiddleware. Запись всегда идёт
+    в основную базу, и после первой записи запрос читает тоже из неё.
+    Вне запросов (команды, shell, фоновые потоки) всё идёт в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        """Реплика запроса или None - основная база."""
+        state = request_state.get()
+        if state is None or model._meta.label_lower in PRIMARY_MODELS:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        """Основная база; запрос запомнит, что менял данные."""
+        state = request_state.get()
+        if state is not None:
+            state.replica = None
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Реплики содержат те же данные, связи между ними допустимы."""
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Миграции применяются только к основной базе."""
+        return db not in DATABASE_REPLICAS
+
+
+def get_pin_cache():
+    """Общий кэш, если он настроен, иначе кэш процесса."""
+    if CATALOG_CACHE_ALIAS in CACHES:
+        return caches[CATALOG_CACHE_ALIAS]
+    return caches['default']
+
+
+def get_pin_key(request):
+    """Ключ закрепления за основной базой по токену или сессии клиента."""
+    credential = request.headers.get('Authorization') or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return f'replica:pin:{sha1(credential.encode()).hexdigest()}'
+
+
+class ReplicaMiddleware:
+    """Выбирает базу для чтения и закрепляет писавших клиентов за основной.
+
+    GET, HEAD и OPTIONS читают из случайной реплики. Если клиент менял
+    данные последние REPLICA_PIN_SECONDS секунд, его запросы читают из
+    основной базы, чтобы он сразу видел свои изменения. Закрепление
+    хранится в кэше по токену или сессии и в cookie: без общего кэша
+    другие процессы узнают о нём только из cookie. Работает и под WSGI, и
+    под ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key, state = self.get_state(request)
+        token = request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_state.reset(token)
+        return self.pin(request, response, key, state)
+
+    async def __acall__(self, request):
+        """То же под ASGI, обращения к кэшу - в потоке."""
+        key, state = await sync_to_async(self.get_state)(request)
+        token = request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_state.reset(token)
+        return await sync_to_async(self.pin)(request, response, key, state)
+
+    @staticmethod
+    def get_state(request):
+        """Ключ закрепления клиента и база для чтения в запросе."""
+        key = get_pin_key(request)
+        pinned = PIN_COOKIE in request.COOKIES or (
+            key is not None and get_pin_cache().get(key))
+        return key, RequestState(
+            choice(DATABASE_REPLICAS)
+            if request.method in SAFE_METHODS and not pinned else None
+        )
+
+    @staticmethod
+    def pin(request, response, key, state):
+        """Закрепит за основной базой клиента, который менял данные."""
+        if state.wrote or request.method not in SAFE_METHODS:
+            if key is not None:
+                get_pin_cache().set(key, True, REPLICA_PIN_SECONDS)
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,101 @@
+from array import array
+from bisect import bisect_left
+from threading import Lock
+
+NGRAM_MAX_LENGTH = 3
+MAX_CHARACTER = chr(0x10FFFF)
+
+
+def get_ngrams(text, length):
+    """Вернет множество подстрок заданной длины."""
+    return {text[i:i + length] for i in range(len(text) - length + 1)}
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов для поиска по мере набора.
+
+    Названия упорядочены по алфавиту без учёта регистра. Совпадения по
+    началу строки находятся бинарным поиском (это непрерывный отрезок),
+    совпадения по подстроке - через списки позиций n-грамм длиной до
+    NGRAM_MAX_LENGTH, отсортированные по тому же алфавитному порядку.
+    """
+
+    def __init__(self, items):
+        """items - сериализованные ингредиенты со строковым полем name."""
+        self.items = sorted(
+            items, key=lambda item: (item['name'].lower(), item['name'])
+        )
+        self.keys = [item['name'].lower() for item in self.items]
+        postings = {}
+        for position, key in enumerate(self.keys):
+            for length in range(1, NGRAM_MAX_LENGTH + 1):
+                for ngram in get_ngrams(key, length):
+                    postings.setdefault(ngram, []).append(position)
+        self.postings = {
+            ngram: array('I', positions)
+            for ngram, positions in postings.items()
+        }
+
+    def prefix_range(self, query):
+        """Границы отрезка названий, начинающихся с query."""
+        return (bisect_left(self.keys, query),
+                bisect_left(self.keys, query + MAX_CHARACTER))
+
+    def candidates(self, query):
+        """Позиции названий, которые могут содержать query."""
+        length = min(len(query), NGRAM_MAX_LENGTH)
+        postings = []
+        for ngram in get_ngrams(query, length):
+            positions = self.postings.get(ngram)
+            if positions is None:
+                return ()
+            postings.append(positions)
+        return min(postings, key=len)
+
+    def search(self, query, limit=None):
+        """Найдет ингредиенты, содержащие query.
+
+        Сначала идут те, что начинаются с query, после - которые только
+        содержат query; внутри групп по алфавиту.
+        """
+        query = query.lower()
+        if not query:
+            return self.items[:limit]
+        start, end = self.prefix_range(query)
+        results = self.items[
+            start:end if limit is None else min(end, start + limit)
+        ]
+        if limit is not None and len(results) >= limit:
+            return results
+        keys = self.keys
+        for position in self.candidates(query):
+            if start <= position < end or query not in keys[position]:
+                continue
+            results.append(self.items[position])
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+
+class IngredientIndexHolder:
+    """Хранит индекс, собранный по последней версии каталога."""
+
+    def __init__(self):
+        self.built = (None, None)
+        self.lock = Lock()
+
+    def get(self, entry):
+        """Вернет индекс для записи каталога, пересобрав его при смене."""
+        if self.built[0] != entry.etag:
+            with self.lock:
+                if self.built[0] != entry.etag:
+                    self.built = (entry.etag, IngredientIndex(entry.data))
+        return self.built[1]
+
+    def peek(self, entry):
+        """Вернет индекс, если он уже собран для этой записи, иначе None."""
+        etag, index = self.built
+        return index if etag == entry.etag else None
+
+
+ingredient_index = IngredientIndexHolder()
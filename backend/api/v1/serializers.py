@@ -1,14 +1,26 @@
+from django.db.models import prefetch_related_objects
 from django.db.transaction import atomic
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
+from drf_extra_fields.fields import Base64FileField
 from rest_framework.exceptions import ValidationError
-from rest_framework.serializers import (ModelSerializer, ReadOnlyField,
-                                        SerializerMethodField,
+from rest_framework.serializers import (IntegerField, ListField,
+                                        ListSerializer, ModelSerializer,
+                                        ReadOnlyField, SerializerMethodField,
                                         SlugRelatedField)
 
-from backend.settings import RECIPES_LIMIT
+import filetype
+
+from backend.counters import change_counter
+from backend.images import get_variant_urls, schedule_variants
+from backend.settings import BULK_RECIPES_LIMIT, RECIPES_LIMIT
+from recipes.feed import schedule_fan_out
 from recipes.models import (Favoritism, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            RecipeTag, ShoppingCart, ShortLink, Tag)
+from recipes.pantry import schedule_pantry_refresh
+from recipes.search import update_search_vectors
+from recipes.similar import update_signatures
+from recipes.tags import get_tags_mask
+from recipes.utils import get_short_link
 from users.models import Follow, User
 
 
@@ -18,6 +30,29 @@ def is_authenticated_user(object_self):
     return (request, request and request.user.is_authenticated)
 
 
+def get_recipes_limit(request):
+    """Вернет сколько рецептов показывать у автора в подписках."""
+    return RECIPES_LIMIT if not request else int(request.GET.get(
+        'recipes_limit', RECIPES_LIMIT
+    ))
+
+
+class Base64ImageField(Base64FileField):
+    """Картинка в base64.
+
+    Тип определяется по сигнатуре в начале файла, без декодирования всей
+    картинки в запросе. Уменьшенные копии строятся в фоне.
+    """
+
+    ALLOWED_TYPES = ('jpg', 'png', 'gif', 'webp')
+    INVALID_FILE_MESSAGE = 'Загрузите корректную картинку.'
+    INVALID_TYPE_MESSAGE = 'Не удалось определить тип картинки.'
+
+    def get_file_extension(self, filename, decoded_file):
+        """Вернет расширение по сигнатуре файла."""
+        return filetype.guess_extension(decoded_file)
+
+
 class UserFoodgramSerializer(UserSerializer):
     """Сериализатор для модели пользователей.
 
@@ -25,6 +60,7 @@ class UserFoodgramSerializer(UserSerializer):
     """
 
     is_subscribed = SerializerMethodField()
+    avatar_variants = SerializerMethodField()
 
     class Meta:
         """Метаданные."""
@@ -32,12 +68,25 @@ class UserFoodgramSerializer(UserSerializer):
         model = User
         fields = (
             'id', 'email', 'username', 'first_name',
-            'last_name', 'avatar', 'is_subscribed',
+            'last_name', 'avatar', 'avatar_variants', 'is_subscribed',
+            'followers_count',
+        )
+        read_only_fields = ('id', 'avatar', 'is_subscribed',
+                            'followers_count')
+
+    def get_avatar_variants(self, object):
+        """Ссылки на уменьшенные копии аватара."""
+        return get_variant_urls(
+            object.avatar_variants, self.context.get('request', None)
         )
-        read_only_fields = ('id', 'avatar', 'is_subscribed')
 
     def get_is_subscribed(self, object):
-        """Обрабатывает поле is_subscribed."""
+        """Обрабатывает поле is_subscribed.
+
+        Если значение уже аннотировано в запросе, отдельный запрос не нужен.
+        """
+        if hasattr(object, 'is_subscribed'):
+            return object.is_subscribed
         request, result = is_authenticated_user(self)
         return True if result and Follow.objects.filter(
             user=request.user, following=object).exists() else False
@@ -134,6 +183,7 @@ class RecipeReadSerializer(ModelSerializer):
     )
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
+    image_variants = SerializerMethodField()
 
     class Meta:
         """Метаданные."""
@@ -141,20 +191,37 @@ class RecipeReadSerializer(ModelSerializer):
         model = Recipe
         fields = (
             'id', 'name', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'image', 'text', 'cooking_time',
+            'is_in_shopping_cart', 'image', 'image_variants', 'text',
+            'cooking_time', 'favorites_count', 'carts_count',
         )
         read_only_fields = (
             'id', 'is_subscribed', 'is_in_shopping_cart', 'author'
         )
 
+    def to_representation(self, instance):
+        """Передаёт автору аннотированный флаг подписки, если он есть."""
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    def get_image_variants(self, object):
+        """Ссылки на уменьшенные копии картинки."""
+        return get_variant_urls(
+            object.image_variants, self.context.get('request', None)
+        )
+
     def get_is_favorited(self, object):
         """Обрабатывает поле is_favorited."""
+        if hasattr(object, 'is_favorited'):
+            return object.is_favorited
         request, result = is_authenticated_user(self)
         return True if result and Favoritism.objects.filter(
             user=request.user, recipe=object.id).exists() else False
 
     def get_is_in_shopping_cart(self, object):
         """Обрабатывает поле is_in_shopping_cart."""
+        if hasattr(object, 'is_in_shopping_cart'):
+            return object.is_in_shopping_cart
         request, result = is_authenticated_user(self)
         return True if result and ShoppingCart.objects.filter(
             user=request.user, recipe=object.id).exists() else False
@@ -178,8 +245,14 @@ class RecipeWriteSerializer(ModelSerializer):
         )
 
     def to_representation(self, instance):
-        """После создания, вернет эти данные."""
-        serializer = RecipeReadSerializer(instance)
+        """После создания или изменения, вернет эти данные.
+
+        Автор, тэги и ингредиенты подгружаются пачкой, а не по одному.
+        """
+        prefetch_related_objects(
+            [instance], 'author', 'tags', 'ingredient_amount__ingredient'
+        )
+        serializer = RecipeReadSerializer(instance, context=self.context)
         return serializer.data
 
     @atomic
@@ -187,18 +260,38 @@ class RecipeWriteSerializer(ModelSerializer):
         """Обрабатывает создание нового рецепта."""
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
+        recipe = Recipe.objects.create(
+            **validated_data, tags_mask=get_tags_mask(tags)
+        )
         self.create_m2m_for_recipe(recipe, ingredients, tags)
+        update_search_vectors([recipe.id])
+        update_signatures([recipe.id])
+        schedule_pantry_refresh([recipe.id])
         return recipe
 
     @atomic
     def update(self, instance, validated_data):
-        """Обрабатывает изменение рецепта."""
+        """Обрабатывает изменение рецепта.
+
+        Сначала обновляется сам рецепт: UPDATE блокирует его строку, и
+        одновременные изменения одного рецепта не смешают свои разницы.
+        Поисковый вектор, подписи похожести и индекс продуктов
+        пересчитываются, только если изменилось то, из чего они строятся.
+        """
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.create_m2m_for_recipe(instance, ingredients, tags)
-        return super().update(instance, validated_data)
+        validated_data['tags_mask'] = get_tags_mask(tags)
+        searched = (instance.name, instance.text)
+        instance = super().update(instance, validated_data)
+        ingredients_changed = self.update_ingredients(instance, ingredients)
+        tags_changed = self.update_tags(instance, tags)
+        if ingredients_changed or searched != (instance.name, instance.text):
+            update_search_vectors([instance.id])
+        if ingredients_changed or tags_changed:
+            update_signatures([instance.id])
+        if ingredients_changed:
+            schedule_pantry_refresh([instance.id])
+        return instance
 
     @staticmethod
     def create_m2m_for_recipe(recipe, ingredients, tags):
@@ -210,7 +303,66 @@ class RecipeWriteSerializer(ModelSerializer):
                 amount=data['amount'],
             ) for data in ingredients
         ])
-        recipe.tags.set([tag for tag in tags])
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag=tag) for tag in tags
+        ])
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Применит к ингредиентам рецепта только нужные изменения.
+
+        Лишние строки удаляются, изменённые количества обновляются, новые
+        ингредиенты добавляются - каждое действие одним запросом и только
+        если оно нужно. Вернет True, если изменился набор ингредиентов.
+        """
+        stored = {
+            row.ingredient_id: row for row in RecipeIngredient.objects.filter(
+                recipe=recipe).only('id', 'ingredient_id', 'amount')
+        }
+        submitted = {data['id'].id: data for data in ingredients}
+        removed = [
+            row.id for ingredient_id, row in stored.items()
+            if ingredient_id not in submitted
+        ]
+        changed, added = [], []
+        for ingredient_id, data in submitted.items():
+            row = stored.get(ingredient_id)
+            if row is None:
+                added.append(RecipeIngredient(
+                    recipe=recipe, ingredient=data['id'],
+                    amount=data['amount'],
+                ))
+            elif row.amount != data['amount']:
+                row.amount = data['amount']
+                changed.append(row)
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        return bool(removed or added)
+
+    @staticmethod
+    def update_tags(recipe, tags):
+        """Удалит снятые и добавит новые тэги рецепта.
+
+        Вернет True, если набор тэгов изменился.
+        """
+        stored = set(RecipeTag.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        submitted = {tag.id: tag for tag in tags}
+        removed = stored - submitted.keys()
+        if removed:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=removed).delete()
+        added = [
+            RecipeTag(recipe=recipe, tag=tag)
+            for tag_id, tag in submitted.items() if tag_id not in stored
+        ]
+        if added:
+            RecipeTag.objects.bulk_create(added)
+        return bool(removed or added)
 
     def validate(self, attrs):
         """Проверит наличие полей tags и ingredients."""
@@ -247,6 +399,146 @@ class RecipeWriteSerializer(ModelSerializer):
         return orders
 
 
+def bulk_create_with_ids(model, objects):
+    """Вставит объекты пачкой и проставит им id.
+
+    На SQLite Django 3.2 не возвращает id из bulk_create. Вставка идёт
+    внутри транзакции, а после неё база заблокирована на запись до
+    фиксации, поэтому последние len(objects) id принадлежат этой пачке.
+    """
+    model.objects.bulk_create(objects)
+    if objects and objects[0].pk is None:
+        ids = model.objects.order_by('-pk').values_list(
+            'pk', flat=True)[:len(objects)]
+        for instance, pk in zip(objects, reversed(ids)):
+            instance.pk = pk
+
+
+class IngredientBulkSerializer(IngredientWriteSerializer):
+    """Ингредиент рецепта при массовом создании, id проверяется позже."""
+
+    id = IntegerField()
+
+
+class RecipeBulkListSerializer(ListSerializer):
+    """Пачка рецептов для массового создания.
+
+    Сначала проверяется каждый рецепт, потом все упомянутые ингредиенты
+    и тэги находятся одним запросом на таблицу. Ошибки возвращаются
+    списком по рецептам, пустой словарь - рецепт без ошибок. Если ошибка
+    есть хоть у одного рецепта, не создаётся ни один.
+    """
+
+    def to_internal_value(self, data):
+        """Проверит пачку целиком и заменит id на объекты."""
+        if not isinstance(data, list):
+            raise ValidationError(
+                {'non_field_errors': ['Ожидался список рецептов.']}
+            )
+        if not data:
+            raise ValidationError(
+                {'non_field_errors': ['Список рецептов пуст.']}
+            )
+        if len(data) > BULK_RECIPES_LIMIT:
+            raise ValidationError({'non_field_errors': [
+                f'Не больше {BULK_RECIPES_LIMIT} рецептов за раз.'
+            ]})
+        items, errors = [], []
+        for item in data:
+            try:
+                items.append(self.child.run_validation(item))
+                errors.append({})
+            except ValidationError as exc:
+                items.append(None)
+                errors.append(exc.detail)
+        valid = [item for item in items if item is not None]
+        ingredients = Ingredient.objects.in_bulk({
+            ingredient['id']
+            for item in valid for ingredient in item['ingredients']
+        })
+        tags = Tag.objects.in_bulk(
+            {tag for item in valid for tag in item['tags']}
+        )
+        for item, error in zip(items, errors):
+            if item is None:
+                continue
+            for field, found in (('ingredients', ingredients),
+                                 ('tags', tags)):
+                missing = [
+                    value for value in self.get_ids(item, field)
+                    if value not in found
+                ]
+                if missing:
+                    error[field] = [f'Не найдены id: {missing}.']
+        if any(errors):
+            raise ValidationError(errors)
+        for item in items:
+            for ingredient in item['ingredients']:
+                ingredient['id'] = ingredients[ingredient['id']]
+            item['tags'] = [tags[tag] for tag in item['tags']]
+        return items
+
+    @staticmethod
+    def get_ids(item, field):
+        """id ингредиентов или тэгов рецепта."""
+        if field == 'tags':
+            return item['tags']
+        return [ingredient['id'] for ingredient in item['ingredients']]
+
+    @atomic
+    def create(self, validated_data):
+        """Создаст рецепты, их связи и короткие ссылки пачками."""
+        recipes, ingredients, tags = [], [], []
+        for data in validated_data:
+            ingredients.append(data.pop('ingredients'))
+            tags.append(data.pop('tags'))
+            recipes.append(
+                Recipe(**data, tags_mask=get_tags_mask(tags[-1]))
+            )
+        bulk_create_with_ids(Recipe, recipes)
+        ShortLink.objects.bulk_create([
+            ShortLink(recipe=recipe, short=get_short_link(recipe.id))
+            for recipe in recipes
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe, ingredient=data['id'], amount=data['amount']
+            )
+            for recipe, items in zip(recipes, ingredients) for data in items
+        ])
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe, items in zip(recipes, tags) for tag in items
+        ])
+        authors = {}
+        for recipe in recipes:
+            authors[recipe.author_id] = authors.get(recipe.author_id, 0) + 1
+            schedule_variants(recipe, 'image', 'image_variants')
+        for author_id, count in authors.items():
+            change_counter(User, author_id, 'recipes_count', count)
+        update_search_vectors(recipe.id for recipe in recipes)
+        update_signatures(recipe.id for recipe in recipes)
+        schedule_fan_out(recipes)
+        schedule_pantry_refresh(recipe.id for recipe in recipes)
+        return recipes
+
+
+class RecipeBulkSerializer(RecipeWriteSerializer):
+    """Сериализатор одного рецепта в POST /api/recipes/bulk/."""
+
+    tags = ListField(child=IntegerField(), required=True)
+    ingredients = IngredientBulkSerializer(many=True, required=True)
+
+    class Meta(RecipeWriteSerializer.Meta):
+        """Метаданные."""
+
+        list_serializer_class = RecipeBulkListSerializer
+
+    def to_representation(self, instance):
+        """Краткие данные созданного рецепта."""
+        return RecipeShortSerializer(instance, context=self.context).data
+
+
 class RecipeShortSerializer(ModelSerializer):
     """Сериализатор модели рецептов.
 
@@ -254,13 +546,21 @@ class RecipeShortSerializer(ModelSerializer):
     избранного.
     """
 
+    image_variants = SerializerMethodField()
+
     class Meta:
         """Метаданные."""
 
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
+    def get_image_variants(self, object):
+        """Ссылки на уменьшенные копии картинки."""
+        return get_variant_urls(
+            object.image_variants, self.context.get('request', None)
+        )
+
 
 class UserSubscriptionsSerializer(UserFoodgramSerializer):
     """Сериализатор для модели пользователей.
@@ -269,7 +569,6 @@ class UserSubscriptionsSerializer(UserFoodgramSerializer):
     """
 
     recipes = SerializerMethodField()
-    recipes_count = SerializerMethodField()
 
     class Meta:
         """Метаданные."""
@@ -277,49 +576,29 @@ class UserSubscriptionsSerializer(UserFoodgramSerializer):
         model = User
         fields = (
             'id', 'email', 'username', 'first_name',
-            'last_name', 'avatar', 'is_subscribed',
-            'recipes', 'recipes_count',
+            'last_name', 'avatar', 'avatar_variants', 'is_subscribed',
+            'followers_count', 'recipes', 'recipes_count',
         )
         read_only_fields = (
-            'id', 'avatar', 'is_subscribed', 'recipes', 'recipes_count',
+            'id', 'avatar', 'is_subscribed', 'followers_count', 'recipes',
+            'recipes_count',
         )
 
     def get_recipes(self, object):
-        """Обрабатывает поле "рецепты"."""
-        request = self.context.get('request', None)
-        recipes_limit = RECIPES_LIMIT if not request else int(request.GET.get(
-            'recipes_limit', RECIPES_LIMIT
-        ))
-        instance = Recipe.objects.filter(author=object.id)[:recipes_limit]
+        """Обрабатывает поле "рецепты".
+
+        Если рецепты автора уже подгружены пачкой (атрибут latest_recipes),
+        отдельный запрос не нужен.
+        """
+        if hasattr(object, 'latest_recipes'):
+            instance = object.latest_recipes
+        else:
+            recipes_limit = get_recipes_limit(
+                self.context.get('request', None)
+            )
+            instance = Recipe.objects.filter(
+                author=object.id)[:recipes_limit]
         serializer = RecipeShortSerializer(
             instance=instance, many=True,
         )
         return serializer.data
-
-    def get_recipes_count(self, object):
-        """Обрабатывает поле "счетчик рецептов"."""
-        return Recipe.objects.filter(author=object.id).count()
-
-
-class UserSubscribeSerializer(ModelSerializer):
-    """Сериализатор для модели подписки.
-
-    Используется для создания и удаления подписок.
-    """
-
-    class Meta:
-        """Метаданные."""
-
-        model = Follow
-        fields = ('user', 'following')
-
-    def validate_following(self, value):
-        """Проверит поле following."""
-        if self.context['request'].user == value:
-            raise ValidationError('Нельзя подписываться на самого себя.')
-        return value
-
-    def to_representation(self, instance):
-        """После создания, вернет эти данные."""
-        serializer = UserSubscriptionsSerializer(instance['following'])
-        return serializer.data
@@ -0,0 +1,170 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.db.transaction import on_commit
+from django.dispatch import receiver
+
+from backend.counters import change_counter, counter_batch
+from backend.images import schedule_variants
+from recipes.feed import backfill, prune, schedule_fan_out
+from recipes.models import (Favoritism, Ingredient, Recipe, ShoppingCart,
+                            ShortLink, Tag)
+from recipes.pantry import pantry_index, schedule_pantry_refresh
+from recipes.search import update_ingredient_search_vectors
+from recipes.tags import clear_tag_mask, get_used_mask, reconcile_tags_masks
+from users.models import Follow, User
+from .cache import ingredients_cache, short_links_cache, tags_cache
+from .metrics import time_query
+
+
+@receiver(connection_created)
+def install_query_timer(connection, **kwargs):
+    """Подключит к соединению учёт SQL-запросов для метрик.
+
+    Соединения создаются в каждом потоке свои, а учёт должен работать и в
+    потоках sync_to_async, поэтому он подключается к каждому соединению.
+    """
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def reset_tags_cache(**kwargs):
+    """Сбросит кэш тэгов после фиксации изменения тэга.
+
+    До фиксации другой процесс мог бы собрать каталог из старых строк и
+    сохранить его под новой версией.
+    """
+    on_commit(tags_cache.bump)
+
+
+@receiver(post_delete, sender=Tag)
+def clear_deleted_tag_mask(instance, **kwargs):
+    """Снимет бит удалённого тэга с рецептов, чтобы его мог занять новый."""
+    clear_tag_mask(Recipe, instance.mask, get_used_mask(Tag))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_recipe_tags_mask(instance, action, reverse, pk_set, **kwargs):
+    """Обновит маски тэгов после recipe.tags.add(), remove(), set().
+
+    Сериализаторы и админка обновляют маски сами, а этот обработчик
+    покрывает остальные изменения тэгов рецептов через ORM.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        reconcile_tags_masks(recipe_ids=[instance.pk])
+    elif pk_set is not None:
+        reconcile_tags_masks(recipe_ids=pk_set)
+    else:
+        reconcile_tags_masks()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def reset_ingredients_cache(**kwargs):
+    """Сбросит кэш ингредиентов после фиксации изменения ингредиента."""
+    on_commit(ingredients_cache.bump)
+
+
+@receiver(post_delete, sender=Ingredient)
+def reset_pantry_index(**kwargs):
+    """Пересоберёт индекс продуктов: удаление ингредиента меняет рецепты."""
+    on_commit(pantry_index.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(instance, created, **kwargs):
+    """Обновит поисковые векторы рецептов с переименованным ингредиентом."""
+    if not created:
+        update_ingredient_search_vectors(instance.id)
+
+
+@receiver(post_delete, sender=ShortLink)
+def reset_short_link_cache(instance, **kwargs):
+    """Уберёт удалённую короткую ссылку из кэша."""
+    short_links_cache.delete(instance.short)
+
+
+@receiver(post_delete, sender=Recipe)
+def reset_recipe_short_links_cache(instance, **kwargs):
+    """Уберёт из кэша короткие ссылки удалённого рецепта."""
+    short_links_cache.delete_value(instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_pantry_index(instance, **kwargs):
+    """Уберёт удалённый рецепт из индекса продуктов."""
+    schedule_pantry_refresh([instance.id])
+
+
+@receiver(post_save, sender=Recipe)
+def build_recipe_image_variants(instance, **kwargs):
+    """Поставит в очередь уменьшенные копии новой картинки рецепта."""
+    schedule_variants(instance, 'image', 'image_variants')
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    """Поставит в очередь раскладку нового рецепта по лентам подписчиков."""
+    if created:
+        schedule_fan_out([instance])
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(instance, created, **kwargs):
+    """Добавит в ленту рецепты автора при подписке через ORM."""
+    if created:
+        backfill(instance.user_id, instance.following_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(instance, **kwargs):
+    """Уберёт из ленты рецепты автора при отписке через ORM."""
+    prune(instance.user_id, instance.following_id)
+
+
+@receiver(post_save, sender=User)
+def build_avatar_variants(instance, **kwargs):
+    """Поставит в очередь уменьшенные копии нового аватара."""
+    schedule_variants(instance, 'avatar', 'avatar_variants')
+
+
+# Модель связи -> (модель со счётчиком, поле внешнего ключа, счётчик).
+# Переключатели API меняют счётчики сами, а эти обработчики покрывают
+# остальные изменения через ORM: админку и каскадные удаления. Удаления
+# собираются в пачку CounterBatch: счётчики удаляемых рецептов и
+# пользователей не трогаются, остальные меняются одним UPDATE на строку.
+COUNTERS = {
+    Favoritism: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'carts_count'),
+    Follow: (User, 'following_id', 'followers_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+}
+
+
+@receiver(post_save, sender=Favoritism)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+@receiver(post_save, sender=Recipe)
+def increase_counter(sender, instance, created, **kwargs):
+    """Увеличит счётчик при создании строки."""
+    if created:
+        model, field, counter = COUNTERS[sender]
+        change_counter(model, getattr(instance, field), counter, 1)
+
+
+@receiver(post_delete, sender=Favoritism)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=Recipe)
+def decrease_counter(sender, instance, **kwargs):
+    """Уменьшит счётчик при удалении строки."""
+    model, field, counter = COUNTERS[sender]
+    counter_batch.change(model, getattr(instance, field), counter, -1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def forget_deleted_counters(sender, instance, **kwargs):
+    """Не будет обновлять счётчики удалённой строки."""
+    counter_batch.forget(sender, instance.pk)
@@ -1,8 +1,10 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from backend.settings import ASYNC_VIEWS
+from . import async_views
 from .views import (IngredientViewSer, RecipeViewSet, TagViewSet,
-                    UserFoodgramViewSet, redirect_short_link)
+                    UserFoodgramViewSet, metrics_view, redirect_short_link)
 
 router_recipes = DefaultRouter()
 router_recipes.register('recipes', RecipeViewSet,
@@ -17,5 +19,23 @@ router_recipes.register('users', UserFoodgramViewSet,
 urlpatterns = [
     path('api/auth/', include('djoser.urls.authtoken')),
     path('api/', include(router_recipes.urls)),
-    path('s/<str:short>/', redirect_short_link, name='redirect_short_link')
+    path('s/<str:short>/', redirect_short_link, name='redirect_short_link'),
+    path('metrics', metrics_view, name='metrics'),
 ]
+
+if ASYNC_VIEWS:
+    # Под ASGI самые частые запросы на чтение обслуживают асинхронные
+    # представления, остальное - те же представления DRF.
+    urlpatterns = [
+        path('api/tags/', async_views.tag_list, name='tags-list'),
+        path('api/tags/<int:pk>/', async_views.tag_detail,
+             name='tags-detail'),
+        path('api/ingredients/', async_views.ingredient_list,
+             name='ingredients-list'),
+        path('api/ingredients/<int:pk>/', async_views.ingredient_detail,
+             name='ingredients-detail'),
+        path('api/recipes/<int:pk>/', async_views.recipe_detail,
+             name='recipes-detail'),
+        path('s/<str:short>/', async_views.redirect_short_link,
+             name='redirect_short_link'),
+    ] + urlpatterns
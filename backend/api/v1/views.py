@@ -1,45 +1,185 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from hmac import compare_digest
+
+from django.db import connection
+from django.db.models import (BooleanField, Exists, F, OuterRef, Sum, Value,
+                              Window)
+from django.db.models.functions import RowNumber
+from django.db.transaction import atomic
+from django.http import (Http404, HttpResponse, HttpResponseForbidden,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect
+from django.views.decorators.http import require_safe
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
-from backend.settings import LOCALLY
-from recipes.models import (Favoritism, Ingredient, Recipe, ShoppingCart,
-                            ShortLink, Tag)
+from backend.counters import change_counter
+from backend.settings import (LOCALLY, METRICS_TOKEN, PAGE_SIZE,
+                              PANTRY_RESULTS_LIMIT, SIMILAR_RESULTS_LIMIT)
+from recipes.feed import backfill, prune
+from recipes.models import (Favoritism, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShortLink, Tag)
+from recipes.pantry import pantry_index
+from recipes.similar import get_similar_recipes
 from users.models import Follow, User
+from .cache import (CatalogCacheMixin, ingredients_cache, short_links_cache,
+                    tags_cache)
 from .filters import IngredientFilter, RecipeFilterSet
+from .metrics import metrics
+from .paginations import CursorPaginationMixin, FeedCursorPagination
 from .permission import IsAdminOrAuthor
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListTextRenderer)
+from .search import ingredient_index
 from .serializers import (AvatarSerializer, IngredientSerializer,
-                          RecipeReadSerializer, RecipeShortSerializer,
-                          RecipeWriteSerializer, TagSerializer,
-                          UserSubscribeSerializer, UserSubscriptionsSerializer)
+                          RecipeBulkSerializer, RecipeReadSerializer,
+                          RecipeShortSerializer, RecipeWriteSerializer,
+                          TagSerializer, UserSubscriptionsSerializer,
+                          get_recipes_limit)
+
+TRUE_VALUES = ('1', 'true', 'True')
+
+
+def get_table_sql(model, fields):
+    """Имя таблицы, имена столбцов и параметры для сырого запроса."""
+    quote_name = connection.ops.quote_name
+    meta = model._meta
+    return (
+        quote_name(meta.db_table),
+        [quote_name(meta.get_field(name).column) for name in fields],
+        quote_name(meta.pk.column),
+        list(fields.values()),
+    )
+
 
+def insert_ignore(model, **fields):
+    """Вставит строку одним запросом. Вернет False, если она уже была.
+
+    INSERT ... ON CONFLICT DO NOTHING RETURNING: при одновременных
+    одинаковых запросах лишнюю строку отбрасывает уникальное ограничение,
+    а не IntegrityError.
+    """
+    table, columns, pk, params = get_table_sql(model, fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(columns)}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))}) '
+            f'ON CONFLICT DO NOTHING RETURNING {pk}',
+            params,
+        )
+        return cursor.fetchone() is not None
+
+
+def delete_returning(model, **fields):
+    """Удалит строки одним запросом DELETE ... RETURNING, вернет их число."""
+    table, columns, pk, params = get_table_sql(model, fields)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE '
+            f'{" AND ".join(f"{column} = %s" for column in columns)} '
+            f'RETURNING {pk}',
+            params,
+        )
+        return len(cursor.fetchall())
 
-def delete_or_400(object, message):
-    """Возвращает ошибку 400 если объекта нет, или удалит его."""
-    if not object.exists():
-        return Response({'errors': f'{message}'},
-                        status=status.HTTP_400_BAD_REQUEST)
-    object.delete()
-    return Response(status=status.HTTP_204_NO_CONTENT)
 
+def get_shopping_list(user, by_recipe=False):
+    """Вернет список покупок пользователя одним агрегирующим запросом.
 
-def exists_then_400(message):
-    """Возвращает ошибку 400 с сообщением, что объект уже есть."""
+    Количество суммируется по ингредиенту, а с by_recipe - ещё и по рецепту.
+    """
+    fields = {
+        'name': F('ingredient__name'),
+        'measurement_unit': F('ingredient__measurement_unit'),
+    }
+    ordering = ('name', 'measurement_unit')
+    if by_recipe:
+        fields['recipe_name'] = F('recipe__name')
+        ordering = ('recipe_name', 'recipe_id') + ordering
+    return RecipeIngredient.objects.filter(
+        recipe__shop__user=user,
+    ).values(
+        'recipe_id' if by_recipe else 'ingredient_id', **fields
+    ).annotate(total_amount=Sum('amount')).order_by(*ordering)
+
+
+def get_positive_int(value):
+    """Вернет положительное целое из строки или None."""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def bad_request(message):
+    """Возвращает ошибку 400 с сообщением."""
     return Response({'errors': f'{message}'},
                     status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserFoodgramViewSet(UserViewSet):
+def attach_latest_recipes(authors, recipes_limit):
+    """Подгрузит авторам по recipes_limit последних рецептов одним запросом.
+
+    Рецепты нумеруются оконной функцией ROW_NUMBER() в разрезе автора, так
+    что число запросов не зависит от количества авторов на странице.
+    Результат кладётся в атрибут latest_recipes каждого автора.
+    """
+    latest_recipes = {author.id: [] for author in authors}
+    if latest_recipes and recipes_limit > 0:
+        windowed = Recipe.objects.filter(
+            author__in=latest_recipes
+        ).annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=F('author'),
+            order_by=F('created').desc(),
+        )).order_by()
+        sql, params = windowed.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) AS windowed '
+            'WHERE row_number <= %s ORDER BY author_id, row_number',
+            (*params, recipes_limit),
+        )
+        for recipe in recipes:
+            latest_recipes[recipe.author_id].append(recipe)
+    for author in authors:
+        author.latest_recipes = latest_recipes[author.id]
+    return authors
+
+
+def annotate_recipes(queryset, user):
+    """Подгрузит связи рецептов для чтения и аннотирует флаги пользователя.
+
+    Флаги is_favorited, is_in_shopping_cart и author_is_subscribed
+    считаются подзапросами Exists, а тэги и ингредиенты подгружаются
+    пачкой.
+    """
+    queryset = queryset.select_related('author').prefetch_related(
+        'tags', 'ingredient_amount__ingredient',
+    )
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(
+        is_favorited=Exists(Favoritism.objects.filter(
+            user=user, recipe=OuterRef('pk'))),
+        is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('pk'))),
+        author_is_subscribed=Exists(Follow.objects.filter(
+            user=user, following=OuterRef('author'))),
+    )
+
+
+class UserFoodgramViewSet(CursorPaginationMixin, UserViewSet):
     """Представление, обрабатывающее запросы к модели пользователь."""
 
+    cursor_ordering = ('id',)
+
     def get_permissions(self):
         """Переопределяет допуски к разным отдельным эндпоинтам."""
         if self.action in ('me', 'subscriptions', 'subscribe', 'avatar'):
@@ -65,8 +205,13 @@ class UserFoodgramViewSet(UserViewSet):
     def subscriptions(self, request):
         """Возвращает список на кого подписан."""
         following = User.objects.filter(
-            following__user=request.user).order_by('id')
-        page = self.paginate_queryset(following)
+            following__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
+        page = attach_latest_recipes(
+            self.paginate_queryset(following), get_recipes_limit(request)
+        )
         serializer = UserSubscriptionsSerializer(
             instance=page, many=True, context={'request': request}
         )
@@ -76,23 +221,41 @@ class UserFoodgramViewSet(UserViewSet):
     def subscribe(self, request, id=None):
         """Подписаться или отписаться от другого пользователя."""
         user = request.user
+        if request.method == 'DELETE':
+            following_id = get_positive_int(id)
+            with atomic():
+                deleted = delete_returning(
+                    Follow, user_id=user.id, following_id=following_id
+                )
+                change_counter(User, following_id, 'followers_count',
+                               -deleted)
+                if deleted:
+                    prune(user.id, following_id)
+            if deleted:
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            get_object_or_404(User, id=id)
+            return bad_request('Вы не были подписаны на этого пользователя')
         following = get_object_or_404(User, id=id)
-        follow = Follow.objects.filter(user=user, following=following)
-        data = {'user': user.id, 'following': following.id}
-        serializer = UserSubscribeSerializer(
-            data=data, context={'request': request}
+        if following.id == user.id:
+            raise ValidationError(
+                {'following': ['Нельзя подписываться на самого себя.']}
+            )
+        with atomic():
+            if not insert_ignore(Follow, user_id=user.id,
+                                 following_id=following.id):
+                return bad_request('Вы уже подписаны на этого пользователя')
+            change_counter(User, following.id, 'followers_count', 1)
+            backfill(user.id, following.id)
+            following.refresh_from_db(fields=['followers_count'])
+        following.is_subscribed = True
+        serializer = UserSubscriptionsSerializer(
+            following, context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
-        if request.method == 'DELETE':
-            return delete_or_400(follow,
-                                 'Вы не были подписаны на этого пользователя')
-        if follow.exists():
-            return exists_then_400('Вы уже подписаны на этого пользователя')
-        Follow.objects.create(user=user, following=following)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class IngredientViewSer(RetrieveModelMixin, ListModelMixin, GenericViewSet):
+class IngredientViewSer(CatalogCacheMixin, RetrieveModelMixin,
+                        ListModelMixin, GenericViewSet):
     """Представление тэгов."""
 
     queryset = Ingredient.objects.all()
@@ -100,28 +263,61 @@ class IngredientViewSer(RetrieveModelMixin, ListModelMixin, GenericViewSet):
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    catalog_cache = ingredients_cache
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по названию отвечает из индекса в памяти.
+
+        Порядок как у IngredientFilter: сначала начинающиеся с name, потом
+        содержащие name. Параметр limit ограничивает число результатов.
+        """
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        entry = self.catalog_cache.get(self.build_catalog)
+        return Response(ingredient_index.get(entry).search(
+            name, get_positive_int(request.query_params.get('limit'))
+        ))
 
 
-class TagViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
+class TagViewSet(CatalogCacheMixin, RetrieveModelMixin, ListModelMixin,
+                 GenericViewSet):
     """Представление тэгов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    catalog_cache = tags_cache
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(CursorPaginationMixin, ModelViewSet):
     """Представление рецептов."""
 
+    cursor_ordering = ('-created', '-id')
+    # Поиск упорядочивает рецепты по релевантности, а не по cursor_ordering.
+    cursor_conflicts = ('search',)
+
     queryset = Recipe.objects.all()
     http_method_names = ('get', 'post', 'patch', 'delete')
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilterSet
 
+    def get_queryset(self):
+        """Для чтения подгружает связи и аннотирует флаги пользователя.
+
+        Вместо отдельных запросов на каждый рецепт, флаги пользователя
+        считаются подзапросами, а связи подгружаются пачкой.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'feed', 'cook'):
+            return queryset
+        return annotate_recipes(queryset, self.request.user)
+
     def get_permissions(self):
         """Переопределяет допуски к разным отдельным эндпоинтам."""
         if self.action in (
-            'create', 'favorite', 'shopping_cart', 'download_shopping_cart',
+            'create', 'bulk', 'feed', 'favorite', 'shopping_cart',
+            'download_shopping_cart',
         ):
             self.permission_classes = [IsAuthenticated]
         if self.action in ('partial_update', 'destroy'):
@@ -138,73 +334,237 @@ class RecipeViewSet(ModelViewSet):
         """Автоматически сохраняет в пользователя в поле "автор"."""
         serializer.save(author=self.request.user)
 
-    @action(detail=True, methods=['POST', 'DELETE'], url_path='favorite')
-    def favorite(self, request, pk=None):
-        """Позволяет добавлять рецепты в избранные."""
-        user = request.user
+    @action(detail=False, methods=['POST'], url_path='bulk')
+    def bulk(self, request):
+        """Создаст пачку рецептов одним запросом."""
+        serializer = RecipeBulkSerializer(
+            data=request.data, many=True, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save(author=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, url_path='cook')
+    def cook(self, request):
+        """Рецепты, которые можно приготовить из продуктов.
+
+        Продукты - id ингредиентов в параметрах ingredients. Рецепты
+        ранжируются индексом в памяти по доле своих ингредиентов, которые
+        есть среди продуктов: она в поле coverage, а недостающие
+        ингредиенты - в missing_ingredients. Параметр limit - сколько
+        рецептов вернуть.
+        """
+        pantry = {
+            get_positive_int(value)
+            for value in request.query_params.getlist('ingredients')
+        }
+        if not pantry or None in pantry:
+            return bad_request('Передайте id продуктов в параметре '
+                               'ingredients.')
+        limit = min(
+            get_positive_int(request.query_params.get('limit')) or PAGE_SIZE,
+            PANTRY_RESULTS_LIMIT,
+        )
+        ranked = pantry_index.rank(pantry, limit)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in ranked]
+        )
+        ranked = [(recipes[recipe_id], coverage)
+                  for recipe_id, coverage in ranked if recipe_id in recipes]
+        data = self.get_serializer(
+            [recipe for recipe, _ in ranked], many=True
+        ).data
+        for item, (_, coverage) in zip(data, ranked):
+            item['coverage'] = round(coverage, 4)
+            item['missing_ingredients'] = [
+                ingredient for ingredient in item['ingredients']
+                if ingredient['id'] not in pantry
+            ]
+        return Response(data)
+
+    @action(detail=True, url_path='similar')
+    def similar(self, request, pk=None):
+        """Рецепты, похожие на этот по ингредиентам и тэгам.
+
+        Кандидаты находятся по ключам LSH подписи MinHash рецепта, поле
+        similarity - оценка коэффициента Жаккара. Параметр limit - сколько
+        рецептов вернуть.
+        """
+        limit = min(
+            get_positive_int(request.query_params.get('limit')) or PAGE_SIZE,
+            SIMILAR_RESULTS_LIMIT,
+        )
+        ranked = get_similar_recipes(get_positive_int(pk), limit)
+        if ranked is None:
+            raise Http404
+        recipes = Recipe.objects.in_bulk(
+            [recipe_id for recipe_id, _ in ranked]
+        )
+        ranked = [(recipes[recipe_id], similarity)
+                  for recipe_id, similarity in ranked if recipe_id in recipes]
+        data = RecipeShortSerializer(
+            [recipe for recipe, _ in ranked], many=True,
+            context={'request': request},
+        ).data
+        for item, (_, similarity) in zip(data, ranked):
+            item['similarity'] = round(similarity, 4)
+        return Response(data)
+
+    @action(detail=False, url_path='feed')
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь.
+
+        От новых к старым, листается только курсором: первая страница без
+        параметра cursor, дальше - по ссылкам next и previous.
+        """
+        paginator = FeedCursorPagination()
+        page = paginator.paginate_feed(request, request.user)
+        recipes = self.get_queryset().in_bulk([item.id for item in page])
+        serializer = self.get_serializer(
+            [recipes[item.id] for item in page if item.id in recipes],
+            many=True,
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    def toggle_recipe(self, model, counter, pk, added_message,
+                      missing_message):
+        """Добавит рецепт в избранное или корзину, либо уберет его оттуда.
+
+        Само изменение - один запрос, а ответ 400 определяется по числу
+        затронутых строк, без предварительной проверки exists(). Счётчик
+        рецепта counter меняется в той же транзакции.
+        """
+        user = self.request.user
+        if self.request.method == 'DELETE':
+            recipe_id = get_positive_int(pk)
+            with atomic():
+                deleted = delete_returning(
+                    model, user_id=user.id, recipe_id=recipe_id
+                )
+                change_counter(Recipe, recipe_id, counter, -deleted)
+            if deleted:
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            get_object_or_404(Recipe, pk=pk)
+            return bad_request(missing_message)
         recipe = get_object_or_404(Recipe, pk=pk)
-        favorite = Favoritism.objects.filter(user=user, recipe=recipe)
-        if request.method == 'DELETE':
-            return delete_or_400(favorite, 'Рецепт не был в избранном.')
-        if favorite.exists():
-            return exists_then_400('Вы уже добавили этот рецепт в избранное')
-        Favoritism.objects.create(user=user, recipe=recipe)
+        with atomic():
+            if not insert_ignore(model, user_id=user.id,
+                                 recipe_id=recipe.id):
+                return bad_request(added_message)
+            change_counter(Recipe, recipe.id, counter, 1)
         serializer = RecipeShortSerializer(
-            instance=recipe, context={'request': request}
+            instance=recipe, context={'request': self.request}
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['POST', 'DELETE'], url_path='favorite')
+    def favorite(self, request, pk=None):
+        """Позволяет добавлять рецепты в избранные."""
+        return self.toggle_recipe(
+            Favoritism, 'favorites_count', pk,
+            'Вы уже добавили этот рецепт в избранное',
+            'Рецепт не был в избранном.'
+        )
+
     @action(detail=True, methods=['POST', 'DELETE'], url_path='shopping_cart')
     def shopping_cart(self, request, pk=None):
-        """Позволяет добавлять рецепты в избранные."""
-        user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
-        shop = ShoppingCart.objects.filter(user=user, recipe=recipe)
-        if request.method == 'DELETE':
-            return delete_or_400(shop,
-                                 'Этот рецепт не был в корзине')
-        if shop.exists():
-            return exists_then_400('Этот рецепт уже в корзине')
-        ShoppingCart.objects.create(user=user, recipe=recipe)
-        serializer = RecipeShortSerializer(
-            instance=recipe, context={'request': request}
+        """Позволяет добавлять рецепты в корзину."""
+        return self.toggle_recipe(
+            ShoppingCart, 'carts_count', pk,
+            'Этот рецепт уже в корзине',
+            'Этот рецепт не был в корзине'
         )
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    @action(detail=False, methods=['Get'], url_path='download_shopping_cart')
+    @action(
+        detail=False,
+        methods=['Get'],
+        url_path='download_shopping_cart',
+        renderer_classes=(ShoppingListTextRenderer, ShoppingListCSVRenderer,
+                          ShoppingListJSONRenderer),
+    )
     def download_shopping_cart(self, request):
-        """Отдаст пользователю файл с его списком покупок."""
-        ingredient_list_qs = Ingredient.objects.filter(
-            recipe__shop__user=request.user,
-        ).annotate(total_amount=Sum('recipeingredient__amount'))
-        file_txt = [
-            '{0} - {1} {2}.\n'.format(
-                ing.name.capitalize(), ing.total_amount, ing.measurement_unit
-            ) for ing in ingredient_list_qs
-        ]
-        return HttpResponse(file_txt, content_type='text/plain')
+        """Отдаст пользователю файл с его списком покупок.
+
+        Формат выбирается параметром format (txt, csv, json) или заголовком
+        Accept, по умолчанию txt. С параметром by_recipe=1 количество
+        считается отдельно по каждому рецепту. Список суммируется одним
+        запросом и отдаётся потоково.
+        """
+        by_recipe = request.query_params.get('by_recipe') in TRUE_VALUES
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(
+                get_shopping_list(request.user, by_recipe).iterator(),
+                by_recipe,
+            ),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
+        )
+        return response
 
     @action(detail=True, url_path='get-link')
     def get_link(self, request, pk=None):
         """Возвращает короткую ссылку на рецепт."""
-        short_link_recipe = ShortLink.objects.filter(recipe=pk)
-        if short_link_recipe.exists():
-            short = short_link_recipe.first()
-        else:
-            recipe = get_object_or_404(Recipe, pk=pk)
-            short = recipe.short_link
+        short = ShortLink.objects.filter(recipe=pk).values_list(
+            'short', flat=True).first()
+        if short is None:
+            short = get_object_or_404(Recipe, pk=pk).short_link.short
         return Response(
-            {'short-link': request.build_absolute_uri(f'/s/{short.short}/')},
+            {'short-link': request.build_absolute_uri(f'/s/{short}/')},
             status=status.HTTP_200_OK
         )
 
 
-@api_view(['GET'])
-def redirect_short_link(request, short):
-    """Обрабатывает короткие ссылки."""
-    recipe_short_link = get_object_or_404(ShortLink, short=short)
-    recipe_id = recipe_short_link.recipe.id
+def get_short_link_recipe_id(short):
+    """id рецепта по короткой ссылке: из LRU-кэша или одним запросом."""
+    recipe_id = short_links_cache.get(short)
+    if recipe_id is None:
+        recipe_id = ShortLink.objects.filter(short=short).values_list(
+            'recipe_id', flat=True).first()
+        if recipe_id is None:
+            raise Http404
+        short_links_cache.set(short, recipe_id)
+    return recipe_id
+
+
+def redirect_to_recipe(request, recipe_id):
+    """Перенаправит на страницу рецепта."""
     substring = 'api/' if LOCALLY else ''
     return redirect(
         request.build_absolute_uri(f'/{substring}recipes/{recipe_id}/')
     )
+
+
+@require_safe
+def redirect_short_link(request, short):
+    """Обрабатывает короткие ссылки.
+
+    Обычное представление Django, без аутентификации и согласования
+    формата DRF. id рецепта берётся из LRU-кэша, а при промахе - одним
+    запросом к индексу коротких ссылок.
+    """
+    return redirect_to_recipe(request, get_short_link_recipe_id(short))
+
+
+def metrics_allowed(request):
+    """Проверит доступ к метрикам: токен METRICS_TOKEN или сотрудник."""
+    if METRICS_TOKEN:
+        header = request.headers.get('Authorization', '')
+        if compare_digest(header.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+            return True
+    return request.user.is_staff
+
+
+@require_safe
+def metrics_view(request):
+    """Метрики всех процессов backend в текстовом формате Prometheus.
+
+    Доступны по токену METRICS_TOKEN или сотрудникам.
+    """
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4'
+    )
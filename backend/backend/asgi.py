@@ -9,8 +9,67 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGIHandler, который читает потоковый ответ по кускам в потоке.
+
+    Django 3.2 перебирает потоковый ответ прямо в цикле событий, где
+    запросы к базе запрещены. Здесь каждый следующий кусок берётся в
+    потоке запроса, и ответ не собирается в памяти целиком.
+    """
+
+    async def send_response(self, response, send):
+        """Отправит ответ, потоковый - по мере чтения кусков."""
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (
+                header.encode('ascii') if isinstance(header, str) else header,
+                value.encode('latin1') if isinstance(value, str) else value,
+            )
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        while (part := await next_part(parts, None)) is not None:
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+django.setup(set_prefix=False)
+django_application = StreamingASGIHandler()
+
+
+async def application(scope, receive, send):
+    """Выполняет синхронный код каждого запроса в своём потоке.
 
-application = get_asgi_application()
+    Django 3.2 выполняет синхронные представления и middleware в одном
+    общем потоке на процесс, и медленный запрос к базе задержал бы все
+    остальные. В своём контексте у каждого запроса свой поток и своё
+    соединение с базой, которое закрывается в конце запроса.
+    """
+    async with ThreadSensitiveContext():
+        await django_application(scope, receive, send)
@@ -0,0 +1,89 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from threading import local
+
+from django.db import router
+from django.db.models import F, QuerySet
+from django.db.transaction import atomic
+
+
+def change_counter(model, pk, field, delta):
+    """Изменит счётчик строки на delta одним UPDATE с F()."""
+    if delta:
+        model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+class CounterBatch(local):
+    """Изменения счётчиков, отложенные до конца удаления через ORM.
+
+    Каскадное удаление шлёт post_delete на каждую строку, и без пачки
+    каждая строка меняла бы счётчик своим UPDATE. Внутри collect()
+    изменения суммируются по строке со счётчиком, строки, удалённые тем же
+    удалением, запоминаются, а в конце на каждую оставшуюся строку
+    выполняется один UPDATE в той же транзакции.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.deltas = Counter()
+        self.deleted = set()
+
+    @contextmanager
+    def collect(self, using):
+        """Соберёт изменения счётчиков за время блока и применит их."""
+        if self.active:
+            yield
+            return
+        self.active = True
+        try:
+            with atomic(using=using):
+                yield
+                self.flush()
+        finally:
+            self.active = False
+            self.deltas.clear()
+            self.deleted.clear()
+
+    def change(self, model, pk, field, delta):
+        """Изменит счётчик сразу или, внутри collect(), в конце блока."""
+        if self.active:
+            self.deltas[model, pk, field] += delta
+        else:
+            change_counter(model, pk, field, delta)
+
+    def forget(self, model, pk):
+        """Пропустит счётчики строки, удалённой внутри collect()."""
+        if self.active:
+            self.deleted.add((model, pk))
+
+    def flush(self):
+        """Один UPDATE на каждую оставшуюся строку с изменёнными счётчиками."""
+        updates = defaultdict(dict)
+        for (model, pk, field), delta in self.deltas.items():
+            if delta and (model, pk) not in self.deleted:
+                updates[model, pk][field] = F(field) + delta
+        for (model, pk), fields in updates.items():
+            model.objects.filter(pk=pk).update(**fields)
+
+
+counter_batch = CounterBatch()
+
+
+class CounterQuerySet(QuerySet):
+    """Удаляет строки, собирая изменения счётчиков в одну пачку."""
+
+    def delete(self):
+        """Удалит строки, см. CounterBatch."""
+        using = self._db or router.db_for_write(self.model, **self._hints)
+        with counter_batch.collect(using):
+            return super().delete()
+
+
+class CounterModelMixin:
+    """Удаляет объект, собирая изменения счётчиков в одну пачку."""
+
+    def delete(self, using=None, keep_parents=False):
+        """Удалит объект, см. CounterBatch."""
+        using = using or router.db_for_write(type(self), instance=self)
+        with counter_batch.collect(using):
+            return super().delete(using, keep_parents)
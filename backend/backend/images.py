@@ -0,0 +1,124 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db.transaction import on_commit
+
+from PIL import Image, ImageOps
+
+from backend.settings import (IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_QUALITY,
+                              IMAGE_VARIANTS, IMAGE_WORKERS)
+
+logger = logging.getLogger(__name__)
+executor = ThreadPoolExecutor(
+    max_workers=IMAGE_WORKERS, thread_name_prefix='images'
+)
+
+
+def get_variant_formats():
+    """Форматы из IMAGE_VARIANT_FORMATS, которые умеет сохранять Pillow."""
+    extensions = Image.registered_extensions()
+    return [fmt for fmt in IMAGE_VARIANT_FORMATS if f'.{fmt}' in extensions]
+
+
+def needs_variants(instance, field_name, variants_field):
+    """Проверит, что для текущей картинки варианты ещё не построены."""
+    image = getattr(instance, field_name)
+    variants = getattr(instance, variants_field) or {}
+    return bool(image) and variants.get('source') != image.name
+
+
+def schedule_variants(instance, field_name, variants_field):
+    """Поставит построение вариантов картинки в очередь фонового потока.
+
+    Задача отправляется после фиксации транзакции, чтобы поток увидел
+    сохранённый объект. Если картинка не менялась, ничего не делает.
+    """
+    if not needs_variants(instance, field_name, variants_field):
+        return
+    arguments = (instance._meta.label, instance.pk, field_name,
+                 variants_field, getattr(instance, field_name).name)
+    on_commit(lambda: executor.submit(run_variants_task, *arguments))
+
+
+def run_variants_task(*arguments):
+    """Обёртка для фонового потока: логирует ошибки и закрывает соединение."""
+    try:
+        build_variants(*arguments)
+    except Exception:
+        logger.exception('Не удалось построить варианты картинки %s.',
+                         arguments)
+    finally:
+        close_old_connections()
+
+
+def build_variants(model_label, pk, field_name, variants_field, source):
+    """Построит уменьшенные копии картинки во всех форматах и сохранит их.
+
+    Варианты кладутся рядом с оригиналом в папку variants, а их имена
+    записываются в поле variants_field, если картинка у объекта за это
+    время не сменилась. Вернет словарь вариантов или None, если картинку
+    уже удалили.
+    """
+    try:
+        file = default_storage.open(source)
+    except FileNotFoundError:
+        return None
+    with file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA')
+    directory, filename = os.path.split(source)
+    stem = os.path.splitext(filename)[0]
+    variants = {'source': source}
+    for name, width in IMAGE_VARIANTS.items():
+        image = original
+        if image.width > width:
+            image = image.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.LANCZOS,
+            )
+        variants[name] = {}
+        for fmt in get_variant_formats():
+            buffer = BytesIO()
+            image.save(buffer, format=fmt.upper(),
+                       quality=IMAGE_VARIANT_QUALITY)
+            path = os.path.join(directory, 'variants', f'{stem}_{name}.{fmt}')
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            variants[name][fmt] = default_storage.save(
+                path, ContentFile(buffer.getvalue())
+            )
+    apps.get_model(model_label).objects.filter(
+        pk=pk, **{field_name: source}
+    ).update(**{variants_field: variants})
+    return variants
+
+
+def get_variant_urls(variants, request=None):
+    """Вернет ссылки на варианты картинки: {размер: {формат: url}}."""
+    urls = {}
+    for name, formats in (variants or {}).items():
+        if name == 'source':
+            continue
+        urls[name] = {}
+        for fmt, path in formats.items():
+            url = default_storage.url(path)
+            urls[name][fmt] = (
+                request.build_absolute_uri(url) if request else url
+            )
+    return urls
+
+
+def get_thumbnail_url(image, variants):
+    """Ссылка на миниатюру, а пока её нет - на оригинал."""
+    formats = (variants or {}).get('thumbnail') or {}
+    if formats.get('webp'):
+        return default_storage.url(formats['webp'])
+    return image.url
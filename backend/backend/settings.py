@@ -14,6 +14,9 @@ DEBUG = False
 SQLAITE = False
 # При запуске проекта через manage.py runserver - значение True.
 LOCALLY = False
+# Асинхронные представления для частых запросов на чтение. Включает
+# backend/asgi.py, под WSGI они не нужны.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
 
 ALLOWED_HOSTS = ['127.0.0.1', 'localhost', os.getenv('DOMAIN_NAME', '')]
 
@@ -36,6 +39,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.v1.metrics.MetricsMiddleware',
+    'api.v1.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +89,40 @@ else:
             'PORT': os.getenv('DB_PORT', 5432),
         }
     }
+# Реплики только для чтения: адреса через запятую, например
+# replica1,replica2:5433. Остальные параметры берутся у основной базы.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), 1):
+    host, _, port = address.strip().partition(':')
+    DATABASE_REPLICAS.append(f'replica_{number}')
+    DATABASES[DATABASE_REPLICAS[-1]] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default'].get('PORT', ''),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['api.v1.replicas.ReplicaRouter']
+# Сколько секунд после изменения данных запросы клиента читают из основной
+# базы, а не из реплик, чтобы не увидеть устаревшие данные.
+REPLICA_PIN_SECONDS = 5
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+# Общий для всех процессов кэш каталогов тэгов и ингредиентов, например
+# django.core.cache.backends.memcached.PyMemcacheCache. Если не задан,
+# каталоги кэшируются только в памяти процесса.
+CATALOG_CACHE_ALIAS = 'catalog'
+if os.getenv('CATALOG_CACHE_BACKEND'):
+    CACHES[CATALOG_CACHE_ALIAS] = {
+        'BACKEND': os.getenv('CATALOG_CACHE_BACKEND'),
+        'LOCATION': os.getenv('CATALOG_CACHE_LOCATION', ''),
+    }
+# Сколько секунд процесс доверяет своей копии каталога без общего кэша.
+CATALOG_CACHE_LOCAL_TIMEOUT = 60
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -152,11 +191,56 @@ DJOSER = {
     },
 }
 
+# Уменьшенные копии картинок рецептов и аватаров: название -> ширина.
+# Строятся в фоновом потоке после загрузки, оригинал остаётся как есть.
+IMAGE_VARIANTS = {'thumbnail': 70, 'card': 480, 'detail': 1080}
+# AVIF строится только если его поддерживает установленный Pillow.
+IMAGE_VARIANT_FORMATS = ('webp', 'avif')
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_WORKERS = 1
+
 PAGE_SIZE = 6
 PAGE_SIZE_QUERY_PARAM = 'limit'
+CURSOR_QUERY_PARAM = 'cursor'
 
 EXTRA_TABULAR_INLINE = 1
 RECIPES_LIMIT = 1
+# Конфигурация полнотекстового поиска рецептов в PostgreSQL.
+SEARCH_CONFIG = 'russian'
+# Сколько рецептов можно создать одним запросом POST /api/recipes/bulk/.
+BULK_RECIPES_LIMIT = 1000
+# Тэгов не больше, чем битов в маске рецепта (BigIntegerField без знака).
+TAG_MASK_BITS = 63
+# Сколько масок фильтр по тэгам перечисляет в IN (...), чтобы условие
+# шло по индексу; если масок больше, используется побитовое И.
+TAG_MASK_IN_LIMIT = 256
+# Лента подписок: рецепты авторов, у которых подписчиков не меньше
+# FEED_CELEBRITY_FOLLOWERS, не раскладываются по лентам, а подмешиваются
+# при чтении. При подписке в ленту попадают FEED_BACKFILL_SIZE последних
+# рецептов автора, раскладка идёт пачками по FEED_BATCH_SIZE подписчиков.
+FEED_CELEBRITY_FOLLOWERS = 10000
+FEED_BACKFILL_SIZE = 100
+FEED_BATCH_SIZE = 1000
+FEED_WORKERS = 1
+# Подбор рецептов по продуктам: не больше PANTRY_RESULTS_LIMIT рецептов в
+# ответе. Индекс в памяти процесса собирается заново, когда изменённых
+# рецептов больше доли PANTRY_GARBAGE_RATIO, когда журнал изменений в
+# общем кэше отстал больше чем на PANTRY_JOURNAL_REPLAY записей, а без
+# общего кэша - раз в PANTRY_INDEX_LOCAL_TIMEOUT секунд.
+PANTRY_RESULTS_LIMIT = 100
+PANTRY_GARBAGE_RATIO = 0.25
+PANTRY_JOURNAL_REPLAY = 1000
+PANTRY_JOURNAL_TIMEOUT = 3600
+PANTRY_INDEX_LOCAL_TIMEOUT = 300
+# Похожие рецепты: подпись MinHash из SIMILAR_BANDS * SIMILAR_ROWS
+# значений, LSH по SIMILAR_BANDS полосам находит рецепты с коэффициентом
+# Жаккара примерно от (1 / SIMILAR_BANDS) ** (1 / SIMILAR_ROWS) = 0.5.
+# Похожесть уточняется не больше чем для SIMILAR_CANDIDATES кандидатов.
+SIMILAR_BANDS = 16
+SIMILAR_ROWS = 4
+SIMILAR_SEED = 1
+SIMILAR_CANDIDATES = 500
+SIMILAR_RESULTS_LIMIT = 50
 
 MIN_NUMBER_TAGS = 1
 MIN_NUMBER_INGREDIENTS = 1
@@ -171,4 +255,27 @@ LENGTH_TEXT_LONG = 256
 STRING_CHARACTERS = ('abcdefghijklmnopqrstuvwxyz'
                      'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
                      '1234567890')
-LENGTH_SHORT_LINK = 4
+LENGTH_SHORT_LINK = 11
+# Новые короткие ссылки не короче 5 символов, поэтому не пересекаются со
+# старыми случайными ссылками из 4 символов. Множитель должен быть взаимно
+# прост с длиной STRING_CHARACTERS (62), тогда перемешивание обратимо.
+SHORT_LINK_MIN_LENGTH = 5
+SHORT_LINK_MULTIPLIER = 387420489
+SHORT_LINK_OFFSET = 104729
+# Сколько коротких ссылок процесс держит в памяти для быстрого перехода.
+SHORT_LINK_CACHE_SIZE = 10000
+# Сколько секунд процесс доверяет короткой ссылке из памяти: столько другие
+# процессы могут перенаправлять на удалённый рецепт.
+SHORT_LINK_CACHE_TIMEOUT = 60
+
+# Каталог, в который процессы gunicorn сбрасывают свои метрики. Без него
+# /metrics показывает метрики только обработавшего запрос процесса.
+METRICS_DIR = os.getenv('METRICS_DIR')
+# Токен, с которым Prometheus читает /metrics (Authorization: Bearer ...).
+# Без токена метрики видны только сотрудникам, вошедшим в админку.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_FLUSH_INTERVAL = 1
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                           1, 2.5, 5, 10)
+METRICS_QUERIES_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+METRICS_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
@@ -0,0 +1,15 @@
+"""Настройки для тестов.
+
+Запуск: python manage.py test api --settings=backend.test_settings, для
+других запускателей - DJANGO_SETTINGS_MODULE=backend.test_settings.
+"""
+from backend.settings import *  # noqa: F401,F403
+from backend.settings import DATABASES
+
+# Зеркало основной базы: тесты маршрутизации подставляют его в
+# DATABASE_REPLICAS вместо настоящей реплики.
+TEST_REPLICA = 'replica_test'
+DATABASES = {
+    **DATABASES,
+    TEST_REPLICA: {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}},
+}
@@ -0,0 +1,18 @@
+import os
+import shutil
+
+# SERVER_MODE=asgi запускает backend.asgi в воркерах uvicorn, иначе -
+# обычные синхронные воркеры с backend.wsgi.
+if os.getenv('SERVER_MODE') == 'asgi':
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'backend.wsgi:application'
+
+
+def on_starting(server):
+    """Очистит каталог метрик, оставшийся от прошлого запуска."""
+    directory = os.getenv('METRICS_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
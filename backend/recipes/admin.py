@@ -4,6 +4,10 @@ from backend.settings import (EXTRA_TABULAR_INLINE, MIN_NUMBER_INGREDIENTS,
                               MIN_NUMBER_TAGS)
 from .models import (Favoritism, Ingredient, Recipe, ShoppingCart, ShortLink,
                      Tag)
+from .pantry import schedule_pantry_refresh
+from .search import search_ingredients, search_recipes, update_search_vectors
+from .similar import update_signatures
+from .tags import reconcile_tags_masks
 
 
 class TagsInline(TabularInline):
@@ -20,6 +24,7 @@ class IngredientsInline(TabularInline):
     """Позволит в зоне администрирования в рецептах выбирать ингридиенты."""
 
     model = Recipe.ingredients.through
+    autocomplete_fields = ('ingredient',)
     min_num = MIN_NUMBER_INGREDIENTS
     extra = EXTRA_TABULAR_INLINE
     verbose_name = 'Ингредиент к рецепту'
@@ -27,21 +32,47 @@ class IngredientsInline(TabularInline):
 
 
 class ImageMixin:
-    """Возвращает миниатюру аватара."""
+    """Возвращает миниатюру картинки рецепта.
+
+    image_recipe_field - поле с рецептом, None если объект и есть рецепт.
+    """
+
+    image_recipe_field = None
+
+    def get_queryset(self, request):
+        """Подгрузит рецепт вместе с объектом."""
+        queryset = super().get_queryset(request)
+        if self.image_recipe_field is None:
+            return queryset
+        return queryset.select_related(self.image_recipe_field)
 
     @display(description='')
     def get_html_image(self, object):
         """Возвращает миниатюру картинки."""
+        if self.image_recipe_field is not None:
+            object = getattr(object, self.image_recipe_field)
         return object.get_html_image
 
 
 class AvatarMixin:
-    """Возвращает миниатюру аватара."""
+    """Возвращает миниатюру аватара.
+
+    Пользователь подгружается вместе с объектом, а миниатюра берётся из
+    его поля с уменьшенными копиями, так что лишних запросов нет.
+    """
+
+    avatar_user_field = 'user'
+
+    def get_queryset(self, request):
+        """Подгрузит пользователя вместе с объектом."""
+        return super().get_queryset(request).select_related(
+            self.avatar_user_field
+        )
 
     @display(description='')
     def get_html_avatar_user(self, object):
         """Возвращает миниатюру аватара."""
-        return object.user.get_html_avatar
+        return getattr(object, self.avatar_user_field).get_html_avatar
 
 
 @register(Recipe)
@@ -51,28 +82,54 @@ class RecipeAdmin(ImageMixin, AvatarMixin, ModelAdmin):
     fields = (('author', 'get_html_avatar_user'), 'name',
               'get_favorites_counter', 'text', 'cooking_time',
               ('image', 'get_html_image'))
-    list_display = ('id', 'name', 'author')
+    list_display = ('id', 'name', 'author', 'favorites_count', 'carts_count')
     list_display_links = ('id', 'name')
     list_filter = ('tags',)
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
+    avatar_user_field = 'author'
     readonly_fields = ('get_html_avatar_user', 'get_favorites_counter',
                        'get_html_image')
     inlines = (IngredientsInline, TagsInline)
     search_fields = ('name', 'author__username', 'author__first_name',
                      'author__last_name',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск как в API: полнотекстовый, по релевантности."""
+        if not search_term:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return search_recipes(queryset, search_term), False
+
+    def save_related(self, request, form, formsets, change):
+        """После сохранения связей обновит поиск, маску тэгов и индексы.
+
+        Индекс продуктов в памяти обновляется после фиксации транзакции.
+        Если в форме ничего не изменилось, ничего не пересчитывается.
+        """
+        super().save_related(request, form, formsets, change)
+        if change and not form.has_changed() and not any(
+                formset.has_changed() for formset in formsets):
+            return
+        update_search_vectors([form.instance.id])
+        update_signatures([form.instance.id])
+        reconcile_tags_masks(recipe_ids=[form.instance.id])
+        schedule_pantry_refresh([form.instance.id])
+
     @display(description='В избранном у ')
     def get_favorites_counter(self, object):
         """Возвращает счетчик добавлений этого рецепта в избранное."""
-        count = Favoritism.objects.filter(recipe=object).count()
-        return f'{count} пользователей.'
+        return f'{object.favorites_count} пользователей.'
 
 
 @register(Tag)
 class TagAdmin(ModelAdmin):
     """Для управления тэгами в админ зоне."""
 
-    fields = ('name', 'slug')
-    list_display = ('id', 'name', 'slug')
+    fields = ('name', 'slug', 'mask')
+    readonly_fields = ('mask',)
+    list_display = ('id', 'name', 'slug', 'mask')
     list_display_links = ('id', 'name', 'slug')
     search_fields = ('name', 'slug')
     ordering = ('name',)
@@ -88,6 +145,14 @@ class IngredientAdmin(ModelAdmin):
     search_fields = ('name',)
     ordering = ('name',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск как в API: сначала начинающиеся с запроса."""
+        if not search_term:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return search_ingredients(queryset, search_term), False
+
 
 @register(Favoritism)
 class FavoritismAdmin(ImageMixin, AvatarMixin, ModelAdmin):
@@ -95,6 +160,11 @@ class FavoritismAdmin(ImageMixin, AvatarMixin, ModelAdmin):
 
     fields = (('user', 'get_html_avatar_user'), ('recipe', 'get_html_image'))
     readonly_fields = ('get_html_avatar_user', 'get_html_image')
+    list_display = ('id', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    show_full_result_count = False
+    image_recipe_field = 'recipe'
     search_fields = ('user__username', 'user__first_name',
                      'user__last_name', 'recipe__name')
 
@@ -111,4 +181,8 @@ class ShortLinkAdmin(ModelAdmin):
     """Для управления добавления рецептов в корзину в админ зоне."""
 
     fields = ('recipe', 'short')
+    list_display = ('id', 'recipe', 'short')
+    list_select_related = ('recipe',)
+    autocomplete_fields = ('recipe',)
+    show_full_result_count = False
     search_fields = ('recipe__name', 'recipe__id', 'short')
@@ -0,0 +1,39 @@
+from django.apps import apps as django_apps
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def get_counters(apps=django_apps):
+    """Вернет описания счётчиков.
+
+    Кортежи (модель, поле-счётчик, модель связи, поле связи): счётчик
+    равен числу строк модели связи, ссылающихся на строку модели.
+    """
+    recipe = apps.get_model('recipes', 'Recipe')
+    user = apps.get_model('users', 'UserFoodgram')
+    return (
+        (recipe, 'favorites_count',
+         apps.get_model('recipes', 'Favoritism'), 'recipe'),
+        (recipe, 'carts_count',
+         apps.get_model('recipes', 'ShoppingCart'), 'recipe'),
+        (user, 'recipes_count', recipe, 'author'),
+        (user, 'followers_count',
+         apps.get_model('users', 'Follow'), 'following'),
+    )
+
+
+def reconcile_counters(apps=django_apps):
+    """Пересчитает все счётчики, вернет число исправленных строк по полям.
+
+    На каждый счётчик - один UPDATE с коррелированным подзапросом,
+    затрагивающий только строки, где значение разошлось с фактическим.
+    """
+    fixed = {}
+    for model, field, related, link in get_counters(apps):
+        actual = Coalesce(Subquery(
+            related.objects.filter(**{link: OuterRef('pk')}).order_by(
+            ).values(link).annotate(count=Count('pk')).values('count')
+        ), Value(0))
+        fixed[f'{model.__name__}.{field}'] = model.objects.exclude(
+            **{field: actual}).update(**{field: actual})
+    return fixed
@@ -0,0 +1,194 @@
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps as django_apps
+from django.db import close_old_connections, connections, router
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.db.transaction import atomic, on_commit
+
+from backend.settings import (FEED_BACKFILL_SIZE, FEED_BATCH_SIZE,
+                              FEED_CELEBRITY_FOLLOWERS, FEED_WORKERS)
+
+logger = logging.getLogger(__name__)
+executor = ThreadPoolExecutor(
+    max_workers=FEED_WORKERS, thread_name_prefix='feed'
+)
+
+# Позиция рецепта в ленте: лента упорядочена по (created, id) по убыванию.
+FeedItem = namedtuple('FeedItem', ('created', 'id'))
+
+
+def get_celebrity_filter(prefix=''):
+    """Условие "автор - знаменитость" для поля с префиксом prefix.
+
+    Рецепты знаменитостей не раскладываются по лентам: их ленты
+    подписчиков подмешивают при чтении. Записи, разложенные до того, как
+    автор стал знаменитостью, остаются и не дублируются.
+    """
+    return Q(**{f'{prefix}followers_count__gte': FEED_CELEBRITY_FOLLOWERS})
+
+
+def schedule_fan_out(recipes):
+    """Поставит раскладку новых рецептов по лентам в очередь фонового потока.
+
+    Задача отправляется после фиксации транзакции, чтобы поток увидел
+    сохранённые рецепты.
+    """
+    recipe_ids = [recipe.id for recipe in recipes]
+    if recipe_ids:
+        on_commit(lambda: executor.submit(run_fan_out_task, recipe_ids))
+
+
+def run_fan_out_task(recipe_ids):
+    """Обёртка для фонового потока: логирует ошибки и закрывает соединение."""
+    try:
+        fan_out(recipe_ids)
+    except Exception:
+        logger.exception('Не удалось разложить рецепты %s по лентам.',
+                         recipe_ids)
+    finally:
+        close_old_connections()
+
+
+def fan_out(recipe_ids, apps=django_apps):
+    """Добавит рецепты в ленты подписчиков их авторов.
+
+    Подписчики выбираются пачками по FEED_BATCH_SIZE по возрастанию id,
+    каждая пачка - один INSERT, уже добавленные записи пропускаются.
+    Рецепты знаменитостей пропускаются.
+    """
+    recipe_model = apps.get_model('recipes', 'Recipe')
+    follow_model = apps.get_model('users', 'Follow')
+    entry_model = apps.get_model('recipes', 'FeedEntry')
+    recipes = recipe_model.objects.filter(id__in=recipe_ids).exclude(
+        get_celebrity_filter('author__')
+    ).values_list('id', 'author_id', 'created')
+    for recipe_id, author_id, recipe_created in recipes:
+        followers = follow_model.objects.filter(
+            following_id=author_id
+        ).order_by('user_id').values_list('user_id', flat=True)
+        last = 0
+        while True:
+            batch = list(followers.filter(user_id__gt=last)[:FEED_BATCH_SIZE])
+            if not batch:
+                break
+            entry_model.objects.bulk_create([
+                entry_model(user_id=user_id, recipe_id=recipe_id,
+                            author_id=author_id, created=recipe_created)
+                for user_id in batch
+            ], ignore_conflicts=True)
+            last = batch[-1]
+
+
+def backfill(user_id, author_id, apps=django_apps):
+    """Добавит в ленту подписчика последние рецепты автора.
+
+    Берётся не больше FEED_BACKFILL_SIZE рецептов; для знаменитости ничего
+    не делает - её рецепты подмешиваются при чтении.
+    """
+    recipe_model = apps.get_model('recipes', 'Recipe')
+    entry_model = apps.get_model('recipes', 'FeedEntry')
+    recipes = recipe_model.objects.filter(author_id=author_id).exclude(
+        get_celebrity_filter('author__')
+    ).order_by('-created', '-id').values_list('id', 'created')
+    entry_model.objects.bulk_create([
+        entry_model(user_id=user_id, recipe_id=recipe_id,
+                    author_id=author_id, created=created)
+        for recipe_id, created in recipes[:FEED_BACKFILL_SIZE]
+    ], ignore_conflicts=True)
+
+
+def prune(user_id, author_id, apps=django_apps):
+    """Уберёт из ленты рецепты автора после отписки."""
+    apps.get_model('recipes', 'FeedEntry').objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete()
+
+
+@atomic
+def rebuild_feeds(apps=django_apps):
+    """Заново соберёт ленты всех пользователей по текущим подпискам.
+
+    Ленты очищаются, затем каждая подписка на обычного автора получает
+    FEED_BACKFILL_SIZE последних рецептов автора, как при подписке.
+    Подписки берутся пачками по FEED_BATCH_SIZE, на пачку - один
+    INSERT ... SELECT: рецепты нумеруются ROW_NUMBER() в разрезе подписки,
+    как в attach_latest_recipes. Вернет число записей в лентах.
+    """
+    recipe_model = apps.get_model('recipes', 'Recipe')
+    follow_model = apps.get_model('users', 'Follow')
+    entry_model = apps.get_model('recipes', 'FeedEntry')
+    entry_model.objects.all().delete()
+    follow_ids = follow_model.objects.order_by('id').values_list(
+        'id', flat=True)
+    last = 0
+    while True:
+        batch = list(follow_ids.filter(id__gt=last)[:FEED_BATCH_SIZE])
+        if not batch:
+            break
+        windowed = recipe_model.objects.filter(
+            author__following__id__gt=last,
+            author__following__id__lte=batch[-1],
+        ).exclude(get_celebrity_filter('author__')).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author__following__id'),
+                order_by=(F('created').desc(), F('id').desc()),
+            ),
+        ).order_by().values(
+            'id', 'author_id', 'created', 'row_number',
+            follower=F('author__following__user_id'),
+        )
+        sql, params = windowed.query.sql_with_params()
+        with connections[router.db_for_write(entry_model)].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {entry_model._meta.db_table} '
+                '(user_id, recipe_id, author_id, created) '
+                'SELECT follower, id, author_id, created '
+                f'FROM ({sql}) AS windowed WHERE row_number <= %s',
+                (*params, FEED_BACKFILL_SIZE),
+            )
+        last = batch[-1]
+    return entry_model.objects.count()
+
+
+def get_feed_page(user, ordering, position, size, keyset_filter):
+    """Вернет до size позиций ленты пользователя после позиции position.
+
+    Лента - это записи, разложенные при создании рецептов, плюс рецепты
+    знаменитостей, на которых подписан пользователь. Из каждого источника
+    берётся не больше size строк по индексу, результаты сливаются, поэтому
+    стоимость страницы не зависит от её номера и размера ленты. ordering -
+    ('-created', '-id') или обратный ему, keyset_filter(ordering, position)
+    строит условие "строго после позиции".
+    """
+    entry_model = django_apps.get_model('recipes', 'FeedEntry')
+    recipe_model = django_apps.get_model('recipes', 'Recipe')
+    follow_model = django_apps.get_model('users', 'Follow')
+    sources = [(
+        entry_model.objects.filter(user=user),
+        tuple(field.replace('id', 'recipe_id') if field.lstrip('-') == 'id'
+              else field for field in ordering),
+    )]
+    celebrities = list(follow_model.objects.filter(
+        get_celebrity_filter('following__'), user=user
+    ).values_list('following_id', flat=True))
+    if celebrities:
+        sources.append((
+            recipe_model.objects.filter(author_id__in=celebrities), ordering
+        ))
+    items = set()
+    for queryset, source_ordering in sources:
+        queryset = queryset.order_by(*source_ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                keyset_filter(source_ordering, position)
+            )
+        items.update(
+            FeedItem(*row) for row in queryset.values_list(
+                *(field.lstrip('-') for field in source_ordering)
+            )[:size]
+        )
+    return sorted(items, reverse=ordering[0].startswith('-'))[:size]
@@ -0,0 +1,13 @@
+from django.db.models import Field
+
+
+class SearchVectorField(Field):
+    """Поисковый вектор рецепта.
+
+    На PostgreSQL это tsvector, на остальных базах - текстовый столбец,
+    который остаётся пустым: там поиск идёт по исходным полям.
+    """
+
+    def db_type(self, connection):
+        """Тип столбца в зависимости от базы."""
+        return 'tsvector' if connection.vendor == 'postgresql' else 'text'
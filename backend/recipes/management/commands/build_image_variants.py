@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from backend.images import build_variants, needs_variants
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Строит уменьшенные копии картинок рецептов и аватаров.
+
+    Нужна для картинок, загруженных в обход сигналов (bulk_create,
+    скрипты заполнения базы) или до появления фоновой обработки.
+    """
+
+    help = 'Строит недостающие уменьшенные копии картинок и аватаров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Перестроить и уже готовые копии.')
+
+    def handle(self, *args, **options):
+        for model, field_name, variants_field in (
+            (Recipe, 'image', 'image_variants'),
+            (User, 'avatar', 'avatar_variants'),
+        ):
+            built = failed = 0
+            objects = model.objects.exclude(
+                **{f'{field_name}__isnull': True}
+            ).exclude(**{field_name: ''}).only(
+                'pk', field_name, variants_field
+            )
+            for instance in objects.iterator():
+                if not options['force'] and not needs_variants(
+                        instance, field_name, variants_field):
+                    continue
+                try:
+                    build_variants(
+                        model._meta.label, instance.pk, field_name,
+                        variants_field, getattr(instance, field_name).name,
+                    )
+                    built += 1
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'{model.__name__} {instance.pk}: '
+                                      f'{error}')
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: построено {built}, '
+                f'ошибок {failed}.'
+            )
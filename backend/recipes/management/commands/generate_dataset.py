@@ -0,0 +1,267 @@
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from math import gcd
+from random import Random
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.db.transaction import atomic
+from django.utils import timezone
+
+from recipes.counters import reconcile_counters
+from recipes.feed import rebuild_feeds
+from recipes.models import (Favoritism, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, ShortLink, Tag)
+from recipes.pantry import pantry_index
+from recipes.tags import reconcile_tags_masks
+from recipes.utils import get_short_link
+from users.models import Follow, User
+
+NAME_1 = ('Жаренная', 'Паренная', 'Варенная', 'Печеная', 'Копченая',
+          'Тушеная', 'Запеченная', 'Маринованная')
+NAME_2 = ('морковь', 'капуста', 'картошка', 'морошка', 'пелемешка',
+          'курица', 'рыба', 'тыква')
+ACTION = ('варить ', 'жарить ', 'парить ', 'мешать ', 'дать потомится ')
+FIRST_NAMES = ('Алина', 'Светлана', 'Екатерина', 'Мария', 'Елизавета',
+               'Елена', 'Иван', 'Пётр', 'Лев', 'Игорь')
+LAST_NAMES = ('Соловьёва', 'Ласточкина', 'Коршунова', 'Воронина',
+              'Соколова', 'Кукушкина', 'Пингвинова')
+IMAGES_NUMBER = 150
+
+
+def skewed_index(random, size, skew):
+    """Индекс от 0 до size - 1 по степенному закону.
+
+    Чем больше skew, тем чаще выпадают маленькие индексы: при skew = 3
+    почти половина выборки приходится на первые 10% индексов.
+    """
+    return int(size * random.random() ** skew)
+
+
+def get_stride(size, random):
+    """Шаг, взаимно простой с size, для перестановки index -> index * шаг."""
+    stride = random.randrange(size // 2 + 1, size + 2)
+    while gcd(stride, size) != 1:
+        stride += 1
+    return stride
+
+
+@contextmanager
+def manual_created():
+    """Позволит задать дату создания рецептов при bulk_create."""
+    field = Recipe._meta.get_field('created')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    """Генерирует большой правдоподобный набор данных для нагрузочных тестов.
+
+    Число рецептов у авторов, подписки, избранное и корзины распределены
+    неравномерно (степенной закон): немногие популярные авторы и рецепты
+    собирают большую часть подписок и добавлений. Всё вставляется пачками
+    через bulk_create, при одинаковом --seed набор получается одинаковым.
+    Тэги и ингредиенты берутся из базы, их нужно загрузить заранее.
+    """
+
+    help = 'Генерирует пользователей, рецепты, подписки, избранное и корзины.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument('--users', type=int, default=None,
+                            help='По умолчанию - рецептов / 5.')
+        parser.add_argument('--follows', type=float, default=10,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--favorites', type=float, default=10,
+                            help='Среднее число рецептов в избранном.')
+        parser.add_argument('--carts', type=float, default=3,
+                            help='Среднее число рецептов в корзине.')
+        parser.add_argument('--ingredients', type=int, default=6,
+                            help='Максимум ингредиентов в рецепте.')
+        parser.add_argument('--skew', type=float, default=3,
+                            help='Степень неравномерности популярности.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить рецепты.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.random = Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.ingredient_ids = list(Ingredient.objects.order_by(
+            'id').values_list('id', flat=True))
+        self.tag_ids = list(Tag.objects.order_by('id').values_list(
+            'id', flat=True))
+        if not self.ingredient_ids or not self.tag_ids:
+            raise CommandError('Сначала загрузите тэги и ингредиенты: '
+                               'scripts_sh/tag.sh и load_ingredients.')
+        start = perf_counter()
+        users = options['users'] or max(1, options['recipes'] // 5)
+        user_ids = self.step('Пользователи', self.create_users, users)
+        recipe_ids = self.step(
+            'Рецепты', self.create_recipes, options['recipes'], user_ids
+        )
+        self.step('Подписки', self.create_follows, user_ids)
+        for model, mean in ((Favoritism, options['favorites']),
+                            (ShoppingCart, options['carts'])):
+            self.step(model._meta.verbose_name, self.create_user_recipes,
+                      model, mean, user_ids, recipe_ids)
+        self.step('Счётчики', reconcile_counters)
+        self.step('Маски тэгов', reconcile_tags_masks)
+        self.step('Поисковые векторы', call_command, 'rebuild_search',
+                  verbosity=0)
+        self.step('Похожие рецепты', call_command, 'rebuild_similar',
+                  verbosity=0)
+        self.step('Ленты подписок', rebuild_feeds)
+        self.step('Индекс продуктов', pantry_index.invalidate)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {perf_counter() - start:.1f} с.'
+        ))
+
+    def step(self, name, function, *args, **kwargs):
+        """Выполнит шаг генерации и выведет время."""
+        start = perf_counter()
+        result = function(*args, **kwargs)
+        self.stdout.write(f'{name}: {perf_counter() - start:.1f} с.')
+        return result
+
+    def insert(self, model, objects, fetch_ids=False):
+        """Вставит объекты одной пачкой и, если нужно, вернет их id.
+
+        На SQLite Django 3.2 не возвращает id из bulk_create, поэтому они
+        читаются по возрастанию после максимального id до вставки.
+        """
+        last_id = fetch_ids and (
+            model.objects.aggregate(last_id=Max('id'))['last_id'] or 0)
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        if fetch_ids:
+            return model.objects.filter(id__gt=last_id).order_by(
+                'id').values_list('id', flat=True)
+        return None
+
+    def get_count(self, mean):
+        """Случайное количество со средним mean (экспоненциальное)."""
+        return int(self.random.expovariate(1 / mean)) if mean > 0 else 0
+
+    def create_users(self, number):
+        """Создаст пользователей с одним общим паролем password."""
+        password = make_password('password')
+        prefix = f'gen{self.options["seed"]}'
+        offset = User.objects.filter(username__startswith=prefix).count()
+        user_ids = array('q')
+        for start in range(offset, offset + number, self.batch_size):
+            stop = min(start + self.batch_size, offset + number)
+            with atomic():
+                user_ids.extend(self.insert(User, [
+                    User(
+                        username=f'{prefix}_{i}',
+                        email=f'{prefix}_{i}@example.com',
+                        first_name=self.random.choice(FIRST_NAMES),
+                        last_name=self.random.choice(LAST_NAMES),
+                        password=password,
+                    ) for i in range(start, stop)
+                ], fetch_ids=True))
+        return user_ids
+
+    def create_recipes(self, number, user_ids):
+        """Создаст рецепты с ингредиентами, тэгами и короткими ссылками."""
+        random, skew = self.random, self.options['skew']
+        now = timezone.now()
+        span = timedelta(days=self.options['days'])
+        recipe_ids = array('q')
+        for start in range(0, number, self.batch_size):
+            stop = min(start + self.batch_size, number)
+            with atomic(), manual_created():
+                ids = self.insert(Recipe, [
+                    Recipe(
+                        name=(f'{random.choice(NAME_1)} '
+                              f'{random.choice(NAME_2)}'),
+                        text=('Берём чистую кастрюлю...'
+                              f'{"".join(random.choices(ACTION, k=6))}. '
+                              'Готово!'),
+                        author_id=user_ids[
+                            skewed_index(random, len(user_ids), skew)],
+                        cooking_time=random.randint(1, 120),
+                        image=('recipes/images/test_r'
+                               f'{random.randint(1, IMAGES_NUMBER)}.jpg'),
+                        created=now - span + span * (i + random.random())
+                        / number,
+                    ) for i in range(start, stop)
+                ], fetch_ids=True)
+                self.create_recipe_relations(ids)
+            recipe_ids.extend(ids)
+        return recipe_ids
+
+    def create_recipe_relations(self, recipe_ids):
+        """Ингредиенты, тэги и короткие ссылки для пачки рецептов."""
+        random, skew = self.random, self.options['skew']
+        ingredients, tags, links = [], [], []
+        for recipe_id in recipe_ids:
+            chosen = {
+                self.ingredient_ids[skewed_index(
+                    random, len(self.ingredient_ids), skew)]
+                for _ in range(random.randint(1, self.options['ingredients']))
+            }
+            ingredients.extend(
+                RecipeIngredient(recipe_id=recipe_id, ingredient_id=i,
+                                 amount=random.randrange(10, 2000, 10))
+                for i in sorted(chosen)
+            )
+            tags.extend(
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in sorted(random.sample(
+                    self.tag_ids, random.randint(1, min(3, len(self.tag_ids)))
+                ))
+            )
+            links.append(ShortLink(recipe_id=recipe_id,
+                                   short=get_short_link(recipe_id)))
+        self.insert(RecipeIngredient, ingredients)
+        self.insert(RecipeTag, tags)
+        self.insert(ShortLink, links)
+
+    def create_follows(self, user_ids):
+        """Подписки: на популярных авторов подписываются чаще."""
+        random, skew = self.random, self.options['skew']
+        batch = []
+        for user_id in user_ids:
+            following = {
+                user_ids[skewed_index(random, len(user_ids), skew)]
+                for _ in range(self.get_count(self.options['follows']))
+            }
+            following.discard(user_id)
+            batch.extend(Follow(user_id=user_id, following_id=following_id)
+                         for following_id in sorted(following))
+            if len(batch) >= self.batch_size:
+                self.insert(Follow, batch)
+                batch = []
+        self.insert(Follow, batch)
+
+    def create_user_recipes(self, model, mean, user_ids, recipe_ids):
+        """Избранное или корзина: популярные рецепты добавляют чаще.
+
+        Популярность не совпадает с порядком создания - индексы рецептов
+        перемешиваются умножением на шаг, взаимно простой с их числом.
+        """
+        random, skew = self.random, self.options['skew']
+        size = len(recipe_ids)
+        stride = get_stride(size, random)
+        batch = []
+        for user_id in user_ids:
+            chosen = {
+                recipe_ids[skewed_index(random, size, skew) * stride % size]
+                for _ in range(self.get_count(mean))
+            }
+            batch.extend(model(user_id=user_id, recipe_id=recipe_id)
+                         for recipe_id in sorted(chosen))
+            if len(batch) >= self.batch_size:
+                self.insert(model, batch)
+                batch = []
+        self.insert(model, batch)
@@ -0,0 +1,224 @@
+import csv
+import json
+import unicodedata
+from io import TextIOBase
+from pathlib import Path
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.transaction import atomic
+
+from api.v1.cache import ingredients_cache
+from backend.settings import BASE_DIR, LENGTH_TEXT_MEDIUM, LENGTH_TEXT_SHORT
+from recipes.models import Ingredient
+
+DEFAULT_PATH = BASE_DIR / 'scripts_sh' / 'ingredients.json'
+CHUNK_SIZE = 1 << 16
+
+
+def normalize(text):
+    """Приведёт строку к NFC и схлопнет пробелы."""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """Потоково прочитает JSON-массив объектов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                if buffer[position:].strip():
+                    raise
+                return
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield item
+
+
+def iter_rows(path):
+    """Вернет пары (название, единица измерения) из CSV или JSON.
+
+    Строка CSV меньше чем из двух столбцов - ошибка с номером строки.
+    """
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.suffix.lower() == '.json':
+            for item in iter_json_array(file):
+                yield item['name'], item['measurement_unit']
+        else:
+            reader = csv.reader(file)
+            for row in reader:
+                if not row or row[:2] == ['name', 'measurement_unit']:
+                    continue
+                if len(row) < 2:
+                    raise CommandError(
+                        f'{path}, строка {reader.line_num}: нужны два '
+                        'столбца - название и единица измерения.'
+                    )
+                yield row[0], row[1]
+
+
+class CSVStream(TextIOBase):
+    """Файлоподобный объект для COPY: отдаёт строки CSV по мере чтения."""
+
+    def __init__(self, rows):
+        self.lines = self.get_lines(rows)
+        self.buffer = ''
+
+    @staticmethod
+    def get_lines(rows):
+        """Превратит пары в строки CSV."""
+        for name, measurement_unit in rows:
+            yield '"{0}","{1}"\n'.format(
+                name.replace('"', '""'), measurement_unit.replace('"', '""')
+            )
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        """Вернет не меньше size символов, если они ещё есть."""
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class Command(BaseCommand):
+    """Загружает каталог ингредиентов из CSV или JSON.
+
+    Файл читается потоково, названия нормализуются. Существующие
+    ингредиенты обновляются, новые добавляются, поэтому повторный запуск
+    безопасен. На PostgreSQL строки копируются через COPY во временную
+    таблицу и вставляются одним INSERT ... ON CONFLICT, на других базах -
+    пачками через bulk_create и bulk_update.
+    """
+
+    help = 'Загружает или обновляет ингредиенты из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_PATH),
+                            help='Файл CSV (название,единица) или JSON.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Размер пачки для bulk_create.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+        self.skipped = 0
+        start = perf_counter()
+        with atomic():
+            if connection.vendor == 'postgresql':
+                read, created, updated = self.load_postgresql(path)
+            else:
+                read, created, updated = self.load_batches(
+                    path, options['batch_size']
+                )
+        ingredients_cache.bump()
+        duration = perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read}, добавлено {created}, обновлено {updated}, '
+            f'пропущено {self.skipped} за {duration:.2f} с '
+            f'({read / duration:.0f} строк/с).'
+        ))
+
+    def clean_rows(self, path):
+        """Нормализует строки и отбросит некорректные."""
+        for name, measurement_unit in iter_rows(path):
+            name, measurement_unit = normalize(name), normalize(
+                measurement_unit)
+            if (not name or not measurement_unit
+                    or len(name) > LENGTH_TEXT_MEDIUM
+                    or len(measurement_unit) > LENGTH_TEXT_SHORT):
+                self.skipped += 1
+                continue
+            yield name, measurement_unit
+
+    def load_postgresql(self, path):
+        """COPY во временную таблицу и один INSERT ... ON CONFLICT."""
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_staging ('
+                'position bigserial, name text, measurement_unit text'
+                ') ON COMMIT DROP'
+            )
+            cursor.cursor.copy_expert(
+                'COPY ingredient_staging (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                CSVStream(self.clean_rows(path)),
+            )
+            cursor.execute('SELECT count(*) FROM ingredient_staging')
+            read = cursor.fetchone()[0]
+            cursor.execute(
+                f'WITH upserted AS ('
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT DISTINCT ON (name) name, measurement_unit '
+                f'FROM ingredient_staging ORDER BY name, position DESC '
+                f'ON CONFLICT (name) DO UPDATE '
+                f'SET measurement_unit = EXCLUDED.measurement_unit '
+                f'WHERE {table}.measurement_unit '
+                f'IS DISTINCT FROM EXCLUDED.measurement_unit '
+                f'RETURNING xmax = 0 AS inserted) '
+                f'SELECT count(*) FILTER (WHERE inserted), '
+                f'count(*) FILTER (WHERE NOT inserted) FROM upserted'
+            )
+            created, updated = cursor.fetchone()
+        return read, created, updated
+
+    def load_batches(self, path, batch_size):
+        """Пачками: один SELECT, bulk_create и bulk_update на пачку."""
+        lookup_size = min(
+            batch_size, connection.features.max_query_params or batch_size
+        )
+        read = created = updated = 0
+        batch = {}
+        for name, measurement_unit in self.clean_rows(path):
+            read += 1
+            batch[name] = measurement_unit
+            if len(batch) >= lookup_size:
+                created, updated = self.save_batch(
+                    batch, batch_size, created, updated
+                )
+                batch = {}
+        if batch:
+            created, updated = self.save_batch(
+                batch, batch_size, created, updated
+            )
+        return read, created, updated
+
+    @staticmethod
+    def save_batch(batch, batch_size, created, updated):
+        """Сохранит пачку: новые добавит, изменившиеся обновит."""
+        existing = Ingredient.objects.filter(name__in=batch).only(
+            'id', 'name', 'measurement_unit'
+        )
+        changed = []
+        for ingredient in existing:
+            measurement_unit = batch.pop(ingredient.name)
+            if ingredient.measurement_unit != measurement_unit:
+                ingredient.measurement_unit = measurement_unit
+                changed.append(ingredient)
+        Ingredient.objects.bulk_update(
+            changed, ['measurement_unit'], batch_size=batch_size
+        )
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in batch.items()
+        ], batch_size=batch_size, ignore_conflicts=True)
+        return created + len(batch), updated + len(changed)
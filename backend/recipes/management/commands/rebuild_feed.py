@@ -0,0 +1,22 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    """Заново соберёт ленты подписок всех пользователей.
+
+    Нужна, если ленты разошлись с подписками: например, после загрузки
+    данных в обход ORM или после изменения FEED_CELEBRITY_FOLLOWERS.
+    """
+
+    help = 'Пересоберёт ленты подписок.'
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        entries = rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'В лентах {entries} записей, {perf_counter() - start:.1f} с.'
+        ))
@@ -0,0 +1,39 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from recipes.models import Recipe
+from recipes.search import is_postgresql, rebuild_search_vectors
+
+
+class Command(BaseCommand):
+    """Пересчитает поисковые векторы всех рецептов.
+
+    Векторы пересчитываются диапазонами id, каждый диапазон - один
+    запрос, чтобы не держать блокировку всей таблицы. Нужна только на
+    PostgreSQL, на других базах поиск идёт по исходным полям.
+    """
+
+    help = 'Пересчитает поисковые векторы рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Рецептов в одном запросе.')
+
+    def handle(self, *args, **options):
+        if not is_postgresql():
+            self.stdout.write('Поисковые векторы нужны только PostgreSQL.')
+            return
+        start = perf_counter()
+        bounds = Recipe.objects.aggregate(first=Min('id'), last=Max('id'))
+        updated = 0
+        if bounds['first'] is not None:
+            for first in range(bounds['first'], bounds['last'] + 1,
+                               options['batch_size']):
+                updated += rebuild_search_vectors(
+                    first, first + options['batch_size'] - 1
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено {updated} рецептов за {perf_counter() - start:.1f} с.'
+        ))
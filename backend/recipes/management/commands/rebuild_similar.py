@@ -0,0 +1,26 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.similar import rebuild_signatures
+
+
+class Command(BaseCommand):
+    """Пересчитает подписи MinHash и ключи LSH всех рецептов.
+
+    Нужна после загрузки рецептов в обход API и админки и после смены
+    настроек SIMILAR_*. Рецепты обрабатываются пачками по возрастанию id.
+    """
+
+    help = 'Пересчитает подписи похожих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Рецептов в одной пачке.')
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        updated = rebuild_signatures(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено {updated} рецептов за {perf_counter() - start:.1f} с.'
+        ))
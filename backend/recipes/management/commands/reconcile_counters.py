@@ -0,0 +1,29 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db.transaction import atomic
+
+from recipes.counters import reconcile_counters
+from recipes.tags import reconcile_tags_masks
+
+
+class Command(BaseCommand):
+    """Пересчитает счётчики избранного, корзин, рецептов и подписчиков.
+
+    Заодно пересчитает маски тэгов рецептов. Счётчики и маски
+    поддерживаются при каждом изменении, а команда исправляет расхождения
+    после массовых вставок в обход ORM или сбоев.
+    """
+
+    help = 'Пересчитает денормализованные счётчики и маски тэгов.'
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        with atomic():
+            fixed = reconcile_counters()
+            fixed['Recipe.tags_mask'] = reconcile_tags_masks()
+        for name, count in fixed.items():
+            self.stdout.write(f'{name}: исправлено {count}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {perf_counter() - start:.1f} с.'
+        ))
@@ -0,0 +1,71 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Параметры коротких ссылок на момент этой миграции.
+STRING_CHARACTERS = ('abcdefghijklmnopqrstuvwxyz'
+                     'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                     '1234567890')
+SHORT_LINK_MIN_LENGTH = 5
+SHORT_LINK_MULTIPLIER = 387420489
+SHORT_LINK_OFFSET = 104729
+
+
+def get_short_link(number):
+    """Короткая ссылка рецепта, копия recipes.utils.get_short_link."""
+    base = len(STRING_CHARACTERS)
+    length = SHORT_LINK_MIN_LENGTH
+    while number >= base ** length:
+        length += 1
+    number = (number * SHORT_LINK_MULTIPLIER
+              + SHORT_LINK_OFFSET) % base ** length
+    digits = []
+    for _ in range(length):
+        number, digit = divmod(number, base)
+        digits.append(STRING_CHARACTERS[digit])
+    return ''.join(reversed(digits))
+
+
+def collapse_short_links(apps, schema_editor):
+    """Оставит каждому рецепту одну, самую первую, короткую ссылку."""
+    ShortLink = apps.get_model('recipes', 'ShortLink')
+    first_links = ShortLink.objects.values('recipe').annotate(
+        first_id=models.Min('id')).values('first_id')
+    ShortLink.objects.exclude(id__in=first_links).delete()
+
+
+def create_missing_short_links(apps, schema_editor):
+    """Создаст короткие ссылки рецептам, у которых их нет."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ShortLink = apps.get_model('recipes', 'ShortLink')
+    recipe_ids = Recipe.objects.filter(
+        shortlink__isnull=True).values_list('id', flat=True)
+    ShortLink.objects.bulk_create([
+        ShortLink(recipe_id=recipe_id, short=get_short_link(recipe_id))
+        for recipe_id in recipe_ids.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_auto_20240818_1440'),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_short_links, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='shortlink',
+            name='recipe',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='shortlink',
+            name='short',
+            field=models.CharField(max_length=11, unique=True, verbose_name='Короткая ссылка'),
+        ),
+        migrations.RunPython(
+            create_missing_short_links, migrations.RunPython.noop
+        ),
+    ]
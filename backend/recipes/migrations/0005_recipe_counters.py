@@ -0,0 +1,54 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# (приложение, модель, поле-счётчик, модель связи, поле связи) на момент
+# этой миграции.
+COUNTERS = (
+    ('recipes', 'Recipe', 'favorites_count', 'Favoritism', 'recipe'),
+    ('recipes', 'Recipe', 'carts_count', 'ShoppingCart', 'recipe'),
+    ('users', 'UserFoodgram', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users', 'UserFoodgram', 'followers_count', 'Follow', 'following'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    """Заполнит счётчики по существующим данным.
+
+    На каждый счётчик - один UPDATE с коррелированным подзапросом.
+    """
+    for app_label, model_name, field, related_name, link in COUNTERS:
+        model = apps.get_model(app_label, model_name)
+        related = apps.get_model(
+            related_name if '.' in related_name
+            else f'{app_label}.{related_name}'
+        )
+        actual = Coalesce(Subquery(
+            related.objects.filter(**{link: OuterRef('pk')}).order_by(
+            ).values(link).annotate(count=Count('pk')).values('count')
+        ), Value(0))
+        model.objects.update(**{field: actual})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_image_variants'),
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:23
+
+from django.conf import settings
+from django.db import migrations
+
+import recipes.fields
+
+CREATE_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX recipes_recipe_search_vector_gin '
+    'ON recipes_recipe USING gin (search_vector)',
+    'CREATE INDEX recipes_recipe_name_trigram_gin '
+    'ON recipes_recipe USING gin (name gin_trgm_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin',
+    'DROP INDEX IF EXISTS recipes_recipe_name_trigram_gin',
+)
+# Векторы строятся с той же конфигурацией, что и поисковые запросы.
+FILL_SEARCH_VECTORS = '''
+    UPDATE recipes_recipe AS recipe SET search_vector =
+        setweight(to_tsvector(%(config)s, recipe.name), 'A')
+        || setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_recipeingredient AS link
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = link.ingredient_id
+            WHERE link.recipe_id = recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector(%(config)s, recipe.text), 'C')
+'''
+
+
+def create_indexes(apps, schema_editor):
+    """Создаст индексы поиска и заполнит векторы, только на PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in CREATE_INDEXES:
+        schema_editor.execute(sql)
+    schema_editor.execute(
+        FILL_SEARCH_VECTORS, {'config': settings.SEARCH_CONFIG}
+    )
+
+
+def drop_indexes(apps, schema_editor):
+    """Удалит индексы поиска."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in DROP_INDEXES:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=recipes.fields.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_masks(apps, schema_editor):
+    """Назначит тэгам биты по порядку id и заполнит маски рецептов."""
+    tag_model = apps.get_model('recipes', 'Tag')
+    for bit, tag in enumerate(tag_model.objects.order_by('id')):
+        tag.mask = 1 << bit
+        tag.save(update_fields=('mask',))
+    # Биты тэгов не пересекаются: сумма масок тэгов рецепта - их объединение.
+    actual = Coalesce(Subquery(
+        apps.get_model('recipes', 'RecipeTag').objects.filter(
+            recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+            mask=Sum('tag__mask')).values('mask')
+    ), Value(0))
+    apps.get_model('recipes', 'Recipe').objects.update(tags_mask=actual)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tag',
+            name='mask',
+            field=models.BigIntegerField(editable=False, null=True, verbose_name='Бит в маске рецептов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(db_index=True, default=0, editable=False, verbose_name='Маска тэгов'),
+        ),
+        migrations.RunPython(fill_masks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='mask',
+            field=models.BigIntegerField(editable=False, unique=True, verbose_name='Бит в маске рецептов'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    """Разложит по лентам рецепты авторов из текущих подписок.
+
+    Каждая подписка на обычного автора получает FEED_BACKFILL_SIZE
+    последних рецептов автора. Подписки берутся пачками по
+    FEED_BATCH_SIZE, на пачку - один INSERT ... SELECT с ROW_NUMBER() в
+    разрезе подписки. Пороги берутся из настроек: с ними работает чтение
+    лент.
+    """
+    recipe_model = apps.get_model('recipes', 'Recipe')
+    follow_model = apps.get_model('users', 'Follow')
+    follow_ids = follow_model.objects.order_by('id').values_list(
+        'id', flat=True)
+    last = 0
+    while True:
+        batch = list(follow_ids.filter(id__gt=last)[:settings.FEED_BATCH_SIZE])
+        if not batch:
+            break
+        windowed = recipe_model.objects.filter(
+            author__following__id__gt=last,
+            author__following__id__lte=batch[-1],
+        ).exclude(
+            author__followers_count__gte=settings.FEED_CELEBRITY_FOLLOWERS
+        ).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author__following__id'),
+                order_by=(F('created').desc(), F('id').desc()),
+            ),
+        ).order_by().values(
+            'id', 'author_id', 'created', 'row_number',
+            follower=F('author__following__user_id'),
+        )
+        sql, params = windowed.query.sql_with_params()
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO recipes_feedentry '
+                '(user_id, recipe_id, author_id, created) '
+                'SELECT follower, id, author_id, created '
+                f'FROM ({sql}) AS windowed WHERE row_number <= %s',
+                (*params, settings.FEED_BACKFILL_SIZE),
+            )
+        last = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0007_tags_mask'),
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(verbose_name='Дата создания рецепта')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-created'], name='recipe_author_created'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-created', '-recipe'], name='feed_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe_in_feed'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,156 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:58
+
+from array import array
+from hashlib import blake2b
+from random import Random
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BATCH_SIZE = 10000
+PRIME = (1 << 31) - 1
+
+
+def get_coefficients():
+    """Коэффициенты хэш-функций MinHash (a * x + b) mod PRIME.
+
+    Параметры берутся из настроек: с ними считаются подписи новых
+    рецептов, и подписи из миграции должны с ними совпадать.
+    """
+    seeded = Random(settings.SIMILAR_SEED)
+    return [
+        (seeded.randrange(1, PRIME), seeded.randrange(PRIME))
+        for _ in range(settings.SIMILAR_BANDS * settings.SIMILAR_ROWS)
+    ]
+
+
+def get_minimums(feature_lists, coefficients):
+    """Минимумы хэшей по ингредиентам и по тэгам для каждого рецепта.
+
+    Ингредиенты - чётные элементы множества, тэги - нечётные.
+    """
+    if numpy is None:
+        result = []
+        for features in feature_lists:
+            minimums = [[PRIME] * len(coefficients) for _ in range(2)]
+            for x in features:
+                row = minimums[x & 1]
+                for number, (a, b) in enumerate(coefficients):
+                    row[number] = min(row[number], (a * x + b) % PRIME)
+            result.append(minimums)
+        return result
+    features = numpy.array(
+        [x for items in feature_lists for x in items], dtype=numpy.int64
+    )
+    offsets = numpy.cumsum([0] + [len(items) for items in feature_lists[:-1]])
+    a, b = numpy.array(coefficients, dtype=numpy.int64).T
+    hashes = (features[:, None] * a + b) % PRIME
+    is_tag = (features & 1).astype(bool)[:, None]
+    ingredients, tags = (
+        numpy.minimum.reduceat(
+            numpy.where(mask, hashes, PRIME), offsets, axis=0
+        ).tolist() for mask in (~is_tag, is_tag)
+    )
+    return list(zip(ingredients, tags))
+
+
+def get_buckets(signature, ingredients, tags):
+    """Ключи LSH полос, в которых хотя бы один минимум дал ингредиент."""
+    rows = settings.SIMILAR_ROWS
+    return [
+        int.from_bytes(blake2b(
+            array('I', [band]).tobytes()
+            + signature[band * rows:(band + 1) * rows].tobytes(),
+            digest_size=8,
+        ).digest(), 'big', signed=True)
+        for band in range(settings.SIMILAR_BANDS)
+        if any(ingredients[number] < tags[number]
+               for number in range(band * rows, (band + 1) * rows))
+    ]
+
+
+def fill_signatures(apps, schema_editor):
+    """Посчитает подписи MinHash и ключи LSH всех рецептов.
+
+    Копия recipes.similar на момент этой миграции: рецепты берутся
+    пачками по BATCH_SIZE, рецепты без ингредиентов и тэгов пропускаются.
+    """
+    coefficients = get_coefficients()
+    recipe_ids = apps.get_model('recipes', 'Recipe').objects.order_by(
+        'id').values_list('id', flat=True)
+    signature_model = apps.get_model('recipes', 'RecipeSignature')
+    bucket_model = apps.get_model('recipes', 'RecipeBucket')
+    last = 0
+    while True:
+        batch = list(recipe_ids.filter(id__gt=last)[:BATCH_SIZE])
+        if not batch:
+            return
+        features = {recipe_id: [] for recipe_id in batch}
+        for model, field, shift in (
+            (apps.get_model('recipes', 'RecipeIngredient'), 'ingredient_id',
+             0),
+            (apps.get_model('recipes', 'RecipeTag'), 'tag_id', 1),
+        ):
+            for recipe_id, value in model.objects.filter(
+                    recipe_id__in=batch).values_list('recipe_id', field):
+                features[recipe_id].append((2 * value + shift) % PRIME)
+        present = [recipe_id for recipe_id in batch if features[recipe_id]]
+        minimums = get_minimums(
+            [features[recipe_id] for recipe_id in present], coefficients
+        ) if present else []
+        signatures, buckets = [], []
+        for recipe_id, (ingredients, tags) in zip(present, minimums):
+            signature = array('I', map(min, ingredients, tags))
+            signatures.append(signature_model(
+                recipe_id=recipe_id, minhash=signature.tobytes()))
+            buckets += [
+                bucket_model(recipe_id=recipe_id, bucket=bucket)
+                for bucket in get_buckets(signature, ingredients, tags)
+            ]
+        signature_model.objects.bulk_create(signatures, batch_size=400)
+        bucket_model.objects.bulk_create(buckets, batch_size=400)
+        last = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSignature',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('minhash', models.BinaryField(verbose_name='Подпись MinHash')),
+            ],
+            options={
+                'verbose_name': 'Подпись MinHash',
+                'verbose_name_plural': 'Подписи MinHash',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(verbose_name='Ключ полосы')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Ключ LSH',
+                'verbose_name_plural': 'Ключи LSH',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipebucket',
+            index=models.Index(fields=['bucket', 'recipe'], name='bucket_recipe'),
+        ),
+        migrations.RunPython(fill_signatures, migrations.RunPython.noop),
+    ]
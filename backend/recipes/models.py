@@ -1,14 +1,20 @@
 from django.core.validators import MinValueValidator
-from django.db.models import (CASCADE, CharField, DateTimeField, ForeignKey,
-                              ImageField, IntegerField, ManyToManyField, Model,
-                              PositiveSmallIntegerField, SlugField, TextField,
-                              UniqueConstraint)
+from django.db.models import (CASCADE, BigIntegerField, BinaryField, CharField,
+                              DateTimeField, ForeignKey, ImageField, Index,
+                              IntegerField, JSONField, Manager,
+                              ManyToManyField, Model, OneToOneField,
+                              PositiveIntegerField, PositiveSmallIntegerField,
+                              SlugField, TextField, UniqueConstraint)
 from django.utils.safestring import mark_safe
 
+from backend.counters import CounterModelMixin, CounterQuerySet
+from backend.images import get_thumbnail_url
 from backend.settings import (LENGTH_SHORT_LINK, LENGTH_TEXT_LONG,
                               LENGTH_TEXT_MEDIUM, LENGTH_TEXT_SHORT,
                               LENGTH_TEXT_SMALL, MIN_AMOUNT, MIN_COOKING_TIME)
 from users.models import User
+from .fields import SearchVectorField
+from .tags import get_free_tag_mask
 from .utils import get_short_link
 
 
@@ -26,6 +32,11 @@ class Tag(Model):
         help_text='Уникальный идентификатор тэга, '
         'разрешены символы латиницы, цифры, дефис и подчёркивание.',
     )
+    mask = BigIntegerField(
+        verbose_name='Бит в маске рецептов',
+        unique=True,
+        editable=False,
+    )
 
     class Meta:
         """Метаданные."""
@@ -37,6 +48,17 @@ class Tag(Model):
         """Строковое представление экземпляра класса."""
         return f'{self.name}'
 
+    def clean(self):
+        """Назначит новому тэгу свободный бит или сообщит, что их нет."""
+        if not self.mask:
+            self.mask = get_free_tag_mask(Tag)
+
+    def save(self, *args, **kwargs):
+        """Назначит новому тэгу свободный бит."""
+        if not self.mask:
+            self.mask = get_free_tag_mask(Tag)
+        return super().save(*args, **kwargs)
+
 
 class Ingredient(Model):
     """Ингредиент."""
@@ -62,7 +84,18 @@ class Ingredient(Model):
         return f'{self.name}, {self.measurement_unit}'
 
 
-class Recipe(Model):
+class RecipeManager(Manager.from_queryset(CounterQuerySet)):
+    """Не загружает поисковый вектор: он нужен только в условиях запросов.
+
+    Заодно save() не перезапишет вектор, пересчитанный в базе.
+    """
+
+    def get_queryset(self):
+        """Отложит загрузку поискового вектора."""
+        return super().get_queryset().defer('search_vector')
+
+
+class Recipe(CounterModelMixin, Model):
     """Рецепт."""
 
     name = CharField(
@@ -101,11 +134,40 @@ class Recipe(Model):
         null=True,
         default=None,
     )
+    image_variants = JSONField(
+        verbose_name='Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     created = DateTimeField(
         auto_now_add=True,
         db_index=True,
         verbose_name='Дата создания',
     )
+    favorites_count = PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    carts_count = PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False,
+    )
+    tags_mask = BigIntegerField(
+        verbose_name='Маска тэгов',
+        default=0,
+        db_index=True,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeManager()
 
     class Meta:
         """Метаданные."""
@@ -113,6 +175,9 @@ class Recipe(Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-created',)
+        indexes = [
+            Index(fields=['author', '-created'], name='recipe_author_created'),
+        ]
 
     def __str__(self):
         """Строковое представление экземпляра класса."""
@@ -122,28 +187,32 @@ class Recipe(Model):
     def get_html_image(self):
         """Возвращает миниатюру."""
         if self.image:
-            return mark_safe(f'<img src="{self.image.url}" width=70>')
+            url = get_thumbnail_url(self.image, self.image_variants)
+            return mark_safe(f'<img src="{url}" width=70>')
         return 'Нет картинки'
 
     def save(self, force_insert=False, force_update=False,
              using=None, update_fields=None):
         """При сохранение нового рецепта, создаёт короткую ссылку."""
+        adding = self._state.adding
         instance = super().save(
             force_insert, force_update, using, update_fields
         )
-        self.create_short_link()
+        if adding:
+            ShortLink.objects.using(using).create(
+                recipe=self, short=get_short_link(self.id)
+            )
         return instance
 
     def create_short_link(self):
-        """Создаст короткую ссылку на рецепт."""
-        while True:
-            short_link = get_short_link()
-            if not ShortLink.objects.filter(short=short_link).exists():
-                return ShortLink.objects.create(recipe=self, short=short_link)
+        """Создаст короткую ссылку на рецепт, если её ещё нет."""
+        return ShortLink.objects.get_or_create(
+            recipe=self, defaults={'short': get_short_link(self.id)}
+        )[0]
 
     @property
     def short_link(self):
-        """Создаст короткую ссылку на рецепт."""
+        """Вернет короткую ссылку на рецепт, создав её при необходимости."""
         return self.create_short_link()
 
 
@@ -213,7 +282,7 @@ class RecipeIngredient(Model):
         return f'{self.ingredient} {self.amount}'
 
 
-class Favoritism(Model):
+class Favoritism(CounterModelMixin, Model):
     """Модель для добавления рецепта в избранное."""
 
     user = ForeignKey(
@@ -228,6 +297,8 @@ class Favoritism(Model):
         related_name='favorite',
     )
 
+    objects = CounterQuerySet.as_manager()
+
     class Meta:
         """Метаданные."""
 
@@ -246,7 +317,7 @@ class Favoritism(Model):
                 '{1}.'.format(self.user, self.recipe.name))
 
 
-class ShoppingCart(Model):
+class ShoppingCart(CounterModelMixin, Model):
     """Модель для добавления рецепта корзину."""
 
     user = ForeignKey(
@@ -261,6 +332,8 @@ class ShoppingCart(Model):
         related_name='shop',
     )
 
+    objects = CounterQuerySet.as_manager()
+
     class Meta:
         """Метаданные."""
 
@@ -282,7 +355,7 @@ class ShoppingCart(Model):
 class ShortLink(Model):
     """Модель для хранение коротких ссылок рецептов."""
 
-    recipe = ForeignKey(
+    recipe = OneToOneField(
         Recipe,
         on_delete=CASCADE,
         verbose_name='Рецепт',
@@ -302,3 +375,114 @@ class ShortLink(Model):
     def __str__(self):
         """Строковое представление экземпляра класса."""
         return f'Короткая ссылка рецепта {self.recipe.name}: {self.short}'
+
+
+class RecipeSignature(Model):
+    """Подпись MinHash множества ингредиентов и тэгов рецепта.
+
+    Хранится отдельно от рецепта: пересчёт подписей только вставляет
+    строки и не трогает таблицу рецептов. См. recipes.similar.
+    """
+
+    recipe = OneToOneField(
+        Recipe,
+        on_delete=CASCADE,
+        primary_key=True,
+        verbose_name='Рецепт',
+        related_name='+',
+    )
+    minhash = BinaryField(
+        verbose_name='Подпись MinHash',
+    )
+
+    class Meta:
+        """Метаданные."""
+
+        verbose_name = 'Подпись MinHash'
+        verbose_name_plural = 'Подписи MinHash'
+
+    def __str__(self):
+        """Строковое представление экземпляра класса."""
+        return f'Подпись рецепта {self.recipe_id}'
+
+
+class RecipeBucket(Model):
+    """Ключ LSH рецепта: по одному на полосу подписи MinHash с ингредиентом.
+
+    Рецепты с общим ключом - кандидаты в похожие, см. recipes.similar.
+    """
+
+    recipe = ForeignKey(
+        Recipe,
+        on_delete=CASCADE,
+        verbose_name='Рецепт',
+        related_name='+',
+    )
+    bucket = BigIntegerField(
+        verbose_name='Ключ полосы',
+    )
+
+    class Meta:
+        """Метаданные."""
+
+        verbose_name = 'Ключ LSH'
+        verbose_name_plural = 'Ключи LSH'
+        indexes = [
+            Index(fields=['bucket', 'recipe'], name='bucket_recipe'),
+        ]
+
+    def __str__(self):
+        """Строковое представление экземпляра класса."""
+        return f'{self.recipe_id}: {self.bucket}'
+
+
+class FeedEntry(Model):
+    """Запись ленты подписок: рецепт автора, на которого подписан user.
+
+    Заполняется при создании рецепта и при подписке, см. recipes.feed.
+    Дата создания рецепта скопирована, чтобы страница ленты читалась по
+    индексу (user, created, recipe) без соединения с рецептами.
+    """
+
+    user = ForeignKey(
+        User,
+        on_delete=CASCADE,
+        verbose_name='Пользователь',
+        related_name='feed',
+    )
+    recipe = ForeignKey(
+        Recipe,
+        on_delete=CASCADE,
+        verbose_name='Рецепт',
+        related_name='+',
+    )
+    author = ForeignKey(
+        User,
+        on_delete=CASCADE,
+        verbose_name='Автор',
+        related_name='+',
+    )
+    created = DateTimeField(
+        verbose_name='Дата создания рецепта',
+    )
+
+    class Meta:
+        """Метаданные."""
+
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_user_recipe_in_feed'
+            ),
+        ]
+        indexes = [
+            Index(fields=['user', '-created', '-recipe'],
+                  name='feed_user_created'),
+            Index(fields=['user', 'author'], name='feed_user_author'),
+        ]
+
+    def __str__(self):
+        """Строковое представление экземпляра класса."""
+        return f'{self.recipe_id} в ленте {self.user_id}'
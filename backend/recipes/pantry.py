@@ -0,0 +1,243 @@
+from array import array
+from collections import Counter
+from heapq import nlargest
+from itertools import groupby
+from operator import itemgetter
+from threading import Lock
+from time import monotonic
+
+from django.core.cache import caches
+from django.db.transaction import on_commit
+
+from backend.settings import (CACHES, CATALOG_CACHE_ALIAS,
+                              PANTRY_GARBAGE_RATIO, PANTRY_INDEX_LOCAL_TIMEOUT,
+                              PANTRY_JOURNAL_REPLAY, PANTRY_JOURNAL_TIMEOUT)
+from .models import RecipeIngredient
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class PantryIndex:
+    """Обратный индекс ингредиент -> рецепты для подбора по продуктам.
+
+    Рецептам назначены плотные позиции: recipe_ids[позиция] - id рецепта,
+    sizes[позиция] - число его ингредиентов. Для ингредиента хранится
+    массив позиций рецептов, в которых он есть (4 байта на позицию).
+    Изменённый рецепт получает новую позицию, а у старой размер обнуляется
+    и она пропускается при подсчёте; когда таких позиций становится больше
+    доли PANTRY_GARBAGE_RATIO, индекс нужно собрать заново.
+    """
+
+    def __init__(self, rows=()):
+        """rows - пары (id рецепта, id ингредиента) по возрастанию рецепта."""
+        self.recipe_ids = array('Q')
+        self.sizes = array('H')
+        self.positions = {}
+        self.postings = {}
+        self.garbage = 0
+        for recipe_id, group in groupby(rows, key=itemgetter(0)):
+            self.add(recipe_id, {ingredient_id for _, ingredient_id in group})
+
+    def add(self, recipe_id, ingredients):
+        """Добавит рецепт с набором ингредиентов, заменив прежний набор."""
+        position = self.positions.pop(recipe_id, None)
+        if position is not None:
+            self.sizes[position] = 0
+            self.garbage += 1
+        if not ingredients:
+            return
+        position = len(self.recipe_ids)
+        self.positions[recipe_id] = position
+        self.recipe_ids.append(recipe_id)
+        self.sizes.append(len(ingredients))
+        for ingredient_id in ingredients:
+            posting = self.postings.get(ingredient_id)
+            if posting is None:
+                posting = self.postings[ingredient_id] = array('I')
+            posting.append(position)
+
+    @property
+    def needs_rebuild(self):
+        """Вернет True, если удалённых позиций слишком много."""
+        return self.garbage > len(self.recipe_ids) * PANTRY_GARBAGE_RATIO
+
+    def rank(self, ingredient_ids, limit):
+        """Вернет до limit пар (id рецепта, покрытие), лучшие первыми.
+
+        Покрытие - доля ингредиентов рецепта, которые есть среди
+        ingredient_ids. При равном покрытии выше рецепт, в котором совпало
+        больше ингредиентов, затем более новый (с большим id).
+        """
+        postings = [
+            self.postings[ingredient_id] for ingredient_id in ingredient_ids
+            if ingredient_id in self.postings
+        ]
+        if not postings or not limit:
+            return []
+        if numpy is None:
+            return self.rank_python(postings, limit)
+        return self.rank_numpy(postings, limit)
+
+    def rank_numpy(self, postings, limit):
+        """Подсчёт совпадений одним bincount по всем спискам позиций."""
+        counts = numpy.bincount(numpy.concatenate([
+            numpy.frombuffer(posting, dtype=numpy.uint32)
+            for posting in postings
+        ]), minlength=len(self.sizes))
+        sizes = numpy.frombuffer(self.sizes, dtype=numpy.uint16)
+        candidates = numpy.flatnonzero((counts > 0) & (sizes > 0))
+        coverage = counts[candidates] / sizes[candidates]
+        if len(candidates) > limit:
+            keep = coverage >= numpy.partition(coverage, -limit)[-limit]
+            candidates, coverage = candidates[keep], coverage[keep]
+        recipe_ids = numpy.frombuffer(
+            self.recipe_ids, dtype=numpy.uint64
+        )[candidates]
+        order = numpy.lexsort(
+            (recipe_ids, counts[candidates], coverage)
+        )[::-1][:limit]
+        return [(int(recipe_ids[i]), float(coverage[i])) for i in order]
+
+    def rank_python(self, postings, limit):
+        """Тот же подсчёт без NumPy."""
+        counts = Counter()
+        for posting in postings:
+            counts.update(posting)
+        sizes, recipe_ids = self.sizes, self.recipe_ids
+        best = nlargest(limit, (
+            (count / sizes[position], count, recipe_ids[position])
+            for position, count in counts.items() if sizes[position]
+        ))
+        return [(recipe_id, coverage) for coverage, _, recipe_id in best]
+
+
+class PantryIndexHolder:
+    """Индекс процесса, который следит за изменениями рецептов.
+
+    Рецепты с изменёнными ингредиентами записываются в журнал в общем
+    кэше, если настроен CATALOG_CACHE_ALIAS: счётчик и список id под
+    каждым номером. Перед поиском процесс дочитывает журнал и перечитывает
+    из базы только эти рецепты; если часть журнала уже вытеснена из кэша,
+    индекс собирается заново. Без общего кэша свои изменения процесс
+    применяет сразу, а чужие увидит после пересборки раз в
+    PANTRY_INDEX_LOCAL_TIMEOUT секунд.
+    """
+
+    journal_key = 'pantry:journal'
+
+    def __init__(self):
+        self.index = None
+        self.position = 0
+        self.expires = 0
+        self.lock = Lock()
+
+    @property
+    def shared(self):
+        """Общий кэш, если он настроен."""
+        if CATALOG_CACHE_ALIAS in CACHES:
+            return caches[CATALOG_CACHE_ALIAS]
+        return None
+
+    def get_position(self):
+        """Номер последней записи журнала."""
+        if self.shared is None:
+            return 0
+        position = self.shared.get(self.journal_key)
+        if position is None:
+            self.shared.add(self.journal_key, 0, None)
+            position = self.shared.get(self.journal_key, 0)
+        return position
+
+    def append(self, recipe_ids):
+        """Добавит запись в журнал и вернет её номер.
+
+        Запись без рецептов означает, что индекс нужно собрать заново.
+        """
+        self.shared.add(self.journal_key, 0, None)
+        position = self.shared.incr(self.journal_key)
+        if recipe_ids is not None:
+            self.shared.set(f'{self.journal_key}:{position}', recipe_ids,
+                            PANTRY_JOURNAL_TIMEOUT)
+        return position
+
+    def build(self, position):
+        """Соберёт индекс по всем рецептам."""
+        self.index = PantryIndex(
+            RecipeIngredient.objects.order_by('recipe_id').values_list(
+                'recipe_id', 'ingredient_id'
+            ).iterator(chunk_size=10000)
+        )
+        self.position = position
+        self.expires = monotonic() + PANTRY_INDEX_LOCAL_TIMEOUT
+
+    def apply(self, recipe_ids):
+        """Перечитает из базы ингредиенты рецептов."""
+        recipes = {recipe_id: set() for recipe_id in recipe_ids}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=recipes).values_list(
+                'recipe_id', 'ingredient_id'):
+            recipes[recipe_id].add(ingredient_id)
+        for recipe_id, ingredients in recipes.items():
+            self.index.add(recipe_id, ingredients)
+        if self.index.needs_rebuild:
+            self.index = None
+
+    def sync(self):
+        """Догонит журнал или соберёт индекс заново. Вызывается под lock."""
+        position = self.get_position()
+        if self.index is not None and position == self.position and (
+                self.shared is not None or self.expires > monotonic()):
+            return
+        if (self.index is not None and self.shared is not None
+                and 0 < position - self.position <= PANTRY_JOURNAL_REPLAY):
+            keys = [f'{self.journal_key}:{number}'
+                    for number in range(self.position + 1, position + 1)]
+            entries = self.shared.get_many(keys)
+            if len(entries) == len(keys):
+                self.apply({
+                    recipe_id for recipe_ids in entries.values()
+                    for recipe_id in recipe_ids
+                })
+                self.position = position
+                if self.index is not None:
+                    return
+        self.build(position)
+
+    def rank(self, ingredient_ids, limit):
+        """Лучшие рецепты для набора продуктов, см. PantryIndex.rank."""
+        with self.lock:
+            self.sync()
+            return self.index.rank(set(ingredient_ids), limit)
+
+    def refresh(self, recipe_ids):
+        """Обновит рецепты в индексе процесса и запишет их в журнал."""
+        recipe_ids = list(recipe_ids)
+        position = None
+        if self.shared is not None:
+            position = self.append(recipe_ids)
+        with self.lock:
+            if self.index is None:
+                return
+            self.apply(recipe_ids)
+            if position == self.position + 1:
+                self.position = position
+
+    def invalidate(self):
+        """Соберёт индекс заново во всех процессах при следующем поиске."""
+        if self.shared is not None:
+            self.append(None)
+        with self.lock:
+            self.index = None
+
+
+pantry_index = PantryIndexHolder()
+
+
+def schedule_pantry_refresh(recipe_ids):
+    """Обновит рецепты в индексе продуктов после фиксации транзакции."""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        on_commit(lambda: pantry_index.refresh(recipe_ids))
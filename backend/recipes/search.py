@@ -0,0 +1,136 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import (BooleanField, Case, Exists, FloatField,
+                              IntegerField, OuterRef, Q, Value, When)
+from django.db.models.expressions import RawSQL
+
+from backend.settings import SEARCH_CONFIG
+from .models import RecipeIngredient
+
+UPDATE_SEARCH_VECTOR = '''
+    UPDATE recipes_recipe AS recipe SET search_vector =
+        setweight(to_tsvector(%(config)s, recipe.name), 'A')
+        || setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_recipeingredient AS link
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = link.ingredient_id
+            WHERE link.recipe_id = recipe.id
+        ), '')), 'B')
+        || setweight(to_tsvector(%(config)s, recipe.text), 'C')
+    WHERE {where}
+'''
+MATCH = 'recipes_recipe.search_vector @@ websearch_to_tsquery(%s, %s)'
+RANK = 'ts_rank(recipes_recipe.search_vector, websearch_to_tsquery(%s, %s))'
+TRIGRAM_MATCH = 'recipes_recipe.name %% %s'
+TRIGRAM_RANK = 'similarity(recipes_recipe.name, %s)'
+
+
+def is_postgresql(using=DEFAULT_DB_ALIAS):
+    """Вернет True, если база - PostgreSQL."""
+    return connections[using].vendor == 'postgresql'
+
+
+def execute_update(where, params, using=DEFAULT_DB_ALIAS):
+    """Пересчитает поисковые векторы рецептов, подходящих под where."""
+    if not is_postgresql(using):
+        return 0
+    params = {'config': SEARCH_CONFIG, **params}
+    with connections[using].cursor() as cursor:
+        cursor.execute(UPDATE_SEARCH_VECTOR.format(where=where), params)
+        return cursor.rowcount
+
+
+def update_search_vectors(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """Пересчитает поисковые векторы рецептов одним запросом."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return 0
+    return execute_update(
+        'recipe.id = ANY(%(ids)s)', {'ids': recipe_ids}, using
+    )
+
+
+def update_ingredient_search_vectors(ingredient_id, using=DEFAULT_DB_ALIAS):
+    """Пересчитает векторы рецептов, в которых есть ингредиент."""
+    return execute_update(
+        'recipe.id IN (SELECT recipe_id FROM recipes_recipeingredient '
+        'WHERE ingredient_id = %(ingredient)s)',
+        {'ingredient': ingredient_id}, using,
+    )
+
+
+def rebuild_search_vectors(start, end, using=DEFAULT_DB_ALIAS):
+    """Пересчитает векторы рецептов с id от start до end включительно."""
+    return execute_update(
+        'recipe.id BETWEEN %(start)s AND %(end)s',
+        {'start': start, 'end': end}, using,
+    )
+
+
+def search_ingredients(queryset, value):
+    """Отберет ингредиенты, содержащие value в названии.
+
+    Сначала идут те, что начинаются с value, после - которые только
+    содержат value, внутри групп - по названию.
+    """
+    return queryset.filter(name__icontains=value).annotate(
+        priority=Case(
+            When(name__istartswith=value, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+    ).order_by('priority', 'name')
+
+
+def search_recipes(queryset, query):
+    """Отберет рецепты по запросу и упорядочит их по релевантности.
+
+    На PostgreSQL - полнотекстовый поиск по сохранённому вектору с
+    сортировкой по ts_rank, после него - рецепты с похожим названием
+    (pg_trgm), чтобы находить рецепты при опечатках. На других
+    базах - поиск подстрок каждого слова в названии, описании и
+    ингредиентах, сначала рецепты с запросом в названии.
+    """
+    query = ' '.join(query.split())
+    if not query:
+        return queryset
+    if is_postgresql(queryset.db):
+        return search_recipes_postgresql(queryset, query)
+    return search_recipes_simple(queryset, query)
+
+
+def search_recipes_postgresql(queryset, query):
+    """Полнотекстовый поиск и поиск по триграммам одним запросом.
+
+    Сначала идут рецепты, найденные полнотекстовым поиском, по ts_rank,
+    за ними - рецепты с похожим названием, по similarity. Так опечатки
+    находятся без отдельного запроса на проверку, нашлось ли что-нибудь
+    полнотекстовым поиском.
+    """
+    match = (SEARCH_CONFIG, query)
+    return queryset.filter(RawSQL(
+        f'{MATCH} OR {TRIGRAM_MATCH}', (*match, query),
+        output_field=BooleanField(),
+    )).annotate(
+        matched=RawSQL(MATCH, match, output_field=BooleanField()),
+        rank=RawSQL(
+            f'CASE WHEN {MATCH} THEN {RANK} ELSE {TRIGRAM_RANK} END',
+            (*match, *match, query), output_field=FloatField(),
+        ),
+    ).order_by('-matched', '-rank', '-created', '-id')
+
+
+def search_recipes_simple(queryset, query):
+    """Поиск подстрок для баз без полнотекстового поиска."""
+    condition = Q()
+    for word in query.split():
+        condition &= (
+            Q(name__icontains=word) | Q(text__icontains=word)
+            | Q(Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient__name__icontains=word)))
+        )
+    return queryset.filter(condition).annotate(rank=Case(
+        When(name__icontains=query, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )).order_by('-rank', '-created', '-id')
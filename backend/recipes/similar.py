@@ -0,0 +1,236 @@
+from array import array
+from hashlib import blake2b
+from random import Random
+
+from django.apps import apps as django_apps
+from django.db import connections, router
+from django.db.models import Count
+from django.db.transaction import atomic
+
+from backend.settings import (SIMILAR_BANDS, SIMILAR_CANDIDATES, SIMILAR_ROWS,
+                              SIMILAR_SEED)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Строк в одном INSERT: параметров меньше 999 - предела старых SQLite.
+INSERT_BATCH_SIZE = 400
+# Хэш-функции MinHash: (a * x + b) mod PRIME. Все значения меньше 2**31,
+# поэтому подпись - массив 32-битных чисел, а произведения помещаются в
+# int64 NumPy. Смена SIMILAR_SEED, SIMILAR_BANDS или SIMILAR_ROWS требует
+# пересчёта подписей командой rebuild_similar.
+PRIME = (1 << 31) - 1
+PERMUTATIONS = SIMILAR_BANDS * SIMILAR_ROWS
+seeded = Random(SIMILAR_SEED)
+COEFFICIENTS = [
+    (seeded.randrange(1, PRIME), seeded.randrange(PRIME))
+    for _ in range(PERMUTATIONS)
+]
+
+
+def get_features(ingredient_ids, tag_ids):
+    """Элементы множества рецепта: ингредиенты - чётные, тэги - нечётные."""
+    return [2 * ingredient_id % PRIME for ingredient_id in ingredient_ids] + [
+        (2 * tag_id + 1) % PRIME for tag_id in tag_ids
+    ]
+
+
+def get_signatures(feature_lists):
+    """Вернет подписи MinHash (array('I')) и номера полос для индекса LSH.
+
+    Полоса попадает в индекс, если хотя бы один её минимум дал ингредиент:
+    тэгов мало, и полосы из одних тэгов собирают в один ключ чуть ли не
+    все рецепты с теми же тэгами. В подписи и похожести тэги учитываются.
+    С NumPy все хэши пачки считаются одной матрицей, а минимумы по
+    рецептам - одним minimum.reduceat. Пустым спискам соответствует None.
+    """
+    signatures = [None] * len(feature_lists)
+    present = [index for index, features in enumerate(feature_lists)
+               if features]
+    if not present:
+        return signatures
+    if numpy is None:
+        for index in present:
+            minimums = [[PRIME] * PERMUTATIONS, [PRIME] * PERMUTATIONS]
+            for x in feature_lists[index]:
+                row = minimums[x & 1]
+                for number, (a, b) in enumerate(COEFFICIENTS):
+                    row[number] = min(row[number], (a * x + b) % PRIME)
+            ingredients, tags = minimums
+            signatures[index] = (
+                array('I', map(min, ingredients, tags)),
+                [band for band in range(SIMILAR_BANDS) if any(
+                    ingredients[number] < tags[number] for number in range(
+                        band * SIMILAR_ROWS, (band + 1) * SIMILAR_ROWS)
+                )],
+            )
+        return signatures
+    features = numpy.array([
+        x for index in present for x in feature_lists[index]
+    ], dtype=numpy.int64)
+    offsets = numpy.cumsum(
+        [0] + [len(feature_lists[index]) for index in present[:-1]]
+    )
+    a, b = numpy.array(COEFFICIENTS, dtype=numpy.int64).T
+    hashes = (features[:, None] * a + b) % PRIME
+    is_tag = (features & 1).astype(bool)[:, None]
+    ingredients, tags = (
+        numpy.minimum.reduceat(
+            numpy.where(mask, hashes, PRIME), offsets, axis=0
+        ) for mask in (~is_tag, is_tag)
+    )
+    minimums = numpy.minimum(ingredients, tags).astype(numpy.uint32)
+    informative = (ingredients < tags).reshape(
+        len(present), SIMILAR_BANDS, SIMILAR_ROWS
+    ).any(axis=2)
+    for index, row, bands in zip(present, minimums, informative):
+        signatures[index] = (
+            array('I', row.tobytes()), numpy.flatnonzero(bands).tolist()
+        )
+    return signatures
+
+
+def get_buckets(signature, bands):
+    """Ключи LSH полос bands: полоса - SIMILAR_ROWS значений подписи.
+
+    Номер полосы входит в ключ, поэтому все полосы лежат в одном столбце.
+    """
+    return [
+        int.from_bytes(blake2b(array('I', [band]).tobytes() + signature[
+            band * SIMILAR_ROWS:(band + 1) * SIMILAR_ROWS
+        ].tobytes(), digest_size=8).digest(), 'big', signed=True)
+        for band in bands
+    ]
+
+
+def to_signature(value):
+    """Подпись из значения BinaryField (bytes или memoryview)."""
+    signature = array('I')
+    signature.frombytes(bytes(value))
+    return signature
+
+
+def insert_rows(cursor, model, columns, rows):
+    """Вставит строки многострочными INSERT по INSERT_BATCH_SIZE строк."""
+    table = model._meta.db_table
+    placeholders = f'({", ".join(["%s"] * len(columns))})'
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch = rows[start:start + INSERT_BATCH_SIZE]
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(columns)}) '
+            f'VALUES {", ".join([placeholders] * len(batch))}',
+            [value for row in batch for value in row],
+        )
+
+
+def update_signatures(recipe_ids, apps=django_apps):
+    """Пересчитает подписи и ключи LSH рецептов по ингредиентам и тэгам.
+
+    На пачку рецептов - по запросу на ингредиенты и тэги, удаление старых
+    подписей и ключей и вставка новых в одной транзакции, без создания
+    объектов моделей. Вернет число рецептов с подписью.
+    """
+    signature_model = apps.get_model('recipes', 'RecipeSignature')
+    bucket_model = apps.get_model('recipes', 'RecipeBucket')
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    if not ingredients:
+        return 0
+    tags = {recipe_id: [] for recipe_id in ingredients}
+    for model, field, items in (
+        (apps.get_model('recipes', 'RecipeIngredient'), 'ingredient_id',
+         ingredients),
+        (apps.get_model('recipes', 'RecipeTag'), 'tag_id', tags),
+    ):
+        for recipe_id, value in model.objects.filter(
+                recipe_id__in=ingredients).values_list('recipe_id', field):
+            items[recipe_id].append(value)
+    signatures = [
+        (recipe_id, *signature) for recipe_id, signature in zip(
+            ingredients, get_signatures([
+                get_features(ingredients[recipe_id], tags[recipe_id])
+                for recipe_id in ingredients
+            ])
+        ) if signature is not None
+    ]
+    using = router.db_for_write(signature_model)
+    with atomic(using=using), connections[using].cursor() as cursor:
+        for model in (signature_model, bucket_model):
+            model.objects.filter(recipe_id__in=ingredients).delete()
+        insert_rows(cursor, signature_model, ('recipe_id', 'minhash'), [
+            (recipe_id, signature.tobytes())
+            for recipe_id, signature, _ in signatures
+        ])
+        insert_rows(cursor, bucket_model, ('recipe_id', 'bucket'), [
+            (recipe_id, bucket) for recipe_id, signature, bands in signatures
+            for bucket in get_buckets(signature, bands)
+        ])
+    return len(signatures)
+
+
+def rebuild_signatures(batch_size=10000, apps=django_apps):
+    """Пересчитает подписи всех рецептов пачками по batch_size.
+
+    Вернет число рецептов с подписью.
+    """
+    recipe_ids = apps.get_model('recipes', 'Recipe').objects.order_by(
+        'id').values_list('id', flat=True)
+    updated, last = 0, 0
+    while True:
+        batch = list(recipe_ids.filter(id__gt=last)[:batch_size])
+        if not batch:
+            return updated
+        updated += update_signatures(batch, apps)
+        last = batch[-1]
+
+
+def get_similar_recipes(recipe_id, limit):
+    """Вернет до limit пар (id рецепта, похожесть), самые похожие первыми.
+
+    Кандидаты - рецепты, совпавшие с рецептом хотя бы в одной полосе из
+    индекса LSH; берётся не больше SIMILAR_CANDIDATES, сначала совпавшие
+    в большем числе полос. Похожесть - доля совпавших
+    значений подписей, оценка коэффициента Жаккара множеств ингредиентов
+    и тэгов.
+    Для рецепта без подписи вернет пустой список, для несуществующего -
+    None.
+    """
+    signature_model = django_apps.get_model('recipes', 'RecipeSignature')
+    bucket_model = django_apps.get_model('recipes', 'RecipeBucket')
+    found = signature_model.objects.filter(recipe_id=recipe_id).values_list(
+        'minhash', flat=True)
+    if not found:
+        exists = django_apps.get_model('recipes', 'Recipe').objects.filter(
+            id=recipe_id).exists()
+        return [] if exists else None
+    signature = to_signature(found[0])
+    candidates = bucket_model.objects.filter(
+        bucket__in=bucket_model.objects.filter(
+            recipe_id=recipe_id).values('bucket')
+    ).exclude(recipe_id=recipe_id).values('recipe_id').annotate(
+        bands=Count('id')
+    ).order_by('-bands', '-recipe_id').values_list(
+        'recipe_id', flat=True
+    )[:SIMILAR_CANDIDATES]
+    rows = list(signature_model.objects.filter(
+        recipe_id__in=candidates
+    ).values_list('recipe_id', 'minhash'))
+    if not rows:
+        return []
+    if numpy is None:
+        scores = [
+            sum(a == b for a, b in zip(signature, to_signature(minhash)))
+            / PERMUTATIONS for _, minhash in rows
+        ]
+    else:
+        scores = (numpy.frombuffer(
+            b''.join(bytes(minhash) for _, minhash in rows),
+            dtype=numpy.uint32,
+        ).reshape(len(rows), PERMUTATIONS) == numpy.frombuffer(
+            signature, dtype=numpy.uint32
+        )).mean(axis=1).tolist()
+    return sorted((
+        (candidate_id, score)
+        for (candidate_id, _), score in zip(rows, scores)
+    ), key=lambda item: (item[1], item[0]), reverse=True)[:limit]
@@ -0,0 +1,89 @@
+from django.apps import apps as django_apps
+from django.core.exceptions import ValidationError
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from backend.settings import TAG_MASK_BITS, TAG_MASK_IN_LIMIT
+
+
+def get_free_tag_mask(tag_model):
+    """Вернет свободный бит для нового тэга.
+
+    Биты удалённых тэгов переиспользуются: при удалении тэга его бит
+    снимается с масок рецептов.
+    """
+    used = get_used_mask(tag_model)
+    for bit in range(TAG_MASK_BITS):
+        if not used & 1 << bit:
+            return 1 << bit
+    raise ValidationError(
+        f'Нельзя создать больше {TAG_MASK_BITS} тэгов.'
+    )
+
+
+def get_used_mask(tag_model):
+    """Объединение битов всех тэгов."""
+    return tag_model.objects.aggregate(used=Sum('mask'))['used'] or 0
+
+
+def get_tags_mask(tags):
+    """Маска рецепта с тэгами tags."""
+    mask = 0
+    for tag in tags:
+        mask |= tag.mask
+    return mask
+
+
+def get_matching_masks(mask, used):
+    """Все маски из битов used, пересекающиеся с mask.
+
+    Вернет None, если таких масок больше TAG_MASK_IN_LIMIT.
+    """
+    mask &= used
+    bits = [1 << bit for bit in range(TAG_MASK_BITS) if used & 1 << bit]
+    if not mask or 2 ** len(bits) > TAG_MASK_IN_LIMIT:
+        return None if mask else []
+    masks = [0]
+    for bit in bits:
+        masks += [value | bit for value in masks]
+    return [value for value in masks if value & mask]
+
+
+def filter_by_tags_mask(queryset, mask, used):
+    """Рецепты, у которых есть хотя бы один тэг из mask, без JOIN.
+
+    Если тэгов немного, условие - tags_mask IN (...) по всем подходящим
+    маскам, его обслуживает обычный индекс. Иначе - побитовое И.
+    """
+    masks = get_matching_masks(mask, used)
+    if masks is not None:
+        return queryset.filter(tags_mask__in=masks)
+    return queryset.annotate(
+        tags_match=F('tags_mask').bitand(mask)
+    ).exclude(tags_match=0)
+
+
+def clear_tag_mask(recipe_model, mask, used):
+    """Снимет бит удалённого тэга с масок рецептов."""
+    return filter_by_tags_mask(
+        recipe_model.objects.all(), mask, used | mask
+    ).update(tags_mask=F('tags_mask').bitand(Value(~mask)))
+
+
+def reconcile_tags_masks(apps=django_apps, recipe_ids=None):
+    """Пересчитает маски тэгов рецептов, вернет число исправленных.
+
+    recipe_ids ограничит пересчёт указанными рецептами. Биты разных
+    тэгов не пересекаются, поэтому сумма масок тэгов рецепта равна их
+    объединению.
+    """
+    recipe = apps.get_model('recipes', 'Recipe')
+    actual = Coalesce(Subquery(
+        apps.get_model('recipes', 'RecipeTag').objects.filter(
+            recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+            mask=Sum('tag__mask')).values('mask')
+    ), Value(0))
+    recipes = recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+    return recipes.exclude(tags_mask=actual).update(tags_mask=actual)
@@ -1,19 +1,35 @@
-from random import choice
-
-from backend.settings import LENGTH_SHORT_LINK, STRING_CHARACTERS
+from backend.settings import (SHORT_LINK_MIN_LENGTH, SHORT_LINK_MULTIPLIER,
+                              SHORT_LINK_OFFSET, STRING_CHARACTERS)
 
 
 def get_short_link(
+        number: int,
         string_characters: str = STRING_CHARACTERS,
-        range_pass: int = LENGTH_SHORT_LINK,
+        min_length: int = SHORT_LINK_MIN_LENGTH,
 ) -> str:
     """Генератор коротких ссылок.
 
-    Принимает два аргумента:
-    * целое число - длина ссылки
-    * строку - набор используемых символов.
+    Принимает три аргумента:
+    * целое число - id рецепта;
+    * строку - набор используемых символов;
+    * целое число - минимальная длина ссылки.
+
+    Ссылка - это число, перемешанное биекцией x -> (x * a + b) mod base^L,
+    записанное в системе счисления из string_characters и дополненное до
+    длины L. L - наименьшая длина не меньше min_length, в которую
+    помещается число. Разные числа дают разные ссылки, поэтому проверять
+    уникальность в базе не нужно.
 
     Возвращает сгенерированную ссылку в виде строки.
     """
-    pass_list = [choice(string_characters) for _ in range(range_pass)]
-    return ''.join(pass_list)
+    base = len(string_characters)
+    length = min_length
+    while number >= base ** length:
+        length += 1
+    number = (number * SHORT_LINK_MULTIPLIER
+              + SHORT_LINK_OFFSET) % base ** length
+    digits = []
+    for _ in range(length):
+        number, digit = divmod(number, base)
+        digits.append(string_characters[digit])
+    return ''.join(reversed(digits))
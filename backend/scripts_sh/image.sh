@@ -5,4 +5,5 @@ mkdir ../media/recipes
 mkdir ../media/recipes/images
 for i in `seq 1 30`; do cp scripts_sh/test_u.jpg ../media/users/test_u${i}.jpg; done
 for i in `seq 1 150`; do cp scripts_sh/test_r.jpg ../media/recipes/images/test_r${i}.jpg; done
+python manage.py build_image_variants
 echo "...image created."
\ No newline at end of file
@@ -2,14 +2,16 @@
 echo "Create tags..."
 python manage.py shell -c "
 from recipes.models import Tag
-Tag.objects.bulk_create([
-    Tag(name='Десерт', slug='dessert'),
-    Tag(name='Завтрак', slug='breakfast'),
-    Tag(name='Обед', slug='lunch'),
-    Tag(name='Ужин', slug='dinner'),
-    Tag(name='Аперитив', slug='aperitif'),
-    Tag(name='Ночной дожор', slug='nightwatch'),
-])
+# По одному, а не bulk_create: save() назначает тэгу бит маски.
+for name, slug in (
+    ('Десерт', 'dessert'),
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Аперитив', 'aperitif'),
+    ('Ночной дожор', 'nightwatch'),
+):
+    Tag.objects.create(name=name, slug=slug)
 count = Tag.objects.all().count()
 print(f'Total entries made: {count}.')
 "
@@ -22,7 +22,8 @@ class UserFoodgramAdmin(UserAdmin):
         (_('Important dates'), {'fields': ('last_login', 'date_joined')}),
     )
 
-    list_display = ('id', 'get_full_name', 'email', 'is_active')
+    list_display = ('id', 'get_full_name', 'email', 'recipes_count',
+                    'followers_count', 'is_active')
     list_display_links = ('id', 'get_full_name')
     list_editable = ('is_active',)
     search_fields = ('username', 'email', 'last_name', 'first_name')
@@ -52,6 +53,8 @@ class FollowAdmin(ModelAdmin):
     )
     list_display = ('id', 'get_following')
     list_display_links = ('id', 'get_following')
+    autocomplete_fields = ('user', 'following')
+    show_full_result_count = False
     readonly_fields = (
         'get_html_avatar_user',
         'get_html_avatar_following',
@@ -67,6 +70,12 @@ class FollowAdmin(ModelAdmin):
     search_help_text = ('Можно искать по username, имени и фамилии как'
                         'подписчика, так и на кого подписывались.')
 
+    def get_queryset(self, request):
+        """Подгрузит обоих пользователей вместе с подпиской."""
+        return super().get_queryset(request).select_related(
+            'user', 'following'
+        )
+
     @display(description='')
     def get_html_avatar_user(self, object):
         """Возвращает миниатюру того, кто подписан."""
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:30
+
+from django.db import migrations
+import users.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='userfoodgram',
+            managers=[
+                ('objects', users.models.UserFoodgramManager()),
+            ],
+        ),
+    ]
@@ -1,12 +1,20 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.exceptions import ValidationError
 from django.db.models import (CASCADE, CharField, EmailField, ForeignKey,
-                              ImageField, Model, UniqueConstraint)
+                              ImageField, JSONField, Model,
+                              PositiveIntegerField, UniqueConstraint)
 from django.utils.safestring import mark_safe
 
+from backend.counters import CounterModelMixin, CounterQuerySet
+from backend.images import get_thumbnail_url
 
-class UserFoodgram(AbstractUser):
+
+class UserFoodgramManager(UserManager.from_queryset(CounterQuerySet)):
+    """Менеджер пользователей: удаление собирает счётчики в одну пачку."""
+
+
+class UserFoodgram(CounterModelMixin, AbstractUser):
     """Модель пользователей, для проекта Footgram."""
 
     first_name = CharField(verbose_name='Имя', max_length=150)
@@ -25,6 +33,24 @@ class UserFoodgram(AbstractUser):
         blank=True,
         default=None,
     )
+    avatar_variants = JSONField(
+        verbose_name='Уменьшенные копии аватара',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    recipes_count = PositiveIntegerField(
+        verbose_name='Рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = PositiveIntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+        editable=False,
+    )
+
+    objects = UserFoodgramManager()
 
     def __str__(self):
         """Строковое представление модели."""
@@ -34,14 +60,15 @@ class UserFoodgram(AbstractUser):
     def get_html_avatar(self):
         """Возвращает миниатюру."""
         if self.avatar:
-            return mark_safe(f'<img src="{self.avatar.url}" width=70>')
+            url = get_thumbnail_url(self.avatar, self.avatar_variants)
+            return mark_safe(f'<img src="{url}" width=70>')
         return 'Нет аватара'
 
 
 User = get_user_model()
 
 
-class Follow(Model):
+class Follow(CounterModelMixin, Model):
     """Модель для подписки на других пользователей."""
 
     user = ForeignKey(
@@ -56,6 +83,8 @@ class Follow(Model):
         verbose_name='На кого подписывался',
     )
 
+    objects = CounterQuerySet.as_manager()
+
     class Meta:
         """Метаданные."""
 